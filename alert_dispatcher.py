@@ -0,0 +1,184 @@
+import json
+import queue
+import sys
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import REGISTRY
+
+ALERTS = REGISTRY.counter("iris_alerts_total", "Alerts handled by the n8n dispatcher, by outcome.", ("outcome",))
+SEND_SECONDS = REGISTRY.histogram("iris_alert_send_seconds", "Duration of one webhook POST attempt.", ("result",))
+DELIVERY_SECONDS = REGISTRY.histogram("iris_alert_delivery_seconds", "Time from submit() to delivery, including queueing and retries.")
+
+
+class AlertDispatcher:
+    """
+    Background delivery of alerts to the n8n webhook.
+
+    `submit()` never blocks the caller: alerts go into a bounded queue that worker
+    threads drain over a pooled keep-alive session. Alerts are keyed by
+    (roomId, alertType). While an alert is still queued, a newer one for the same
+    key replaces its payload (coalescing). Once an alert is accepted, further ones
+    for that key are rate-limited for `min_interval_seconds`. Failed deliveries are
+    retried with exponential backoff.
+
+    Coalescing and the rate limit are per process. When several processes send alerts,
+    `claim(key, min_interval_seconds)` extends the rate limit across them: it is called
+    before a new alert is queued and returns False if another process already sent that
+    key within the interval. If the claim itself fails, the alert is sent anyway.
+    """
+
+    def __init__(self, webhook_url, max_queue_size=1000, workers=2, min_interval_seconds=30,
+                 max_retries=3, backoff_seconds=0.5, timeout_seconds=10, claim=None):
+        self.webhook_url = webhook_url
+        self.claim = claim
+        self.workers = workers
+        self.min_interval_seconds = min_interval_seconds
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout_seconds = timeout_seconds
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._pending = {} # key -> (payload, submitted_at) for alerts still waiting in the queue
+        self._last_accepted = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+
+        self.stats = {"submitted": 0, "delivered": 0, "failed": 0, "retries": 0,
+                      "coalesced": 0, "rate_limited": 0, "dropped": 0}
+        self.latency_last = 0.0
+        self.latency_max = 0.0
+        self.latency_total = 0.0
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"alert-dispatcher-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, payload):
+        # Returns True if the alert was queued or merged into a queued alert.
+        key = (payload.get("roomId"), payload.get("alertType"))
+        now = time.monotonic()
+        with self._lock:
+            self._count("submitted")
+            if self._coalesce_or_limit(key, payload, now):
+                return key in self._pending
+        if not self._claim(key):
+            with self._lock:
+                self._count("rate_limited")
+            return False
+        with self._lock:
+            if self._coalesce_or_limit(key, payload, now): # Another thread got here first
+                return key in self._pending
+            try:
+                self._queue.put_nowait(key)
+            except queue.Full:
+                self._count("dropped")
+                print(f"ALERT DISPATCHER: Queue full, dropping '{key[1]}' alert for {key[0]}.", file=sys.stderr)
+                return False
+            self._pending[key] = (payload, now)
+            self._last_accepted[key] = now
+            return True
+
+    def _coalesce_or_limit(self, key, payload, now):
+        # Caller must hold self._lock. True if the alert was merged into a queued one or rate-limited.
+        if key in self._pending:
+            self._pending[key] = (payload, self._pending[key][1])
+            self._count("coalesced")
+            return True
+        last_accepted = self._last_accepted.get(key)
+        if last_accepted is not None and now - last_accepted < self.min_interval_seconds:
+            self._count("rate_limited")
+            return True
+        return False
+
+    def _claim(self, key):
+        # Called without self._lock: the claim may wait on a shared database.
+        if self.claim is None:
+            return True
+        try:
+            return self.claim(key, self.min_interval_seconds)
+        except Exception as e:
+            print(f"ALERT DISPATCHER: Could not claim '{key[1]}' alert for {key[0]}, sending it anyway: {e}", file=sys.stderr)
+            return True
+
+    def _count(self, outcome):
+        # Caller must hold self._lock.
+        self.stats[outcome] += 1
+        ALERTS.labels(outcome).inc()
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def metrics(self):
+        with self._lock:
+            delivered = self.stats["delivered"]
+            return dict(self.stats,
+                        queue_depth=self._queue.qsize(),
+                        latency_last_seconds=round(self.latency_last, 4),
+                        latency_max_seconds=round(self.latency_max, 4),
+                        latency_avg_seconds=round(self.latency_total / delivered, 4) if delivered else 0.0)
+
+    def _worker(self):
+        while True:
+            key = self._queue.get()
+            with self._lock:
+                payload, submitted_at = self._pending.pop(key)
+            delivered = self._deliver(payload)
+            latency = time.monotonic() - submitted_at
+            with self._lock:
+                if delivered:
+                    self._count("delivered")
+                    self.latency_last = latency
+                    self.latency_max = max(self.latency_max, latency)
+                    self.latency_total += latency
+                else:
+                    self._count("failed")
+            if delivered:
+                DELIVERY_SECONDS.observe(latency)
+            self._queue.task_done()
+
+    def _deliver(self, payload):
+        body = json.dumps(payload)
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                with self._lock:
+                    self._count("retries")
+                time.sleep(self.backoff_seconds * 2 ** (attempt - 1))
+            started = time.perf_counter()
+            try:
+                response = self.session.post(self.webhook_url, data=body, timeout=self.timeout_seconds)
+                SEND_SECONDS.labels(f"{response.status_code // 100}xx").observe(time.perf_counter() - started)
+                if response.status_code < 500:
+                    response.raise_for_status() # 4xx will not succeed on retry
+                    return True
+                error = f"HTTP {response.status_code}"
+            except requests.exceptions.HTTPError as e:
+                print(f"SERVER ERROR: n8n rejected '{payload.get('alertType')}' alert for {payload.get('roomId')}: {e}", file=sys.stderr)
+                return False
+            except requests.exceptions.RequestException as e:
+                SEND_SECONDS.labels("error").observe(time.perf_counter() - started)
+                error = e
+            print(f"SERVER ERROR: Failed to send '{payload.get('alertType')}' alert to n8n for {payload.get('roomId')} (attempt {attempt + 1}/{self.max_retries + 1}): {error}", file=sys.stderr)
+        return False
+
+    def wait_until_idle(self, timeout=None):
+        # Blocks until every queued alert has been handled.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
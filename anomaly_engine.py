@@ -0,0 +1,285 @@
+import sys
+import threading
+import time
+
+import numpy as np
+
+from metrics import REGISTRY
+
+TICK_SECONDS = REGISTRY.histogram("iris_anomaly_tick_seconds", "Duration of one vectorized anomaly pass over all rooms.")
+DETECTIONS = REGISTRY.counter("iris_anomaly_detections_total", "Rooms raised by the anomaly engine, by rule.", ("rule",))
+
+# Per-room rule fields and their defaults; override them with AnomalyEngine.set_rule().
+DEFAULT_RULE = {
+    "rate_of_rise_per_minute": 8.3, # °C/min, the classic rate-of-rise heat detector setting (15°F/min)
+    "smoke_rise_per_minute": 150.0,
+    "z_threshold": 4.0, # Temperature AND smoke this many standard deviations above their baselines
+    "debounce": 3, # Consecutive evaluations with new data that must agree before a room is raised
+}
+
+
+def _slopes_per_minute(t, values, in_window, min_samples, min_span):
+    # Least-squares slope of every row of `values` against `t`, using only the cells that
+    # are in the window and not NaN, and the slope divided by its standard error (how
+    # clearly it stands out from the noise). Rows with fewer than `min_samples` points, or
+    # whose points cover less than `min_span` seconds, get NaN.
+    valid = in_window & ~np.isnan(values)
+    n = valid.sum(axis=1)
+    t0 = np.where(valid, t, 0.0)
+    v0 = np.where(valid, values, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dt = np.where(valid, t - (t0.sum(axis=1) / n)[:, None], 0.0)
+        dv = np.where(valid, v0 - (v0.sum(axis=1) / n)[:, None], 0.0)
+        sum_dt2 = (dt * dt).sum(axis=1)
+        slope = (dt * dv).sum(axis=1) / sum_dt2
+        residuals = dv - slope[:, None] * dt
+        standard_error = np.sqrt((residuals * residuals).sum(axis=1) / (n - 2) / sum_dt2)
+        t_value = slope / standard_error
+    span = np.where(valid, t, -np.inf).max(axis=1) - np.where(valid, t, np.inf).min(axis=1)
+    slope[(n < min_samples) | ~(span >= min_span)] = np.nan
+    return slope * 60, t_value
+
+
+class _Baseline:
+    # Exponentially weighted mean and variance per room, for one sensor.
+    def __init__(self, capacity, alpha, min_std):
+        self.alpha = alpha
+        self.min_var = min_std * min_std
+        self.mean = np.full(capacity, np.nan)
+        self.var = np.zeros(capacity)
+        self.samples = np.zeros(capacity, dtype=np.int64)
+
+    def grow(self, capacity):
+        self.mean = np.concatenate([self.mean, np.full(capacity - len(self.mean), np.nan)])
+        self.var = np.concatenate([self.var, np.zeros(capacity - len(self.var))])
+        self.samples = np.concatenate([self.samples, np.zeros(capacity - len(self.samples), dtype=np.int64)])
+
+    def z_scores(self, n, values):
+        with np.errstate(invalid='ignore'):
+            return (values - self.mean[:n]) / np.sqrt(np.maximum(self.var[:n], self.min_var))
+
+    def update(self, n, values, mask, z, warmup_samples, max_z):
+        # Once warmed up, readings more than `max_z` deviations out are not learned, so a
+        # developing fire cannot widen the baseline it is being measured against.
+        with np.errstate(invalid='ignore'):
+            mask = mask & ~np.isnan(values) & ((self.samples[:n] < warmup_samples) | (np.abs(z) < max_z))
+        mean, var = self.mean[:n], self.var[:n]
+        first = mask & np.isnan(mean)
+        mean[first] = values[first]
+        rest = mask & ~first
+        delta = values[rest] - mean[rest]
+        mean[rest] += self.alpha * delta
+        var[rest] = (1 - self.alpha) * (var[rest] + self.alpha * delta * delta)
+        self.samples[:n] += mask
+
+
+class AnomalyEngine:
+    """
+    Trend-based fire detection over every room in one vectorized NumPy pass per tick.
+
+    `record()` only queues the reading, so the ingest path pays for a list append.
+    `tick()` writes the queued readings into a rooms x `window_size` ring of timestamps,
+    temperatures and smoke values, then computes for all rooms at once:
+      - the rate of rise of temperature and smoke (least-squares slope over the last
+        `slope_window_seconds`), which must also be at least `min_slope_t` standard
+        errors from zero, so noisy sensors need more evidence than quiet ones,
+      - z-scores of the newest reading against EWMA baselines, for the multi-sensor rule
+        "temperature and smoke both well above normal".
+    A room is raised once a rule has held for its `debounce` consecutive evaluations with
+    new data; baselines are frozen while a rule holds so a slow fire is not learned as
+    normal. A raised room stays raised, like ALERT_FIRE. Everything except the queue and
+    the rule overrides belongs to the thread that calls `tick()`.
+    """
+
+    def __init__(self, window_size=64, slope_window_seconds=45, min_samples=8, min_slope_t=6.0, ewma_alpha=0.05,
+                 warmup_samples=20, learn_max_z=3.0, min_temperature_std=0.5, min_smoke_std=10.0, stale_seconds=10,
+                 initial_capacity=256, **default_rule):
+        unknown = set(default_rule) - set(DEFAULT_RULE)
+        if unknown:
+            raise ValueError(f"Unknown rule fields: {sorted(unknown)}")
+        self.window_size = window_size
+        self.slope_window_seconds = slope_window_seconds
+        self.min_samples = min_samples
+        self.min_slope_t = min_slope_t
+        self.warmup_samples = warmup_samples
+        self.learn_max_z = learn_max_z
+        self.stale_seconds = stale_seconds
+        self.default_rule = {**DEFAULT_RULE, **default_rule}
+        self.ticks = 0
+        self.last_tick_seconds = 0.0
+
+        self._pending = []
+        self._rule_overrides = {}
+        self._changed_rules = set()
+        self._lock = threading.Lock()
+
+        self._room_ids = []
+        self._index = {}
+        self._next_slot = [] # Per room; a list because it is updated one reading at a time
+        self._capacity = initial_capacity
+        self._times = np.full((initial_capacity, window_size), np.nan)
+        self._temperatures = np.full((initial_capacity, window_size), np.nan)
+        self._smoke_values = np.full((initial_capacity, window_size), np.nan)
+        self._rules = {field: np.full(initial_capacity, value, dtype=float) for field, value in self.default_rule.items()}
+        self._temperature_baseline = _Baseline(initial_capacity, ewma_alpha, min_temperature_std)
+        self._smoke_baseline = _Baseline(initial_capacity, ewma_alpha, min_smoke_std)
+        self._streak = np.zeros(initial_capacity, dtype=np.int64)
+        self._raised = np.zeros(initial_capacity, dtype=bool)
+
+    def __len__(self):
+        return len(self._room_ids)
+
+    # --- Configuration ---
+
+    def set_rule(self, room_id, **overrides):
+        # e.g. set_rule("B001", rate_of_rise_per_minute=12) for a kitchen. Applied on the next tick.
+        unknown = set(overrides) - set(DEFAULT_RULE)
+        if unknown:
+            raise ValueError(f"Unknown rule fields: {sorted(unknown)}")
+        with self._lock:
+            self._rule_overrides.setdefault(room_id, {}).update(overrides)
+            self._changed_rules.add(room_id)
+
+    def _apply_rule(self, room_id, index, overrides):
+        for field, value in {**self.default_rule, **overrides}.items():
+            self._rules[field][index] = value
+
+    # --- Ingest ---
+
+    def record(self, room_id, epoch, temperature, smoke_value):
+        with self._lock:
+            self._pending.append((room_id, epoch, temperature, smoke_value))
+
+    def _write_pending(self, pending, overrides):
+        # Places each queued reading in its room's next ring slot, then writes them all at once.
+        if len(pending) > self.window_size:
+            # Only a room's last `window_size` readings fit in its ring; more would give one
+            # slot two readings in the single write below, with no say in which one is kept.
+            kept, counts = [], {}
+            for reading in reversed(pending):
+                if counts.get(reading[0], 0) < self.window_size:
+                    counts[reading[0]] = counts.get(reading[0], 0) + 1
+                    kept.append(reading)
+            pending = kept[::-1]
+        rows, slots = [], []
+        for room_id, *_ in pending:
+            index = self._index.get(room_id)
+            if index is None:
+                index = self._add_room(room_id, overrides.get(room_id, {}))
+            slot = self._next_slot[index]
+            self._next_slot[index] = (slot + 1) % self.window_size
+            rows.append(index)
+            slots.append(slot)
+        if rows:
+            _, epochs, temperatures, smoke_values = zip(*pending)
+            self._times[rows, slots] = epochs
+            self._temperatures[rows, slots] = np.array(temperatures, dtype=float) # None becomes NaN
+            self._smoke_values[rows, slots] = np.array(smoke_values, dtype=float)
+        return rows
+
+    def _add_room(self, room_id, overrides):
+        index = len(self._room_ids)
+        if index == self._capacity:
+            self._grow(self._capacity * 2)
+        self._room_ids.append(room_id)
+        self._index[room_id] = index
+        self._next_slot.append(0)
+        self._apply_rule(room_id, index, overrides)
+        return index
+
+    def _grow(self, capacity):
+        extra = capacity - self._capacity
+        for name in ("_times", "_temperatures", "_smoke_values"):
+            setattr(self, name, np.concatenate([getattr(self, name), np.full((extra, self.window_size), np.nan)]))
+        self._rules = {field: np.concatenate([values, np.full(extra, self.default_rule[field], dtype=float)]) for field, values in self._rules.items()}
+        self._temperature_baseline.grow(capacity)
+        self._smoke_baseline.grow(capacity)
+        self._streak = np.concatenate([self._streak, np.zeros(extra, dtype=np.int64)])
+        self._raised = np.concatenate([self._raised, np.zeros(extra, dtype=bool)])
+        self._capacity = capacity
+
+    # --- Evaluation ---
+
+    def tick(self, now=None):
+        # Evaluates every room; returns [(room_id, reasons), ...] for rooms raised by this tick.
+        started = time.perf_counter()
+        now = time.time() if now is None else now
+        with self._lock:
+            pending, self._pending = self._pending, []
+            overrides = {room_id: dict(rule) for room_id, rule in self._rule_overrides.items()}
+            changed_rules, self._changed_rules = self._changed_rules, set()
+        written_rows = self._write_pending(pending, overrides)
+        for room_id in changed_rules:
+            if room_id in self._index:
+                self._apply_rule(room_id, self._index[room_id], overrides[room_id])
+        n = len(self._room_ids)
+        if n == 0:
+            return []
+
+        rows = np.arange(n)
+        fresh = np.zeros(n, dtype=bool) # New reading since the last tick
+        fresh[written_rows] = True
+        newest_slot = (np.array(self._next_slot) - 1) % self.window_size
+        times = self._times[:n] - now
+        temperatures, smoke_values = self._temperatures[:n], self._smoke_values[:n]
+        rules = {field: values[:n] for field, values in self._rules.items()}
+        with np.errstate(invalid='ignore'):
+            in_window = times >= -self.slope_window_seconds
+            live = times[rows, newest_slot] >= -self.stale_seconds
+        temperature_slope, temperature_slope_t = _slopes_per_minute(times, temperatures, in_window, self.min_samples, self.slope_window_seconds / 2)
+        smoke_slope, smoke_slope_t = _slopes_per_minute(times, smoke_values, in_window, self.min_samples, self.slope_window_seconds / 2)
+        newest_temperature = temperatures[rows, newest_slot]
+        newest_smoke = smoke_values[rows, newest_slot]
+        temperature_z = self._temperature_baseline.z_scores(n, newest_temperature)
+        smoke_z = self._smoke_baseline.z_scores(n, newest_smoke)
+        warmed_up = (self._temperature_baseline.samples[:n] >= self.warmup_samples) & (self._smoke_baseline.samples[:n] >= self.warmup_samples)
+
+        # NaN compares False, so rooms without enough data never match.
+        with np.errstate(invalid='ignore'):
+            rate_of_rise = (temperature_slope >= rules["rate_of_rise_per_minute"]) & (temperature_slope_t >= self.min_slope_t)
+            smoke_rise = (smoke_slope >= rules["smoke_rise_per_minute"]) & (smoke_slope_t >= self.min_slope_t)
+            multi_sensor = warmed_up & (temperature_z >= rules["z_threshold"]) & (smoke_z >= rules["z_threshold"])
+        matching = (rate_of_rise | smoke_rise | multi_sensor) & live
+
+        streak = self._streak[:n]
+        streak[:] = np.where(fresh, np.where(matching, streak + 1, 0), streak)
+        raised_now = (streak >= rules["debounce"]) & ~self._raised[:n]
+        self._raised[:n] |= raised_now
+
+        learn = fresh & ~matching
+        self._temperature_baseline.update(n, newest_temperature, learn, temperature_z, self.warmup_samples, self.learn_max_z)
+        self._smoke_baseline.update(n, newest_smoke, learn, smoke_z, self.warmup_samples, self.learn_max_z)
+
+        events = []
+        for index in np.flatnonzero(raised_now):
+            reasons = []
+            if rate_of_rise[index]:
+                reasons.append(f"Rapid Temperature Rise ({temperature_slope[index]:.1f}°C/min)")
+                DETECTIONS.labels("rate_of_rise").inc()
+            if smoke_rise[index]:
+                reasons.append(f"Rapid Smoke Rise ({smoke_slope[index]:.0f}/min)")
+                DETECTIONS.labels("smoke_rise").inc()
+            if multi_sensor[index]:
+                reasons.append(f"Temperature and Smoke Above Baseline (z {temperature_z[index]:.1f} / {smoke_z[index]:.1f})")
+                DETECTIONS.labels("multi_sensor").inc()
+            events.append((self._room_ids[index], reasons))
+
+        self.ticks += 1
+        self.last_tick_seconds = time.perf_counter() - started
+        TICK_SECONDS.observe(self.last_tick_seconds)
+        return events
+
+    def start(self, callback, interval_seconds=1.0):
+        # Ticks every `interval_seconds` and calls callback(room_id, reasons) for each raised room.
+        threading.Thread(target=self._run, args=(callback, interval_seconds), name="anomaly-engine", daemon=True).start()
+        return self
+
+    def _run(self, callback, interval_seconds):
+        while True:
+            started = time.monotonic()
+            try:
+                for room_id, reasons in self.tick():
+                    callback(room_id, reasons)
+            except Exception as e:
+                print(f"ANOMALY ENGINE ERROR: {e}", file=sys.stderr)
+            time.sleep(max(0.0, interval_seconds - (time.monotonic() - started)))
@@ -1,25 +1,47 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, g
+import argparse
 import datetime
+import math
 import threading
 import time
-import requests 
-import json
 import sqlite3
-import subprocess 
 import sys 
-import shutil 
 import os     
+import socket
+import uuid
+from ring_buffer import SensorRingBuffer
+from live_stream import LiveStreamBroker, format_sse
+from alert_dispatcher import AlertDispatcher
+from db_access import Database
+from db_replication import DatabaseReplicator
+from status_scheduler import DeadlineScheduler
+from history_store import HistoryStore
+from detector_service import DetectorSupervisor
+from metrics import REGISTRY, CONTENT_TYPE, TimedLock, sample_stacks, format_collapsed, merge_exposition
+from state_backend import create_state_backend
+from occupancy_index import OccupancyIndex
+from anomaly_engine import AnomalyEngine
+from udp_ingest import UdpIngestListener
 
 app = Flask(__name__)
 
 # --- CONFIGURATION ---
 N8N_WEBHOOK_URL = "http://localhost:5678/webhook-test/974fe0a4-e3e4-408b-99a5-5e19f5893a09"
+ALERT_QUEUE_SIZE = 1000
+ALERT_MIN_INTERVAL_SECONDS = 30 # Repeat alerts for the same room and type are suppressed for this long
+ALERT_MAX_RETRIES = 3
 SMOKE_THRESHOLD = 400
 TEMPERATURE_THRESHOLD = 35.0
 MISSING_DATA_TIMEOUT_SECONDS = 15
 STALE_DATA_TIMEOUT_SECONDS = 8
 DATABASE_NAME = 'fire_incident.db'
 DETECTOR_SCRIPT_PATH = 'detector.py' 
+DETECTOR_ARGS = ["--headless"] # The detection host has no display; drop this to see the annotated window
+# Camera-to-room mapping passed to the detector when the file exists (format: cameras.example.json).
+# Without it the detector only watches camera 0 for R101, and says so in its log.
+DETECTOR_CAMERAS_FILE = 'cameras.json'
+# The detector runs from boot as a warm standby and is switched to full rate over this localhost port.
+DETECTOR_CONTROL_PORT = 5055
 
 INCIDENT_DB_NAME = 'incident_details.db'
 INCIDENT_DB_COPY_NAME = 'incident_details_llm_copy.db'
@@ -28,27 +50,128 @@ SOURCE_DB_PATH = DATABASE_NAME
 DEST_DB_FOLDER = 'retell-custom-llm-python-demo'
 DEST_DB_NAME = 'fire_incident_llm_copy.db'
 DEST_DB_PATH = os.path.join(DEST_DB_FOLDER, DEST_DB_NAME)
-COPY_INTERVAL_SECONDS = 3
+# Copies are pushed right after local commits; the poll only catches writes made by other processes.
+REPLICATION_POLL_INTERVAL_SECONDS = 1
+
+# Sensor history survives restarts, unlike the two databases above which are recreated on start.
+HISTORY_DB_NAME = 'sensor_history.db'
+HISTORY_FLUSH_INTERVAL_SECONDS = 1
+HISTORY_RAW_RETENTION_DAYS = 7
+HISTORY_DEFAULT_WINDOW_SECONDS = 3600
 
 SOURCE_INCIDENT_DB_PATH = INCIDENT_DB_NAME
 DEST_INCIDENT_DB_PATH = os.path.join(DEST_DB_FOLDER, INCIDENT_DB_COPY_NAME)
 
 MANUAL_ROOM_LIST = ["B001", "R101", "R103", "R202", "R203", "R207", "R301"]
 
+PEOPLE_COUNT_POLL_SECONDS = 1
+STREAM_CLIENT_QUEUE_SIZE = 500 # Events buffered per dashboard before it is told to resync
+STREAM_KEEPALIVE_SECONDS = 15
+MAX_BATCH_READINGS = 1000
+UDP_INGEST_PORT = int(os.environ.get("IRIS_UDP_PORT", "5056")) # Binary sensor frames (udp_ingest.py); 0 disables the listener
+# /debug/profile samples every thread's stack on demand. Off unless IRIS_PROFILER=1.
+PROFILER_ENABLED = os.environ.get("IRIS_PROFILER") == "1"
+PROFILER_MAX_SECONDS = 60
+
+# Room state lives in a state backend: "memory" for a single process (python app.py),
+# "sqlite" to share it between several server workers (see gunicorn.conf.py).
+STATE_BACKEND = os.environ.get("IRIS_STATE_BACKEND", "memory")
+STATE_DB_NAME = 'server_state.db'
+STATE_SYNC_INTERVAL_SECONDS = 0.2 # How often a worker picks up changes made by the other workers
+STATE_SYNC_BATCH = 5000 # Change log entries fetched per query
+STATE_LOG_KEEP_ENTRIES = 100000
+STATE_LOG_TRIM_INTERVAL_SECONDS = 60
+LEADER_LEASE_SECONDS = 10 # A leader that has not renewed for this long is replaced
+LEADER_POLL_SECONDS = 0.5 # Lease renewal, and how soon the leader sees a fire latched by another worker
+FIRE_ALERT_LATCH = "fire_alert"
+INCIDENT_LOGGED_LATCH = "incident_logged"
+
+# Trend-based detection, run by the leader next to the static thresholds above.
+ANOMALY_TICK_SECONDS = 1
+ANOMALY_RULE_OVERRIDES = {} # Site-wide changes to anomaly_engine.DEFAULT_RULE, e.g. {"debounce": 5}
+ANOMALY_ROOM_RULES = {} # e.g. {"B001": {"rate_of_rise_per_minute": 12}} for a room that normally heats up fast
+
+# --- Shared State ---
+# The state backend holds the authoritative room records, an ordered change log and
+# the cross-worker latches and leases. Each worker mirrors the change log into the
+# in-memory structures below, which serve the dashboard without touching the backend.
+state_backend = create_state_backend(STATE_BACKEND, STATE_DB_NAME, max_log_entries=STATE_LOG_KEEP_ENTRIES)
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+is_leader = False # True in the one worker that runs the detector and the other singleton jobs
+
 # --- In-Memory Data & State Storage ---
 sensor_data_storage = {}
 room_statuses = {}
 fire_alert_has_occurred = False
-MAX_DATA_POINTS_PER_ROOM = 50
-detection_process_started = False 
-incident_data_logged = False
-process_lock = threading.Lock()
-incident_lock = threading.Lock()
+MAX_DATA_POINTS_PER_ROOM = 50 # Points per room sent to the dashboard
+ROOM_HISTORY_CAPACITY = 2000 # Points per room kept in the in-memory ring buffer
+
+# --- Live-Data Change Tracking ---
+# Every change to a room (new point, status change, people count) is a change log entry,
+# and its sequence number is the room's version. Cursors handed to the dashboard are
+# "<boot id>-<version>": the boot id is shared by all workers of one server run, so a
+# restarted server never mistakes an old cursor for one of its own.
+state_lock = TimedLock("state") # Wait and hold times are exported on /metrics
+change_version = 0 # Last change log entry applied to this worker's mirror
+mirror_boot_id = None # Boot id of the shared state the mirror was built from
+people_counts_cache = {}
+occupancy_index = OccupancyIndex() # Serves /get_people_count; fed from the same change log as people_counts_cache
+# Events are published while holding state_lock so their order matches the versions.
+live_broker = LiveStreamBroker(max_queue_size=STREAM_CLIENT_QUEUE_SIZE)
+people_db = Database(DATABASE_NAME)
+incident_db = Database(INCIDENT_DB_NAME)
+history_store = HistoryStore(Database(HISTORY_DB_NAME), flush_interval_seconds=HISTORY_FLUSH_INTERVAL_SECONDS,
+                             raw_retention_days=HISTORY_RAW_RETENTION_DAYS)
+people_db_replicator = DatabaseReplicator(SOURCE_DB_PATH, DEST_DB_PATH, REPLICATION_POLL_INTERVAL_SECONDS, name="DB COPIER")
+incident_db_replicator = DatabaseReplicator(SOURCE_INCIDENT_DB_PATH, DEST_INCIDENT_DB_PATH, REPLICATION_POLL_INTERVAL_SECONDS, name="INCIDENT DB COPIER")
+# Stale/missing detection: every reading re-arms the room's deadlines, which fire in
+# stage order. A room recovers to NORMAL on its next reading in ingest_readings().
+ROOM_DEADLINE_STATUSES = ("STALE", "ALERT_MISSING")
+room_deadlines = DeadlineScheduler((STALE_DATA_TIMEOUT_SECONDS, MISSING_DATA_TIMEOUT_SECONDS), lambda room_id, stage: on_room_deadline(room_id, stage))
+people_db.add_commit_listener(people_db_replicator.notify)
+incident_db.add_commit_listener(incident_db_replicator.notify)
+detector_supervisor = DetectorSupervisor(DETECTOR_SCRIPT_PATH, DETECTOR_ARGS + (["--cameras", DETECTOR_CAMERAS_FILE] if os.path.exists(DETECTOR_CAMERAS_FILE) else []),
+                                         control_port=DETECTOR_CONTROL_PORT)
+# Every worker listens; with a shared backend they share the port and the kernel splits the sensors between them.
+udp_listener = UdpIngestListener(lambda readings: ingest_readings(readings), port=UDP_INGEST_PORT,
+                                 max_batch_readings=MAX_BATCH_READINGS, reuse_port=state_backend.shared)
+anomaly_engine = AnomalyEngine(**ANOMALY_RULE_OVERRIDES) # Fed from the change log in the leader only
+for _room_id, _rule in ANOMALY_ROOM_RULES.items():
+    anomaly_engine.set_rule(_room_id, **_rule)
+# Every worker sends its own alerts; the rate limit is shared through the state backend,
+# so several workers seeing the same room never send n8n the same alert twice.
+alert_dispatcher = AlertDispatcher(N8N_WEBHOOK_URL, max_queue_size=ALERT_QUEUE_SIZE,
+                                   min_interval_seconds=ALERT_MIN_INTERVAL_SECONDS, max_retries=ALERT_MAX_RETRIES,
+                                   claim=lambda key, min_interval_seconds: claim_alert(key, min_interval_seconds))
+
+# --- Metrics ---
+REQUEST_SECONDS = REGISTRY.histogram("iris_http_request_duration_seconds", "Time to handle an HTTP request, by route.", ("route", "method", "status"))
+READINGS = REGISTRY.counter("iris_sensor_readings_total", "Sensor readings ingested, by room.", ("room",))
+STATUS_TRANSITIONS = REGISTRY.counter("iris_room_status_transitions_total", "Room status changes.", ("from_status", "to_status"))
+LIVE_DATA_SECONDS = REGISTRY.histogram("iris_live_data_seconds", "Time spent on /get_live_data responses, by phase.", ("phase",))
+LIVE_DATA_BUILD_SECONDS = LIVE_DATA_SECONDS.labels("build") # Under state_lock
+LIVE_DATA_SERIALIZE_SECONDS = LIVE_DATA_SECONDS.labels("serialize")
+PEOPLE_COUNT_QUERIES = REGISTRY.counter("iris_people_count_queries_total", "/get_people_count calls, by scope and result.", ("scope", "result"))
+
+def count_rooms_by_status():
+    with state_lock:
+        counts = {}
+        for room_info in room_statuses.values():
+            counts[room_info.get("status")] = counts.get(room_info.get("status"), 0) + 1
+    return counts
+
+REGISTRY.gauge("iris_rooms", "Rooms by current status.", ("status",), callback=count_rooms_by_status)
+REGISTRY.gauge("iris_live_stream_subscribers", "Connected /live_stream clients.", callback=lambda: live_broker.subscriber_count())
+REGISTRY.gauge("iris_alert_queue_depth", "Alerts waiting for delivery to n8n.", callback=lambda: alert_dispatcher.queue_depth())
+REGISTRY.gauge("iris_detector_up", "1 while the detector process is running.", callback=lambda: int(detector_supervisor.status()["running"]))
 
 # --- DATABASE & INITIALIZATION FUNCTIONS ---
 
 def init_db():
-    conn = sqlite3.connect(DATABASE_NAME)
+    people_db.transaction(_create_people_detection_table).result()
+    print(f"SERVER: Database '{DATABASE_NAME}' initialized.")
+
+def _create_people_detection_table(conn):
     cursor = conn.cursor()
     cursor.execute('DROP TABLE IF EXISTS people_detection')
     cursor.execute('''
@@ -62,79 +185,382 @@ def init_db():
     ''')
     for room in MANUAL_ROOM_LIST:
         cursor.execute("INSERT OR IGNORE INTO people_detection (ruangan) VALUES (?)", (room,))
-    conn.commit()
-    conn.close()
-    print(f"SERVER: Database '{DATABASE_NAME}' initialized.")
 
 def init_incident_db():
-    conn = sqlite3.connect(INCIDENT_DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('DROP TABLE IF EXISTS initial_incident')
-    cursor.execute('''
+    incident_db.executescript('''
+        DROP TABLE IF EXISTS initial_incident;
         CREATE TABLE initial_incident (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             roomId TEXT NOT NULL,
             temperature REAL,
             smokeValue INTEGER,
             alertTime TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
+        );
+    ''').result()
     print(f"SERVER: Incident database '{INCIDENT_DB_NAME}' created.")
 
 # --- BACKGROUND PROCESSES (THREADS) ---
 
-def copy_database_periodically():
+def on_room_deadline(room_id, stage):
+    # Called by room_deadlines the moment a room has gone STALE_DATA_TIMEOUT_SECONDS
+    # (stage 0) or MISSING_DATA_TIMEOUT_SECONDS (stage 1) without a reading. Every
+    # worker's scheduler fires; the backend transaction lets only one of them act.
+    new_status, timeout = ROOM_DEADLINE_STATUSES[stage], room_deadlines.delays[stage]
+    with state_lock:
+        room_info = room_statuses.get(room_id)
+        if room_info is None or room_info.get("status") in ("ALERT_FIRE", "ALERT_MISSING", new_status):
+            return # Settled without a backend round trip
+
+    def mark_room(tx):
+        record = tx.get(room_id)
+        # --- MODIFICATION: Don't check status for rooms already in fire alert ---
+        if record is None or record.get("status") == "ALERT_FIRE":
+            return None
+        # A reading may have arrived, in any worker, since the deadline fired.
+        if time.time() - record.get("last_seen_epoch", 0) < timeout:
+            return None
+        if record.get("status") in ("ALERT_MISSING", new_status):
+            return None
+        if new_status == "ALERT_MISSING":
+            new_details = f"Data not received for > {MISSING_DATA_TIMEOUT_SECONDS} seconds."
+        else:
+            new_details = f"Data not updated for > {STALE_DATA_TIMEOUT_SECONDS} sec"
+        tx.put(room_id, "status", {"status": new_status, "details": new_details})
+        return record.get("status")
+
+    previous_status = state_backend.transaction(mark_room)
+    if previous_status is None:
+        return
+    print(f"SERVER: Status {room_id} -> {new_status}")
+    STATUS_TRANSITIONS.labels(previous_status, new_status).inc()
+    sync_state()
+
+    if new_status == "ALERT_MISSING":
+        send_alert_to_n8n(room_id=room_id, alert_type="MISSING")
+
+def refresh_people_counts():
+    try:
+        rows = people_db.query("SELECT ruangan, peopleCount FROM people_detection")
+    except sqlite3.Error as e:
+        print(f"SERVER ERROR: Failed to read people_detection from DB: {e}", file=sys.stderr)
+        return
+    with state_lock:
+        changed = [(room_id, people_count) for room_id, people_count in rows if people_counts_cache.get(room_id) != people_count]
+    if not changed:
+        return
+
+    def put_counts(tx):
+        for room_id, people_count in changed:
+            tx.put(room_id, "people", {"people_count": people_count})
+
+    state_backend.transaction(put_counts)
+    sync_state()
+
+def watch_people_counts_periodically():
     while True:
-        try:
-            if not os.path.exists(DEST_DB_FOLDER): os.makedirs(DEST_DB_FOLDER)
-            shutil.copy2(SOURCE_DB_PATH, DEST_DB_PATH)
-        except Exception as e:
-            print(f"DB COPIER ERROR: {e}", file=sys.stderr)
-        time.sleep(COPY_INTERVAL_SECONDS)
+        refresh_people_counts()
+        time.sleep(PEOPLE_COUNT_POLL_SECONDS)
 
-def copy_incident_db_periodically():
+def sync_state_periodically():
+    # Picks up changes written by the other workers; this worker's own changes are applied right after they commit.
     while True:
-        time.sleep(COPY_INTERVAL_SECONDS)
         try:
-            if not os.path.exists(SOURCE_INCIDENT_DB_PATH): continue
-            if not os.path.exists(DEST_DB_FOLDER): os.makedirs(DEST_DB_FOLDER)
-            shutil.copy2(SOURCE_INCIDENT_DB_PATH, DEST_INCIDENT_DB_PATH)
-        except Exception as e:
-            print(f"INCIDENT DB COPIER ERROR: {e}", file=sys.stderr)
-        
-def check_status_periodically():
+            sync_state()
+        except sqlite3.Error as e:
+            print(f"SERVER ERROR: Failed to read the shared state log: {e}", file=sys.stderr)
+        time.sleep(STATE_SYNC_INTERVAL_SECONDS)
+
+def lead_while_elected():
+    # Exactly one worker holds the leader lease and runs the jobs that must not run once
+    # per worker: the detector service, the people-count watcher, the DB copiers and the
+    # anomaly engine. A leader keeps the jobs it started, so the lease only moves on when
+    # its holder died (taking its detector with it) or stalled for longer than
+    # LEADER_LEASE_SECONDS.
+    global is_leader
+    holds_lease = False
+    last_trim = time.monotonic()
     while True:
-        time.sleep(STALE_DATA_TIMEOUT_SECONDS / 2)
-        current_time = time.time()
-        for room_id in list(room_statuses.keys()):
-            if room_id not in room_statuses: continue
-            room_info = room_statuses[room_id]
-            # --- MODIFICATION: Don't check status for rooms already in fire alert ---
-            if room_info.get("status") == "ALERT_FIRE":
-                continue
-            
-            time_since_last_seen = current_time - room_info.get("last_seen_epoch", 0)
-            new_status, new_details = room_info.get("status"), room_info.get("details", "")
-            
-            if time_since_last_seen > MISSING_DATA_TIMEOUT_SECONDS:
-                if new_status != "ALERT_MISSING":
-                    new_status, new_details = "ALERT_MISSING", f"Data not received for > {MISSING_DATA_TIMEOUT_SECONDS} seconds."
-                    send_alert_to_n8n(room_id=room_id, alert_type="MISSING")
-            elif time_since_last_seen > STALE_DATA_TIMEOUT_SECONDS:
-                if new_status not in ["ALERT_MISSING", "STALE"]:
-                    new_status, new_details = "STALE", f"Data not updated for > {STALE_DATA_TIMEOUT_SECONDS} sec"
-            elif new_status in ["ALERT_MISSING", "STALE", "UNKNOWN"]:
-                new_status, new_details = "NORMAL", f"Temperature: {room_info.get('temp_current')}°C, Smoke: {room_info.get('smoke_current')}"
-
-            if room_statuses[room_id].get("status") != new_status:
-                print(f"SERVER: Status {room_id} -> {new_status}")
-                room_statuses[room_id]["status"] = new_status
-                room_statuses[room_id]["details"] = new_details
+        try:
+            was_holding, holds_lease = holds_lease, state_backend.acquire_lease("leader", WORKER_ID, LEADER_LEASE_SECONDS)
+            if holds_lease and not is_leader:
+                is_leader = True
+                print(f"SERVER: Worker {WORKER_ID} is the leader; starting the detector service, people-count watcher, DB copiers and anomaly engine.")
+                start_leader_services()
+            elif was_holding and not holds_lease:
+                print(f"SERVER ERROR: Worker {WORKER_ID} lost the leader lease; another worker may start a second detector.", file=sys.stderr)
+            if is_leader:
+                if state_backend.is_latched(FIRE_ALERT_LATCH):
+                    start_detection_process() # Picks up a fire first seen by another worker
+                if time.monotonic() - last_trim > STATE_LOG_TRIM_INTERVAL_SECONDS:
+                    state_backend.trim_log(STATE_LOG_KEEP_ENTRIES)
+                    last_trim = time.monotonic()
+        except sqlite3.Error as e:
+            print(f"SERVER ERROR: Leader lease check failed: {e}", file=sys.stderr)
+        time.sleep(LEADER_POLL_SECONDS)
 
 # --- HELPER FUNCTIONS ---
 
+def sync_state():
+    # Applies the change log entries this worker has not seen yet to its mirror, in log order.
+    while True:
+        changes = state_backend.changes_since(change_version, limit=STATE_SYNC_BATCH)
+        if changes is None or state_backend.boot_id != mirror_boot_id:
+            reload_state_snapshot()
+            continue
+        with state_lock:
+            for seq, room_id, event, room_changes in changes:
+                if seq > change_version: # Another thread may have applied it already
+                    apply_change_locked(seq, room_id, event, room_changes)
+        occupancy_index.render_dirty()
+        if len(changes) < STATE_SYNC_BATCH:
+            return
+
+def reload_state_snapshot():
+    # For a worker that fell behind the trimmed change log: the current record of every
+    # room replaces the mirror's, but the points it missed are gone from its charts.
+    # After a reset of the shared state the old mirror is dropped and its versions restart.
+    global mirror_boot_id
+    seq, rooms = state_backend.snapshot()
+    with state_lock:
+        if state_backend.boot_id != mirror_boot_id:
+            forget_mirror_locked()
+            mirror_boot_id = state_backend.boot_id
+            print(f"SERVER: Worker {WORKER_ID} found the shared state reset; reloaded {len(rooms)} rooms.")
+        elif seq <= change_version:
+            return
+        else:
+            print(f"SERVER: Worker {WORKER_ID} fell behind the shared state log; reloaded {len(rooms)} rooms.")
+        for room_id, record in rooms.items():
+            apply_change_locked(seq, room_id, "status", record)
+    occupancy_index.render_dirty()
+
+def forget_mirror_locked():
+    # Caller must hold state_lock.
+    global change_version, fire_alert_has_occurred
+    for room_id in room_statuses:
+        room_deadlines.discard(room_id)
+    room_statuses.clear()
+    sensor_data_storage.clear()
+    people_counts_cache.clear()
+    occupancy_index.clear() # Rebuilt from the snapshot the caller applies next
+    change_version = 0
+    fire_alert_has_occurred = False
+
+def apply_change_locked(seq, room_id, event, changes):
+    # Caller must hold state_lock. `changes` holds the record fields that changed.
+    global change_version, fire_alert_has_occurred
+    change_version = seq
+    if "people_count" in changes:
+        people_counts_cache[room_id] = changes["people_count"]
+        occupancy_index.set(room_id, changes["people_count"])
+    if "status" in changes and room_id not in room_statuses:
+        room_statuses[room_id] = {}
+        sensor_data_storage[room_id] = SensorRingBuffer(ROOM_HISTORY_CAPACITY)
+    room_info = room_statuses.get(room_id)
+    if room_info is None:
+        return # People count for a room without sensors
+    room_info.update(changes)
+    room_info["version"] = seq
+    if event == "point":
+        sensor_data_storage[room_id].append(changes["last_seen_epoch"], changes["temp_current"], changes["smoke_current"], seq=seq)
+        if is_leader:
+            anomaly_engine.record(room_id, changes["last_seen_epoch"], changes["temp_current"], changes["smoke_current"])
+    if "last_seen_epoch" in changes:
+        room_deadlines.touch(room_id, changes["last_seen_epoch"])
+    if changes.get("status") == "ALERT_FIRE":
+        fire_alert_has_occurred = True
+    publish_room_locked(event, room_id, with_point=event == "point")
+
+def make_cursor(version):
+    return f"{state_backend.boot_id}-{version}"
+
+def parse_cursor(cursor):
+    # Returns None for cursors from another server run or from the future, which forces a full response.
+    try:
+        boot_id, version = cursor.split('-')
+        version = int(version)
+    except (AttributeError, ValueError):
+        return None
+    if boot_id != state_backend.boot_id or version > change_version:
+        return None
+    return version
+
+def room_snapshot_locked(room_id, history, replace):
+    # Caller must hold state_lock. Copies what room_entry() needs so the entry can be built
+    # after the lock is released. `history` is a RingView with the points to send; it stays
+    # valid until the room gets ROOM_HISTORY_CAPACITY - MAX_DATA_POINTS_PER_ROOM more points.
+    return dict(room_statuses[room_id]), people_counts_cache.get(room_id, -1), history, replace
+
+def room_entry(snapshot):
+    status_info, people_count, history, replace = snapshot
+    return {
+        "status": status_info.get("status", "UNKNOWN"),
+        "details": status_info.get("details", ""),
+        "last_update_iso": status_info.get("last_update_iso"),
+        "temperature_current": status_info.get("temp_current"),
+        "smoke_current": status_info.get("smoke_current"),
+        "people_count": people_count,
+        # The client replaces its history instead of appending when this is a
+        # full response or when the delta alone already fills the chart.
+        "replace": replace,
+        "labels": history.labels(),
+        "temperatures": history.temperatures(),
+        "smokeValues": history.smoke_values()
+    }
+
+def publish_room_locked(event, room_id, with_point=False):
+    # Caller must hold state_lock. Stream events have the same shape as a delta response.
+    # The entry holds at most one point, so it is copied here; the broker's publisher
+    # thread serializes it after the lock is released.
+    if not live_broker.subscriber_count():
+        return
+    history = sensor_data_storage[room_id].tail(1 if with_point else 0)
+    live_broker.publish(event, {
+        "rooms": {room_id: room_entry(room_snapshot_locked(room_id, history, replace=False))},
+        "fire_alert_triggered": fire_alert_has_occurred,
+        "cursor": make_cursor(change_version),
+        "delta": True,
+        "max_points": MAX_DATA_POINTS_PER_ROOM
+    }, version=change_version)
+
+def parse_reading(data):
+    # Returns (room_id, temperature, smoke_value) or raises ValueError for an unusable reading.
+    if not isinstance(data, dict) or "roomId" not in data:
+        raise ValueError("Invalid data: roomId missing")
+    room_id = data["roomId"]
+    if not isinstance(room_id, str) or not room_id.strip():
+        raise ValueError("Invalid data: roomId must be a non-empty string")
+    temp = parse_sensor_value(data.get("temperature"), "temperature")
+    smoke_value = parse_sensor_value(data.get("smokeValue"), "smokeValue")
+    return room_id, temp, int(smoke_value) if smoke_value is not None else None
+
+def parse_sensor_value(value, field):
+    # None stays None (sensor without that reading); anything else must be a finite number
+    # or a numeric string such as "25.3", which older sensor firmware sends.
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        number = math.nan
+    if isinstance(value, bool) or not math.isfinite(number):
+        raise ValueError(f"Invalid data: {field} must be a finite number")
+    return number
+
+def ingest_readings(readings):
+    # Evaluates the readings against the rooms' shared records in one state backend
+    # transaction, applies the result to this worker's mirror, then runs the fire
+    # response once for the whole batch. Returns the room status after each reading.
+    current_time_epoch = time.time()
+    current_time_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+    def evaluate(tx):
+        statuses_after, fire_events, transitions = [], [], []
+        for room_id, temp, smoke_value in readings:
+            alert_reasons_list = []
+            if temp is not None and temp > TEMPERATURE_THRESHOLD: alert_reasons_list.append(f"High Temperature ({temp}°C)")
+            if smoke_value is not None and smoke_value > SMOKE_THRESHOLD: alert_reasons_list.append(f"Smoke Detected")
+
+            record = tx.get(room_id)
+            previous_status = record.get("status", "NEW") if record is not None else "NEW"
+
+            if alert_reasons_list:
+                current_status = "ALERT_FIRE"
+                details_message = f"FIRE! {', '.join(alert_reasons_list)}"
+                fire_events.append((room_id, temp, smoke_value, alert_reasons_list, details_message))
+            # If the status of this room is ALREADY fire detected, DO NOT change it back to NORMAL.
+            # Let the status be locked as ALERT_FIRE.
+            elif previous_status == "ALERT_FIRE":
+                current_status = "ALERT_FIRE"
+                details_message = record.get("details") # Use the existing fire message detail
+            else:
+                # If there has never been a fire, then the status is NORMAL.
+                current_status = "NORMAL"
+                details_message = f"Temperature: {temp}°C, Smoke: {smoke_value}" if temp is not None and smoke_value is not None else "Incomplete sensor data"
+
+            if current_status != previous_status:
+                transitions.append((previous_status, current_status))
+            tx.put(room_id, "point", {
+                "status": current_status, "details": details_message,
+                "last_seen_epoch": current_time_epoch, "last_update_iso": current_time_iso,
+                "temp_current": temp, "smoke_current": smoke_value
+            })
+            statuses_after.append(current_status)
+        return statuses_after, fire_events, transitions
+
+    statuses_after, fire_events, transitions = state_backend.transaction(evaluate)
+    # Counted once committed: a rolled-back transaction counts nothing, a retried one counts once
+    for room_id, _, _ in readings:
+        READINGS.labels(room_id).inc()
+    for previous_status, current_status in transitions:
+        STATUS_TRANSITIONS.labels(previous_status, current_status).inc()
+    sync_state()
+    history_store.record_many([(room_id, current_time_epoch, temp, smoke_value) for room_id, temp, smoke_value in readings])
+
+    if fire_events:
+        respond_to_fire(fire_events, current_time_iso)
+
+    return statuses_after
+
+def respond_to_fire(fire_events, alert_time_iso):
+    # fire_events: (room_id, temp, smoke_value, reasons, details_message) per room that just went ALERT_FIRE.
+    # The latch is shared by all workers, so the emergency is announced exactly once.
+    if state_backend.try_latch(FIRE_ALERT_LATCH):
+        print("SERVER: !!! FIRST FIRE DETECTED !!! Emergency mode activated.")
+    for room_id, temp, smoke_value, alert_reasons_list, details_message in fire_events:
+        print(f"SERVER: ALERT! Fire detected in {room_id}. Reason: {details_message}")
+        send_alert_to_n8n(room_id=room_id, alert_type="FIRE", temperature=temp, smoke_value=smoke_value, reasons=alert_reasons_list, message_override=details_message)
+    room_id, temp, smoke_value = fire_events[0][:3]
+    log_first_incident(room_id, temp, smoke_value, alert_time_iso)
+    start_detection_process()
+
+def on_anomaly(room_id, reasons):
+    # Called from the anomaly engine's thread in the leader when a room's readings are
+    # rising like a fire before they cross the static thresholds.
+    alert_time_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    details_message = f"FIRE! {', '.join(reasons)}"
+
+    def raise_room(tx):
+        record = tx.get(room_id)
+        if record is None or record.get("status") == "ALERT_FIRE":
+            return None
+        tx.put(room_id, "status", {"status": "ALERT_FIRE", "details": details_message})
+        return record
+
+    record = state_backend.transaction(raise_room)
+    if record is None:
+        return
+    STATUS_TRANSITIONS.labels(record.get("status", "NEW"), "ALERT_FIRE").inc()
+    sync_state()
+    respond_to_fire([(room_id, record.get("temp_current"), record.get("smoke_current"), reasons, details_message)], alert_time_iso)
+
+def log_first_incident(room_id, temp, smoke_value, alert_time_iso):
+    # Claimed up front so the ingest path never waits for the write; released again if it fails.
+    if not state_backend.try_latch(INCIDENT_LOGGED_LATCH): return
+    future = incident_db.execute("INSERT INTO initial_incident (roomId, temperature, smokeValue, alertTime) VALUES (?, ?, ?, ?)", (room_id, temp, smoke_value, alert_time_iso))
+    future.add_done_callback(lambda f: _on_incident_logged(f, room_id))
+
+def _on_incident_logged(future, room_id):
+    if future.exception() is None:
+        print(f"SERVER: First incident detail for {room_id} has been logged in '{INCIDENT_DB_NAME}'.")
+        return
+    print(f"SERVER ERROR: Failed to log first incident data: {future.exception()}", file=sys.stderr)
+    state_backend.release_latch(INCIDENT_LOGGED_LATCH)
+
+def start_detection_process():
+    # The detector is already running with the model and cameras loaded; this only
+    # switches it to full-rate detection and never blocks the ingest path. Only the
+    # leader runs the detector; it switches it within LEADER_POLL_SECONDS of another
+    # worker latching the fire.
+    if is_leader and detector_supervisor.activate():
+        print("SERVER: Fire condition detected. Switching the detector service to full-rate detection...")
+
+def claim_alert(key, min_interval_seconds):
+    # A lease with a new owner for every claim: refused to every worker, this one included,
+    # until the last sent alert for (room, alert type) is `min_interval_seconds` old.
+    room_id, alert_type = key
+    return state_backend.acquire_lease(f"alert:{room_id}:{alert_type}", uuid.uuid4().hex, min_interval_seconds)
+
 def send_alert_to_n8n(room_id, alert_type, temperature=None, smoke_value=None, reasons=None, message_override=None):
     if not N8N_WEBHOOK_URL or "URL_WEBHOOK" in N8N_WEBHOOK_URL: return
     current_alert_time = datetime.datetime.now(datetime.timezone.utc).isoformat()
@@ -142,8 +568,8 @@ def send_alert_to_n8n(room_id, alert_type, temperature=None, smoke_value=None, r
     if alert_type == "FIRE": payload["message"] = message_override or f"POTENTIAL FIRE in {room_id}!"
     elif alert_type == "MISSING": payload["message"] = f"WARNING! Sensor data from {room_id} not received for > {MISSING_DATA_TIMEOUT_SECONDS} sec."
     else: return
-    try: requests.post(N8N_WEBHOOK_URL, data=json.dumps(payload), headers={'Content-Type': 'application/json'}, timeout=10).raise_for_status()
-    except requests.exceptions.RequestException as e: print(f"SERVER ERROR: Failed to send '{alert_type}' alert to n8n for {room_id}: {e}", file=sys.stderr)
+    # Delivery, coalescing, rate limiting and retries happen on the dispatcher's worker threads.
+    alert_dispatcher.submit(payload)
 
 
 # --- FLASK ROUTES ---
@@ -154,169 +580,335 @@ def index():
 
 @app.route('/sensordata', methods=['POST'])
 def receive_sensor_data():
-    global detection_process_started, incident_data_logged, fire_alert_has_occurred
     try:
-        data = request.get_json()
-        if not data or "roomId" not in data:
-            return jsonify({"status": "error", "message": "Invalid data: roomId missing"}), 400
-            
-        room_id = data.get("roomId")
-        
-        current_time_epoch = time.time()
-        current_time_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
-        temp = float(data.get("temperature")) if data.get("temperature") is not None else None
-        smoke_value = int(data.get("smokeValue")) if data.get("smokeValue") is not None else None
-        
-        if room_id not in room_statuses:
-            room_statuses[room_id] = {"status": "NORMAL", "details": "Receiving data..."}
-            sensor_data_storage[room_id] = []
-        
-        room_statuses[room_id].update({
-            "last_seen_epoch": current_time_epoch, "last_update_iso": current_time_iso,
-            "temp_current": temp, "smoke_current": smoke_value
-        })
-        
-        sensor_point = {"timestamp": current_time_iso, "temperature": temp, "smokeValue": smoke_value}
-        sensor_data_storage[room_id].append(sensor_point)
-        if len(sensor_data_storage[room_id]) > MAX_DATA_POINTS_PER_ROOM:
-            sensor_data_storage[room_id].pop(0)
-
-        alert_reasons_list = []
-        if temp is not None and temp > TEMPERATURE_THRESHOLD: alert_reasons_list.append(f"High Temperature ({temp}°C)")
-        if smoke_value is not None and smoke_value > SMOKE_THRESHOLD: alert_reasons_list.append(f"Smoke Detected")
-
-        if alert_reasons_list:
-            if not fire_alert_has_occurred:
-                print("SERVER: !!! FIRST FIRE DETECTED !!! Emergency mode activated.")
-                fire_alert_has_occurred = True
-
-            current_status = "ALERT_FIRE"
-            details_message = f"FIRE! {', '.join(alert_reasons_list)}"
-            print(f"SERVER: ALERT! Fire detected in {room_id}. Reason: {details_message}")
-            send_alert_to_n8n(room_id=room_id, alert_type="FIRE", temperature=temp, smoke_value=smoke_value, reasons=alert_reasons_list, message_override=details_message)
-            
-            with incident_lock:
-                if not incident_data_logged:
-                    try:
-                        conn = sqlite3.connect(INCIDENT_DB_NAME)
-                        cursor = conn.cursor()
-                        cursor.execute("INSERT INTO initial_incident (roomId, temperature, smokeValue, alertTime) VALUES (?, ?, ?, ?)", (room_id, temp, smoke_value, current_time_iso))
-                        conn.commit()
-                        conn.close()
-                        incident_data_logged = True
-                        print(f"SERVER: First incident detail for {room_id} has been logged in '{INCIDENT_DB_NAME}'.")
-                    except Exception as e:
-                        print(f"SERVER ERROR: Failed to log first incident data: {e}", file=sys.stderr)
-
-            with process_lock:
-                if not detection_process_started:
-                    print("SERVER: Fire condition detected. Attempting to run detection script...")
-                    try:
-                        subprocess.Popen([sys.executable, DETECTOR_SCRIPT_PATH])
-                        detection_process_started = True 
-                        print(f"SERVER: Script '{DETECTOR_SCRIPT_PATH}' executed successfully.")
-                    except Exception as e:
-                        print(f"SERVER ERROR: Failed to execute detector.py script: {e}", file=sys.stderr)
-        else:
-            # If the status of this room is ALREADY fire detected, DO NOT change it back to NORMAL.
-            # Let the status be locked as ALERT_FIRE.
-            if room_statuses[room_id].get("status") == "ALERT_FIRE":
-                current_status = "ALERT_FIRE"
-                details_message = room_statuses[room_id].get("details") # Use the existing fire message detail
-            else:
-                # If there has never been a fire, then the status is NORMAL.
-                current_status = "NORMAL"
-                details_message = f"Temperature: {temp}°C, Smoke: {smoke_value}" if temp is not None and smoke_value is not None else "Incomplete sensor data"
-        
-        room_statuses[room_id]["status"] = current_status
-        room_statuses[room_id]["details"] = details_message
+        data = request.get_json(silent=True)
+        try:
+            reading = parse_reading(data)
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        ingest_readings([reading])
         return jsonify({"status": "success", "message": "Data received"}), 200
     except Exception as e:
         print(f"SERVER ERROR: Error processing sensor data: {e}", file=sys.stderr)
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/sensordata/batch', methods=['POST'])
+def receive_sensor_data_batch():
+    # Accepts a JSON list of readings (or {"readings": [...]}) for any mix of rooms.
+    # Invalid items are reported individually; the rest are applied together.
+    try:
+        data = request.get_json(silent=True)
+        readings = data.get("readings") if isinstance(data, dict) else data
+        if not isinstance(readings, list):
+            return jsonify({"status": "error", "message": "Invalid data: expected a list of readings"}), 400
+        if len(readings) > MAX_BATCH_READINGS:
+            return jsonify({"status": "error", "message": f"Batch too large: at most {MAX_BATCH_READINGS} readings"}), 413
+
+        parsed_readings, results = [], []
+        for index, item in enumerate(readings):
+            room_id = item.get("roomId") if isinstance(item, dict) else None
+            try:
+                parsed_readings.append(parse_reading(item))
+                results.append({"index": index, "roomId": room_id, "status": "success"})
+            except ValueError as e:
+                results.append({"index": index, "roomId": room_id, "status": "error", "message": str(e)})
+
+        room_statuses_after = iter(ingest_readings(parsed_readings))
+        for result in results:
+            if result["status"] == "success":
+                result["roomStatus"] = next(room_statuses_after)
+
+        accepted = len(parsed_readings)
+        return jsonify({
+            "status": "success" if accepted == len(results) else "partial",
+            "accepted": accepted,
+            "rejected": len(results) - accepted,
+            "results": results
+        }), 200
+    except Exception as e:
+        print(f"SERVER ERROR: Error processing sensor data batch: {e}", file=sys.stderr)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @app.route('/get_live_data')
 def get_live_data():
-    global fire_alert_has_occurred
-    response_data = {}
-    
-    people_counts = {}
-    try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
-        cursor.execute("SELECT ruangan, peopleCount FROM people_detection")
-        rows = cursor.fetchall()
-        for row in rows:
-            people_counts[row[0]] = row[1]
-        conn.close()
-    except sqlite3.Error as e:
-        print(f"SERVER ERROR: Failed to read people_detection from DB: {e}", file=sys.stderr)
+    # Full snapshot of every room, or with ?since=<cursor> only the rooms, points and
+    # status changes after that cursor. Answers 304 when the client's ETag is current.
+    since = request.args.get('since')
+    with state_lock:
+        cursor = make_cursor(change_version)
+        if request.if_none_match.contains(cursor):
+            not_modified = app.response_class(status=304)
+            not_modified.set_etag(cursor)
+            not_modified.headers['Cache-Control'] = 'no-cache'
+            return not_modified
+        with LIVE_DATA_BUILD_SECONDS.time():
+            snapshot = live_data_locked(parse_cursor(since) if since else None)
 
+    with LIVE_DATA_SERIALIZE_SECONDS.time():
+        response = jsonify(render_live_data(snapshot))
+    response.set_etag(cursor)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def live_data_locked(since_version):
+    # Caller must hold state_lock. Only copies room records and takes ring buffer views;
+    # render_live_data() builds the point lists once the lock is released.
+    rooms = []
     for room_id, status_info in room_statuses.items():
-        data_list = sensor_data_storage.get(room_id, [])
-        response_data[room_id] = {
-            "status": status_info.get("status", "UNKNOWN"),
-            "details": status_info.get("details", ""),
-            "last_update_iso": status_info.get("last_update_iso"),
-            "temperature_current": status_info.get("temp_current"),
-            "smoke_current": status_info.get("smoke_current"),
-            "people_count": people_counts.get(room_id, -1),
-            "labels": [datetime.datetime.fromisoformat(d['timestamp']).strftime('%H:%M:%S') for d in data_list],
-            "temperatures": [d['temperature'] for d in data_list],
-            "smokeValues": [d['smokeValue'] for d in data_list]
-        }
-    
-    return jsonify({
-        "rooms": response_data,
-        "fire_alert_triggered": fire_alert_has_occurred
-    })
+        if since_version is not None and status_info.get("version", 0) <= since_version:
+            continue
+        history = sensor_data_storage[room_id].tail(MAX_DATA_POINTS_PER_ROOM, since_seq=since_version)
+        replace = since_version is None or len(history) >= MAX_DATA_POINTS_PER_ROOM
+        rooms.append((room_id, room_snapshot_locked(room_id, history, replace)))
+    return {
+        "rooms": rooms,
+        "fire_alert_triggered": fire_alert_has_occurred,
+        "cursor": make_cursor(change_version),
+        "delta": since_version is not None,
+        "max_points": MAX_DATA_POINTS_PER_ROOM
+    }
+
+def render_live_data(snapshot):
+    return dict(snapshot, rooms={room_id: room_entry(room_snapshot) for room_id, room_snapshot in snapshot["rooms"]})
+
+@app.route('/live_stream')
+def live_stream():
+    # Server-Sent Events: a full snapshot first, then "point", "status" and "people"
+    # events in the same shape as a /get_live_data delta.
+    with state_lock:
+        subscription = live_broker.subscribe(since_version=change_version)
+        snapshot = live_data_locked(None)
+
+    def generate():
+        try:
+            yield format_sse('snapshot', render_live_data(snapshot))
+            yield from subscription.messages(STREAM_KEEPALIVE_SECONDS)
+        finally:
+            live_broker.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/history')
+def get_history():
+    # ?room=<id>&start=<epoch|ISO>&end=<epoch|ISO>&resolution=auto|raw|1m|1h
+    # "auto" serves raw rows for windows up to an hour, 1-minute rollups up to two days
+    # and 1-hour rollups beyond that.
+    room_id = request.args.get('room')
+    if not room_id:
+        return jsonify({"status": "error", "message": "Missing 'room' parameter"}), 400
+    try:
+        end = parse_time_param(request.args.get('end'), time.time())
+        start = parse_time_param(request.args.get('start'), end - HISTORY_DEFAULT_WINDOW_SECONDS)
+        if start > end:
+            raise ValueError("'start' must not be after 'end'")
+        resolution, series = history_store.query_range(room_id, start, end, request.args.get('resolution', 'auto'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        print(f"SERVER ERROR: Failed to query history: {e}", file=sys.stderr)
+        return jsonify({"status": "error", "message": "An internal error occurred while reading history."}), 500
+    return jsonify({"status": "success", "roomId": room_id, "start": start, "end": end, "resolution": resolution, **series})
+
+def parse_time_param(value, default):
+    if value is None or value == '':
+        return default
+    try:
+        epoch = float(value)
+    except ValueError:
+        parsed = datetime.datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return parsed.timestamp()
+    if not math.isfinite(epoch):
+        raise ValueError(f"Invalid time '{value}': expected a finite epoch or an ISO 8601 timestamp")
+    return epoch
+
+@app.route('/alert_metrics')
+def alert_metrics():
+    return jsonify(alert_dispatcher.metrics())
+
+@app.route('/detector_status')
+def detector_status():
+    return jsonify(detector_supervisor.status())
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus text format. The detector's own metrics are fetched by its supervisor and
+    # labelled process="detector"; families both processes export (the SQLite ones) are merged.
+    body = merge_exposition(REGISTRY.render(), detector_supervisor.detector_metrics, {"process": "detector"})
+    return Response(body, content_type=CONTENT_TYPE)
+
+@app.route('/debug/profile')
+def debug_profile():
+    # ?seconds=5&interval_ms=5&idle=0 -> collapsed stacks ("frame;frame;... count"), hottest first,
+    # ready for flamegraph.pl or speedscope. Opt-in, since sampling slows every thread a little.
+    if not PROFILER_ENABLED:
+        return jsonify({"status": "error", "message": "Profiler disabled; start the server with IRIS_PROFILER=1"}), 404
+    try:
+        seconds = min(float(request.args.get('seconds', 5)), PROFILER_MAX_SECONDS)
+        interval = max(float(request.args.get('interval_ms', 5)), 1) / 1000
+    except ValueError:
+        return jsonify({"status": "error", "message": "seconds and interval_ms must be numbers"}), 400
+    result = sample_stacks(seconds, interval, include_idle=request.args.get('idle') == '1')
+    if result is None:
+        return jsonify({"status": "error", "message": "A profile is already running"}), 409
+    stacks, samples = result
+    print(f"SERVER: Profiled {samples} samples over {seconds}s.")
+    return Response(format_collapsed(stacks, limit=int(request.args.get('top', 500))), mimetype='text/plain',
+                    headers={'X-Profile-Samples': str(samples)})
+
+# --- REQUEST TIMING ---
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_duration(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # The route pattern, not the URL, so query strings and room ids don't add series.
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.labels(route, request.method, response.status_code).observe(time.perf_counter() - started)
+    return response
+
+
+@app.route('/update_people_count', methods=['POST'])
+def update_people_count():
+    # Called by detector.py. Body: {"counts": {"R101": 3, ...}} for per-room counts or
+    # {"peopleCount": 3} to apply one count to every room. Written by the shared writer thread.
+    try:
+        timestamp, counts, all_rooms_count = parse_people_counts(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    try:
+        future = people_db.transaction(lambda conn: write_people_counts(conn, timestamp, counts=counts, all_rooms_count=all_rooms_count))
+        updated = future.result(timeout=10)
+    except Exception as e:
+        print(f"SERVER ERROR: Failed to store people count: {e}", file=sys.stderr)
+        return jsonify({"status": "error", "message": str(e)}), 500
+    refresh_people_counts() # Into the occupancy index now rather than on the leader's next poll
+    return jsonify({"status": "success", "updated": updated}), 200
+
+def parse_people_counts(data):
+    # Returns (timestamp, counts, all_rooms_count) or raises ValueError for a malformed body.
+    if not isinstance(data, dict):
+        raise ValueError("Invalid data: expected a JSON object")
+    timestamp = data.get("timestamp") or datetime.datetime.now(datetime.timezone.utc).isoformat()
+    if not isinstance(timestamp, str):
+        raise ValueError("Invalid data: timestamp must be a string")
+    counts, all_rooms_count = data.get("counts"), data.get("peopleCount")
+    if counts is None and all_rooms_count is None:
+        raise ValueError("Invalid data: counts or peopleCount missing")
+    if counts is not None:
+        if not isinstance(counts, dict) or not all(isinstance(room_id, str) and room_id for room_id in counts):
+            raise ValueError("Invalid data: counts must map room ids to people counts")
+        if not all(is_people_count(count) for count in counts.values()):
+            raise ValueError("Invalid data: every count must be an integer")
+    elif not is_people_count(all_rooms_count):
+        raise ValueError("Invalid data: peopleCount must be an integer")
+    return timestamp, counts, all_rooms_count
+
+def is_people_count(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def write_people_counts(conn, timestamp, counts=None, all_rooms_count=None):
+    cursor = conn.cursor()
+    if counts is None:
+        cursor.execute("UPDATE people_detection SET peopleCount = ?, lastUpdateTimeStamp = ?", (int(all_rooms_count), timestamp))
+        updated = cursor.rowcount
+    else:
+        cursor.executemany("UPDATE people_detection SET peopleCount = ?, lastUpdateTimeStamp = ? WHERE ruangan = ?",
+                           [(int(count), timestamp, room_id) for room_id, count in counts.items()])
+        updated = cursor.rowcount
+    cursor.execute("UPDATE people_detection SET lastDetectedTimeStamp = ? WHERE peopleCount > 0 AND lastUpdateTimeStamp = ?", (timestamp, timestamp))
+    return updated
 
 
 # --- RETELL AI TOOL ENDPOINT ---
 @app.route('/get_people_count', methods=['GET'])
 def get_people_count():
-    print("\n--- RETELL AI TOOL INVOCATION ---")
-    print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Endpoint /get_people_count accessed.")
+    # ?ruangan=R101 for one room, ?ruangan=R101,R103 for several, ?lantai=1 for a floor,
+    # nothing for the whole building. Served from the occupancy index: this is on the
+    # voice agent's response path, so no SQL and no per-call logging (see /metrics).
     room_to_query = request.args.get('ruangan')
-    if room_to_query == '{{arguments.room_id}}':
-        print("LOG: Placeholder '{{arguments.room_id}}' detected. Redirecting to total building request.")
+    floor_to_query = request.args.get('lantai')
+    # Unfilled Retell placeholders such as '{{arguments.room_id}}' mean "the whole building".
+    if room_to_query and room_to_query.startswith('{{'):
         room_to_query = None
+    if floor_to_query and floor_to_query.startswith('{{'):
+        floor_to_query = None
+
+    if room_to_query and ',' in room_to_query:
+        body, found = occupancy_index.rooms([room_id.strip() for room_id in room_to_query.split(',') if room_id.strip()])
+        return people_count_response("batch", body, 200 if found else 404)
     if room_to_query:
-        print(f"LOG: Received request for specific room: '{room_to_query}'")
-    else:
-        print("LOG: Received request for total people in the entire building.")
-    try:
-        conn = sqlite3.connect(DATABASE_NAME) 
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        if room_to_query:
-            cursor.execute("SELECT ruangan, peopleCount FROM people_detection WHERE ruangan = ?", (room_to_query,))
-            data = cursor.fetchone()
-            conn.close()
-            if data:
-                return jsonify({"status": "success", "ruangan": data["ruangan"], "jumlah_orang": data["peopleCount"] if data["peopleCount"] is not None and data["peopleCount"] >= 0 else 0}), 200
-            else:
-                return jsonify({"status": "error", "message": f"Room '{room_to_query}' not found."}), 404
-        else:
-            cursor.execute("SELECT SUM(peopleCount) as total FROM people_detection WHERE peopleCount > 0")
-            total_people_data = cursor.fetchone()
-            total_people = total_people_data['total'] if total_people_data and total_people_data['total'] is not None else 0
-            cursor.execute("SELECT ruangan, peopleCount FROM people_detection WHERE peopleCount > 0 ORDER BY ruangan")
-            details = [dict(row) for row in cursor.fetchall()]
-            conn.close()
-            return jsonify({"status": "success", "total_people": total_people, "details": details}), 200
-    except Exception as e:
-        print(f"API TOOL ERROR: Failed to retrieve people count data: {e}", file=sys.stderr)
-        return jsonify({"status": "error", "message": "An internal error occurred while accessing data."}), 500
+        body = occupancy_index.room(room_to_query)
+        if body is None:
+            PEOPLE_COUNT_QUERIES.labels("room", "not_found").inc()
+            return jsonify({"status": "error", "message": f"Room '{room_to_query}' not found."}), 404
+        return people_count_response("room", body, 200)
+    if floor_to_query:
+        body = occupancy_index.floor(floor_to_query)
+        if body is None:
+            PEOPLE_COUNT_QUERIES.labels("floor", "not_found").inc()
+            return jsonify({"status": "error", "message": f"Floor '{floor_to_query}' not found."}), 404
+        return people_count_response("floor", body, 200)
+    return people_count_response("building", occupancy_index.building(), 200)
+
+def people_count_response(scope, body, status_code):
+    PEOPLE_COUNT_QUERIES.labels(scope, "ok" if status_code == 200 else "not_found").inc()
+    return app.response_class(body, status=status_code, mimetype='application/json')
+
+# --- STARTUP ---
+
+def init_storage():
+    # Recreates the databases and the shared state. Runs once per server start, before any worker serves requests.
+    init_db()
+    global mirror_boot_id
+    init_incident_db()
+    state_backend.reset()
+    mirror_boot_id = state_backend.boot_id
+    # So /get_people_count knows every room from the start, not only after the leader's first poll.
+    refresh_people_counts()
+
+def start_background_services():
+    # Runs in every worker.
+    global mirror_boot_id
+    mirror_boot_id = state_backend.boot_id
+    history_store.init_schema()
+    alert_dispatcher.start()
+    live_broker.start()
+    room_deadlines.start()
+    history_store.start()
+    if UDP_INGEST_PORT:
+        udp_listener.start()
+    if state_backend.shared:
+        try:
+            sync_state() # Catch up before serving, so this worker's occupancy index is complete
+        except sqlite3.Error as e:
+            print(f"SERVER ERROR: Failed to read the shared state log: {e}", file=sys.stderr)
+        threading.Thread(target=sync_state_periodically, name="state-sync", daemon=True).start()
+    threading.Thread(target=lead_while_elected, name="leader-lease", daemon=True).start()
+
+def start_leader_services():
+    people_db_replicator.start()
+    incident_db_replicator.start()
+    detector_supervisor.start()
+    anomaly_engine.start(on_anomaly, ANOMALY_TICK_SECONDS)
+    threading.Thread(target=watch_people_counts_periodically, daemon=True).start()
 
 # --- MAIN EXECUTION BLOCK ---
 if __name__ == '__main__':
-    init_db() 
-    init_incident_db()
-    
-    threading.Thread(target=copy_database_periodically, daemon=True).start()
-    threading.Thread(target=copy_incident_db_periodically, daemon=True).start()
-    threading.Thread(target=check_status_periodically, daemon=True).start()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--init-only", action="store_true", help="Recreate the databases and the shared state, then exit (used by gunicorn.conf.py)")
+    args = parser.parse_args()
+
+    init_storage()
+    if args.init_only:
+        sys.exit(0)
+
+    start_background_services()
     print("SERVER: All background processes have been started.")
     
     print("\nSERVER: Flask application is ready to accept requests at http://0.0.0.0:5000")
@@ -0,0 +1,134 @@
+"""
+Benchmark for the vectorized anomaly engine on a simulated clock.
+
+Feeds N rooms of noisy readings plus a few rooms whose temperature, smoke or both
+start ramping up, then ticks once per simulated second. Reports the cost per recorded
+reading and per tick, how many seconds after ignition the fire rooms were raised
+compared with the static thresholds, and any false positives among the quiet rooms.
+For reference it also times the same slope math as a per-room Python loop.
+
+The default noise is that of a typical temperature and smoke sensor; sensor_simulator.py
+draws uniformly from 25-30 °C and 50-150, which is --temperature-noise 1.44 --smoke-noise 29.
+
+    python benchmarks/bench_anomaly_engine.py --rooms 5000
+    python benchmarks/bench_anomaly_engine.py --rooms 5000 --temperature-noise 1.44 --smoke-noise 29
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anomaly_engine import AnomalyEngine
+from load_generator import summarize_latencies
+
+# Same as app.py's static thresholds.
+TEMPERATURE_THRESHOLD = 35.0
+SMOKE_THRESHOLD = 400
+
+
+def python_slope(points):
+    # Per-room least-squares slope, the way it would be written without NumPy.
+    n = len(points)
+    t_mean = sum(t for t, _ in points) / n
+    v_mean = sum(v for _, v in points) / n
+    numerator = sum((t - t_mean) * (v - v_mean) for t, v in points)
+    denominator = sum((t - t_mean) ** 2 for t, _ in points)
+    return numerator / denominator * 60 if denominator else None
+
+
+FIRE_KINDS = ("temperature", "smoke", "both")
+BASE_TEMPERATURE, BASE_SMOKE = 27.5, 100
+
+
+def run(rooms, fire_rooms, warmup_seconds, fire_seconds, reading_interval, temperature_noise, smoke_noise,
+        temperature_ramp, smoke_ramp, seed):
+    rng = random.Random(seed)
+    engine = AnomalyEngine()
+    room_ids = [f"R{index:05d}" for index in range(rooms)]
+    fires = {room_id: FIRE_KINDS[index % len(FIRE_KINDS)] for index, room_id in enumerate(rng.sample(room_ids, fire_rooms))}
+    offsets = {room_id: rng.uniform(0, reading_interval) for room_id in room_ids} # Sensors are not synchronized
+    ignition = warmup_seconds
+    raised_at, static_at, false_positives = {}, {}, []
+    record_seconds, records, tick_seconds = 0.0, 0, []
+    clock = 0.0
+
+    while clock < warmup_seconds + fire_seconds:
+        for room_id in room_ids:
+            epoch = clock + offsets[room_id]
+            temperature = rng.gauss(BASE_TEMPERATURE, temperature_noise)
+            smoke_value = round(rng.gauss(BASE_SMOKE, smoke_noise))
+            if room_id in fires and epoch > ignition:
+                burning = (epoch - ignition) / 60
+                if fires[room_id] != "smoke":
+                    temperature += temperature_ramp * burning
+                if fires[room_id] != "temperature":
+                    smoke_value += round(smoke_ramp * burning)
+                if room_id not in static_at and (temperature > TEMPERATURE_THRESHOLD or smoke_value > SMOKE_THRESHOLD):
+                    static_at[room_id] = epoch - ignition
+            started = time.perf_counter()
+            engine.record(room_id, epoch, temperature, smoke_value)
+            record_seconds += time.perf_counter() - started
+            records += 1
+        # One tick per simulated second between readings.
+        for second in range(int(reading_interval)):
+            now = clock + reading_interval * (second + 1) / int(reading_interval)
+            started = time.perf_counter()
+            events = engine.tick(now)
+            tick_seconds.append(time.perf_counter() - started)
+            for room_id, reasons in events:
+                if room_id in fires:
+                    raised_at[room_id] = (now - ignition, reasons)
+                else:
+                    false_positives.append((room_id, now, reasons))
+        clock += reading_interval
+
+    # The same slope over one 30-point window per room, in plain Python.
+    windows = [[(index * reading_interval, rng.uniform(25, 30)) for index in range(30)] for _ in range(min(rooms, 2000))]
+    started = time.perf_counter()
+    for points in windows:
+        python_slope(points)
+    python_seconds = (time.perf_counter() - started) * rooms / len(windows)
+
+    def by_kind(seconds_by_room):
+        return {kind: sorted(round(seconds, 1) for room_id, seconds in seconds_by_room.items() if fires[room_id] == kind) for kind in FIRE_KINDS}
+
+    return {
+        "rooms": rooms,
+        "record_ns_per_reading": round(record_seconds / records * 1e9, 1),
+        "tick": summarize_latencies(tick_seconds),
+        "python_loop_slope_only_ms": round(python_seconds * 1000, 3),
+        "fire_rooms": fire_rooms,
+        "fire_rooms_raised": len(raised_at),
+        "raised_after_seconds": by_kind({room_id: seconds for room_id, (seconds, _) in raised_at.items()}),
+        "static_threshold_after_seconds": by_kind(static_at),
+        "reasons": {fires[room_id]: reasons for room_id, (_, reasons) in raised_at.items()},
+        "false_positives": len(false_positives),
+        "false_positive_reasons": [(round(now), reasons) for _, now, reasons in false_positives],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=5000)
+    parser.add_argument("--fire-rooms", type=int, default=10)
+    parser.add_argument("--warmup-seconds", type=float, default=120)
+    parser.add_argument("--fire-seconds", type=float, default=90)
+    parser.add_argument("--reading-interval", type=float, default=2, help="Seconds between readings of one sensor, as in sensor_simulator.py")
+    parser.add_argument("--temperature-noise", type=float, default=0.3, help="Standard deviation of a quiet room's temperature, °C")
+    parser.add_argument("--smoke-noise", type=float, default=10, help="Standard deviation of a quiet room's smoke value")
+    parser.add_argument("--temperature-ramp", type=float, default=10, help="°C per minute in the temperature fire rooms")
+    parser.add_argument("--smoke-ramp", type=float, default=300, help="Smoke units per minute in the smoke fire rooms")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.rooms, args.fire_rooms, args.warmup_seconds, args.fire_seconds, args.reading_interval,
+                  args.temperature_noise, args.smoke_noise, args.temperature_ramp, args.smoke_ramp, args.seed)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
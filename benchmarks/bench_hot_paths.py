@@ -0,0 +1,190 @@
+"""
+Repeatable benchmark for the server's hot paths, run in-process through Flask's
+test client (no network, no dev-server threading noise).
+
+Covers single and batch ingest over HTTP and as UDP frames (decode, sequence check
+and ingest, without the socket), /get_live_data (full, delta and 304) and
+/get_people_count (room, floor, several rooms and building). All state is built from a fixed seed in a temporary directory.
+Pass a previous --output file as --baseline to fail (exit code 1) when any path's
+median got slower by more than --max-regression.
+
+    python benchmarks/bench_hot_paths.py --rooms 200 --output bench.json
+    python benchmarks/bench_hot_paths.py --rooms 200 --baseline bench.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_generator import summarize_latencies
+from udp_ingest import encode_frame
+
+
+def build_server(rooms, points_per_room, seed):
+    # Imported here so the app's database files land in the temporary working directory.
+    import app
+    app.init_db()
+    app.init_incident_db()
+    app.history_store.init_schema()
+    app.history_store.start()
+    app.refresh_people_counts() # Seeds the occupancy index, as the leader does at startup
+    rng = random.Random(seed)
+    room_ids = [f"B{index:04d}" for index in range(rooms)]
+    for _ in range(points_per_room):
+        app.ingest_readings([(room_id, round(rng.uniform(25, 30), 2), rng.randint(50, 150)) for room_id in room_ids])
+    return app, room_ids, rng
+
+
+def cases(app, room_ids, rng, batch_size):
+    client = app.app.test_client()
+
+    def reading(room_id):
+        return {"roomId": room_id, "temperature": round(rng.uniform(25, 30), 2), "smokeValue": rng.randint(50, 150)}
+
+    def post_sensordata(_):
+        return client.post("/sensordata", json=reading(rng.choice(room_ids)))
+
+    def post_sensordata_batch(_):
+        return client.post("/sensordata/batch", json={"readings": [reading(room_id) for room_id in rng.sample(room_ids, batch_size)]})
+
+    sequence_numbers = {}
+
+    def frame(room_id):
+        sequence_numbers[room_id] = sequence_numbers.get(room_id, 0) + 1
+        return encode_frame(room_id, sequence_numbers[room_id], round(rng.uniform(25, 30), 2), rng.randint(50, 150))
+
+    def udp_datagram(_):
+        app.udp_listener.ingest(app.udp_listener.accept(frame(rng.choice(room_ids))))
+
+    def udp_datagram_batch(_):
+        app.udp_listener.ingest(app.udp_listener.accept(b"".join(frame(room_id) for room_id in rng.sample(room_ids, batch_size))))
+
+    def get_live_data_full(_):
+        return client.get("/get_live_data")
+
+    def prepare_delta():
+        cursor = client.get("/get_live_data").get_json()["cursor"]
+        app.ingest_readings([(room_id, 26.0, 80) for room_id in rng.sample(room_ids, 10)])
+        return cursor
+
+    def get_live_data_delta(cursor):
+        return client.get(f"/get_live_data?since={cursor}")
+
+    def prepare_not_modified():
+        return client.get("/get_live_data").headers["ETag"]
+
+    def get_live_data_not_modified(etag):
+        return client.get("/get_live_data", headers={"If-None-Match": etag})
+
+    def get_people_count_room(_):
+        return client.get("/get_people_count?ruangan=R101")
+
+    def get_people_count_floor(_):
+        return client.get("/get_people_count?lantai=2")
+
+    def get_people_count_batch(_):
+        return client.get("/get_people_count?ruangan=R101,R202,R203,B001")
+
+    def get_people_count_total(_):
+        return client.get("/get_people_count")
+
+    # name -> (prepare, request, expected status). prepare() runs untimed before each
+    # request; paths without an HTTP response have no expected status.
+    return {
+        "post_sensordata": (None, post_sensordata, 200),
+        f"post_sensordata_batch_{batch_size}": (None, post_sensordata_batch, 200),
+        "udp_datagram": (None, udp_datagram, None),
+        f"udp_datagram_batch_{batch_size}": (None, udp_datagram_batch, None),
+        "get_live_data_full": (None, get_live_data_full, 200),
+        "get_live_data_delta_10_rooms": (prepare_delta, get_live_data_delta, 200),
+        "get_live_data_not_modified": (prepare_not_modified, get_live_data_not_modified, 304),
+        "get_people_count_room": (None, get_people_count_room, 200),
+        "get_people_count_floor": (None, get_people_count_floor, 200),
+        "get_people_count_batch_4_rooms": (None, get_people_count_batch, 200),
+        "get_people_count_total": (None, get_people_count_total, 200),
+    }
+
+
+def run_case(prepare, send, expected_status, iterations, warmup):
+    timings = []
+    for index in range(warmup + iterations):
+        argument = prepare() if prepare else None
+        started = time.perf_counter()
+        response = send(argument)
+        elapsed = time.perf_counter() - started
+        if expected_status is not None and response.status_code != expected_status:
+            raise RuntimeError(f"unexpected HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        if index >= warmup:
+            timings.append(elapsed)
+    summary = summarize_latencies(timings)
+    summary["ops_per_second"] = round(len(timings) / sum(timings), 1)
+    return summary
+
+
+def compare(results, baseline, max_regression):
+    # Returns the names of paths whose median regressed beyond max_regression.
+    regressions = []
+    for name, summary in results["paths"].items():
+        before = baseline.get("paths", {}).get(name)
+        if not before or not before.get("p50_ms"):
+            print(f"  {name:34s} {summary['p50_ms']:9.3f} ms  (no baseline)")
+            continue
+        change = summary["p50_ms"] / before["p50_ms"] - 1
+        flag = "  REGRESSION" if change > max_regression else ""
+        print(f"  {name:34s} {summary['p50_ms']:9.3f} ms  vs {before['p50_ms']:9.3f} ms  {change:+7.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def run(rooms, points_per_room, iterations, warmup, batch_size, seed):
+    with tempfile.TemporaryDirectory() as workdir:
+        previous_dir = os.getcwd()
+        os.chdir(workdir)
+        try:
+            # The routes log to stdout; keep that out of the results.
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                app, room_ids, rng = build_server(rooms, points_per_room, seed)
+                paths = {name: run_case(prepare, send, expected_status, iterations, warmup)
+                         for name, (prepare, send, expected_status) in cases(app, room_ids, rng, batch_size).items()}
+        finally:
+            os.chdir(previous_dir)
+    return {
+        "config": {"rooms": rooms, "points_per_room": points_per_room, "iterations": iterations,
+                   "warmup": warmup, "batch_size": batch_size, "seed": seed, "python": sys.version.split()[0]},
+        "paths": paths,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--points-per-room", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    parser.add_argument("--baseline", help="Results file from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Allowed slowdown of a path's median, e.g. 0.25 for 25%%")
+    args = parser.parse_args()
+
+    results = run(args.rooms, args.points_per_room, args.iterations, args.warmup, args.batch_size, args.seed)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nMedian latency vs baseline (allowed regression {args.max_regression:.0%}):")
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print(f"\n{len(regressions)} path(s) regressed: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,123 @@
+"""
+Benchmark for the stale/missing room scheduler at 10k rooms.
+
+Measures the per-reading cost of re-arming a room, how late STALE/MISSING
+transitions fire relative to their exact deadline, and, for reference, the cost of
+one pass of the old full scan over all rooms.
+
+    python benchmarks/bench_status_scheduler.py --rooms 10000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from status_scheduler import DeadlineScheduler
+
+CHUNKS_PER_ROUND = 50
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def legacy_scan(room_statuses, now, stale_seconds, missing_seconds):
+    # Same work as the old check_status_periodically pass, without the side effects.
+    transitions = 0
+    for room_id, room_info in room_statuses.items():
+        since = now - room_info["last_seen_epoch"]
+        if since > missing_seconds or since > stale_seconds:
+            transitions += 1
+    return transitions
+
+
+def run(rooms, stale_seconds, missing_seconds, ingest_rounds, dropout_fraction):
+    lateness = {0: [], 1: []}
+    lock = threading.Lock()
+    expected = {}
+
+    def on_deadline(room_id, stage):
+        fired_at = time.time()
+        with lock:
+            lateness[stage].append(fired_at - (expected[room_id] + scheduler.delays[stage]))
+
+    scheduler = DeadlineScheduler((stale_seconds, missing_seconds), on_deadline).start()
+    room_ids = [f"R{index:05d}" for index in range(rooms)]
+    round_interval = stale_seconds / 2
+    touch_stats = {"seconds": 0.0, "touches": 0}
+
+    def ingest_round(active_rooms):
+        # Sensors are not synchronized, so readings are spread across the round.
+        chunk_size = max(1, len(active_rooms) // CHUNKS_PER_ROUND)
+        for offset in range(0, len(active_rooms), chunk_size):
+            chunk = active_rooms[offset:offset + chunk_size]
+            started = time.perf_counter()
+            now = time.time()
+            for room_id in chunk:
+                expected[room_id] = now
+                scheduler.touch(room_id, now)
+            touch_stats["seconds"] += time.perf_counter() - started
+            touch_stats["touches"] += len(chunk)
+            time.sleep(round_interval / CHUNKS_PER_ROUND)
+
+    # Phase 1: every room reports each round; nothing should fire.
+    for _ in range(ingest_rounds):
+        ingest_round(room_ids)
+    false_positives = len(lateness[0]) + len(lateness[1])
+
+    # Phase 2: a fraction of rooms drop out; the rest keep reporting.
+    dropped = set(random.sample(room_ids, int(rooms * dropout_fraction)))
+    healthy = [room_id for room_id in room_ids if room_id not in dropped]
+    end = time.time() + missing_seconds + 0.5
+    while time.time() < end:
+        ingest_round(healthy)
+
+    legacy_state = {room_id: {"last_seen_epoch": expected[room_id]} for room_id in room_ids}
+    scan_started = time.perf_counter()
+    legacy_scan(legacy_state, time.time(), stale_seconds, missing_seconds)
+    scan_seconds = time.perf_counter() - scan_started
+
+    def summary(values):
+        return {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 3) if values else None,
+            "p99_ms": round(percentile(values, 99) * 1000, 3) if values else None,
+            "max_ms": round(max(values) * 1000, 3) if values else None,
+        }
+
+    return {
+        "rooms": rooms,
+        "dropped_rooms": len(dropped),
+        "touch_ns_per_reading": round(touch_stats["seconds"] / touch_stats["touches"] * 1e9, 1),
+        "false_positive_transitions": false_positives,
+        "stale_lateness": summary(lateness[0]),
+        "missing_lateness": summary(lateness[1]),
+        "heap_size_after": scheduler.heap_size(),
+        "legacy_scan_pass_ms": round(scan_seconds * 1000, 3),
+        "legacy_worst_case_lateness_ms": round(stale_seconds / 2 * 1000, 1),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=10000)
+    parser.add_argument("--stale-seconds", type=float, default=1.0)
+    parser.add_argument("--missing-seconds", type=float, default=2.0)
+    parser.add_argument("--ingest-rounds", type=int, default=6)
+    parser.add_argument("--dropout-fraction", type=float, default=0.5)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.rooms, args.stale_seconds, args.missing_seconds, args.ingest_rounds, args.dropout_fraction)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
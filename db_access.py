@@ -0,0 +1,198 @@
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from metrics import REGISTRY
+
+BUSY_TIMEOUT_MS = 5000
+
+QUERY_SECONDS = REGISTRY.histogram("iris_sqlite_query_seconds", "Duration of a read query, including borrowing a pooled connection.", ("db",))
+WRITE_QUEUE_SECONDS = REGISTRY.histogram("iris_sqlite_write_queue_seconds", "Time a write request waited for the writer thread.", ("db",))
+WRITE_BATCH_SECONDS = REGISTRY.histogram("iris_sqlite_write_batch_seconds", "Duration of one writer-thread batch, including the commit.", ("db",))
+WRITES = REGISTRY.counter("iris_sqlite_writes_total", "Write requests run by the writer thread.", ("db", "result"))
+
+
+class Database:
+    """
+    Shared access to one SQLite file.
+
+    The file is switched to WAL so readers never block the writer. Reads borrow a
+    connection from a small pool of long-lived connections instead of connecting
+    per request. All writes go through one writer thread: callers enqueue a request
+    and get a `concurrent.futures.Future`, and the writer runs whatever has queued
+    up (up to `batch_size` requests) in a single transaction. Each request runs in
+    its own savepoint, so one failing request does not roll back the rest of the batch.
+    Requests run in submission order; a standalone request (executescript, checkpoint)
+    commits the transactional ones queued before it first. Commit listeners are called
+    on the writer thread after every batch that changed rows.
+    """
+
+    def __init__(self, path, batch_size=100, read_pool_size=8):
+        self.path = path
+        self.batch_size = batch_size
+        self._read_pool = queue.LifoQueue(maxsize=read_pool_size)
+        self._requests = queue.Queue()
+        self._writer_thread = None
+        self._commit_listeners = []
+        self._start_lock = threading.Lock()
+        name = os.path.basename(path)
+        self._query_seconds = QUERY_SECONDS.labels(name)
+        self._write_queue_seconds = WRITE_QUEUE_SECONDS.labels(name)
+        self._write_batch_seconds = WRITE_BATCH_SECONDS.labels(name)
+        self._writes_ok = WRITES.labels(name, "ok")
+        self._writes_failed = WRITES.labels(name, "error")
+
+    def _connect(self, read_only=False):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
+        else:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    # --- Reads ---
+
+    @contextmanager
+    def reader(self):
+        try:
+            conn = self._read_pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect(read_only=True)
+        try:
+            yield conn
+        except sqlite3.Error:
+            conn.close() # Don't hand a possibly broken connection to the next caller
+            raise
+        else:
+            try:
+                self._read_pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def query(self, sql, params=(), row_factory=None):
+        with self._query_seconds.time(), self.reader() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = row_factory
+            return cursor.execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=(), row_factory=None):
+        with self._query_seconds.time(), self.reader() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = row_factory
+            return cursor.execute(sql, params).fetchone()
+
+    # --- Writes ---
+
+    def add_commit_listener(self, listener):
+        # Listeners must be quick and must not write to this database themselves.
+        self._commit_listeners.append(listener)
+
+    def start(self):
+        with self._start_lock:
+            if self._writer_thread is None:
+                self._writer_thread = threading.Thread(target=self._writer_loop, name=f"sqlite-writer-{self.path}", daemon=True)
+                self._writer_thread.start()
+        return self
+
+    def transaction(self, fn):
+        # Runs fn(conn) on the writer thread inside a transaction; the future resolves to its return value.
+        self.start()
+        future = Future()
+        self._requests.put((fn, future, True, time.perf_counter()))
+        return future
+
+    def execute(self, sql, params=()):
+        return self.transaction(lambda conn: conn.execute(sql, params).rowcount)
+
+    def executemany(self, sql, seq_of_params):
+        return self.transaction(lambda conn: conn.executemany(sql, seq_of_params).rowcount)
+
+    def executescript(self, script):
+        # executescript() manages its own transactions, so it runs outside the batch.
+        self.start()
+        future = Future()
+        self._requests.put((lambda conn: conn.executescript(script), future, False, time.perf_counter()))
+        return future
+
+    def checkpoint(self, mode="PASSIVE"):
+        self.start()
+        future = Future()
+        self._requests.put((lambda conn: conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone(), future, False, time.perf_counter()))
+        return future
+
+    def _writer_loop(self):
+        conn = self._connect()
+        while True:
+            batch = [self._requests.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            started = time.perf_counter()
+            for request in batch:
+                self._write_queue_seconds.observe(started - request[3])
+            changes_before = conn.total_changes
+            transactional = []
+            for request in batch:
+                if request[2]:
+                    transactional.append(request)
+                    continue
+                if transactional:
+                    self._run_batch(conn, transactional)
+                    transactional = []
+                self._run_one(conn, request[0], request[1])
+            if transactional:
+                self._run_batch(conn, transactional)
+            self._write_batch_seconds.observe(time.perf_counter() - started)
+            for _, future, *_ in batch:
+                (self._writes_failed if future.exception() is not None else self._writes_ok).inc()
+            if conn.total_changes == changes_before:
+                continue # Nothing written, e.g. only a checkpoint or DDL; the replicators' polling still sees schema changes
+            for listener in self._commit_listeners:
+                try:
+                    listener()
+                except Exception as e:
+                    print(f"DB WRITER ERROR: Commit listener for '{self.path}' failed: {e}", file=sys.stderr)
+
+    def _run_one(self, conn, fn, future):
+        try:
+            future.set_result(fn(conn))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _run_batch(self, conn, batch):
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, future, *_ in batch:
+                conn.execute("SAVEPOINT request")
+                try:
+                    results.append((future, fn(conn), None))
+                    conn.execute("RELEASE request")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO request")
+                    conn.execute("RELEASE request")
+                    results.append((future, None, e))
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            print(f"DB WRITER ERROR: Batch of {len(batch)} writes to '{self.path}' failed: {e}", file=sys.stderr)
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for fn, future, *_ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
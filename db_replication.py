@@ -0,0 +1,104 @@
+import os
+import pathlib
+import sqlite3
+import sys
+import threading
+import time
+
+from metrics import REGISTRY
+
+COPY_SECONDS = REGISTRY.histogram("iris_db_copy_seconds", "Duration of one backup-API copy of a database.", ("copier",))
+COPIES_SKIPPED = REGISTRY.counter("iris_db_copies_skipped_total", "Replication checks that found no change to copy.", ("copier",))
+
+class DatabaseReplicator:
+    """
+    Keeps `dest_path` a consistent copy of the SQLite database at `source_path`.
+
+    Copies use SQLite's online backup API, so the copy always reflects a committed
+    state, even while other connections are writing. Each copy is written to a
+    temporary file, switched from WAL to a rollback journal so it is one
+    self-contained file, and renamed over `dest_path`: readers see either the old
+    or the new copy, never a half-written one. A copy only runs when the
+    source's `PRAGMA data_version` has changed since the last one. The loop wakes up
+    every `poll_interval_seconds`, or immediately when `notify()` is called (e.g.
+    from a commit listener), so changes written in this process reach the copy
+    within milliseconds.
+    """
+
+    def __init__(self, source_path, dest_path, poll_interval_seconds=1, pages_per_step=-1, name="DB REPLICATOR"):
+        self.source_path = source_path
+        self.dest_path = dest_path
+        self.poll_interval_seconds = poll_interval_seconds
+        self.pages_per_step = pages_per_step # -1 copies every page in one step
+        self.name = name
+        self.copies = 0
+        self.skipped = 0
+        self.last_copy_seconds = 0.0
+        self.last_copy_epoch = None
+        self._source = None
+        self._last_data_version = None
+        self._wake = threading.Event()
+
+    def notify(self):
+        self._wake.set()
+
+    def start(self):
+        threading.Thread(target=self._run, name=self.name, daemon=True).start()
+        return self
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_interval_seconds)
+            self._wake.clear()
+            try:
+                self.replicate_if_changed()
+            except (sqlite3.Error, OSError) as e:
+                print(f"{self.name} ERROR: {e}", file=sys.stderr)
+                self._close()
+
+    def _open(self):
+        if self._source is None:
+            # Read-only URI so a missing source is reported instead of silently created.
+            source_uri = pathlib.Path(self.source_path).absolute().as_uri() + "?mode=ro"
+            self._source = sqlite3.connect(source_uri, uri=True, check_same_thread=False)
+            self._last_data_version = None
+            dest_folder = os.path.dirname(self.dest_path)
+            if dest_folder and not os.path.exists(dest_folder): os.makedirs(dest_folder)
+            # A WAL left next to an older copy would be applied to the new one by its next reader.
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(self.dest_path + suffix):
+                    os.remove(self.dest_path + suffix)
+
+    def _close(self):
+        if self._source is not None:
+            self._source.close()
+        self._source = None
+
+    def _copy(self):
+        temp_path = self.dest_path + ".tmp"
+        dest = sqlite3.connect(temp_path)
+        try:
+            self._source.backup(dest, pages=self.pages_per_step)
+            dest.execute("PRAGMA journal_mode = DELETE") # The backup copies the source's WAL setting
+        finally:
+            dest.close()
+        os.replace(temp_path, self.dest_path)
+
+    def replicate_if_changed(self):
+        # Returns True when a copy was made.
+        if not os.path.exists(self.source_path):
+            return False
+        self._open()
+        data_version = self._source.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._last_data_version:
+            self.skipped += 1
+            COPIES_SKIPPED.labels(self.name).inc()
+            return False
+        started = time.perf_counter()
+        self._copy()
+        self.last_copy_seconds = time.perf_counter() - started
+        COPY_SECONDS.labels(self.name).observe(self.last_copy_seconds)
+        self.last_copy_epoch = time.time()
+        self._last_data_version = data_version
+        self.copies += 1
+        return True
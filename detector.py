@@ -1,88 +1,549 @@
 # C:/Users/Khalfani Shaquille/Documents/GitHub/iris/detector.py
 
-import sqlite3
+import time
+PROCESS_STARTED = time.time() # Taken before the heavy imports, for the startup report
+
+import argparse
 import cv2
 from ultralytics import YOLO
+import numpy as np
 import datetime
-import time
+import json
+import os
+import socketserver
+import threading
 import sys
+import requests
+from db_access import Database
+from metrics import REGISTRY
+
+IMPORTS_DONE = time.time()
 
 # --- CONFIGURATION ---
 DATABASE_NAME = 'fire_incident.db'
 YOLO_MODEL_PATH = 'best.pt'
-HUMAN_CLASS_ID = 0 
+HUMAN_CLASS_ID = 0
 DB_UPDATE_INTERVAL_SECONDS = 5 # Interval for database updates
+# Counts are pushed to the server, whose writer thread owns the database. The direct
+# write is only a fallback for when the server cannot be reached.
+SERVER_PEOPLE_COUNT_URL = "http://127.0.0.1:5000/update_people_count"
+PUSH_TIMEOUT_SECONDS = 2
 
-def run_detection_process():
-    print(f"DETECTOR: Process started. Using database '{DATABASE_NAME}' and model '{YOLO_MODEL_PATH}'.")
-    
-    last_db_update_time = 0 # Initialize the last database update time
+# Camera-to-room mapping. "source" is a camera index, video file path or RTSP URL.
+# Several cameras may watch the same room; their counts are added up.
+# Override with --cameras <file.json> (see cameras.example.json). This default watches a
+# single room, so it is only meant for trying the detector out on a laptop webcam.
+CAMERAS = [{"source": 0, "room": "R101"}]
+CAMERA_REOPEN_SECONDS = 5 # Wait before reopening a camera or stream that stopped delivering frames
+INFERENCE_IMAGE_SIZE = 640 # Input resolution passed to YOLO (smaller is faster)
+FRAME_SKIP = 0 # Run inference on one of every (FRAME_SKIP + 1) batches of fresh frames
+STATS_INTERVAL_SECONDS = 10
+CAMERA_READY_TIMEOUT_SECONDS = 15 # Startup waits this long for every camera's first frame
+
+# --service: started at server boot and kept warm. While idle, cameras are read and the
+# model runs at a very low rate; ACTIVATE on the control port switches to full rate.
+CONTROL_PORT = 5055
+IDLE_FRAME_INTERVAL_SECONDS = 1
+IDLE_INFERENCE_INTERVAL_SECONDS = 5
+
+# --- METRICS ---
+# Served to the server over the control channel (METRICS) and included in its /metrics.
+FRAMES_CAPTURED = REGISTRY.counter("iris_detector_frames_captured_total", "Frames read from each camera.", ("camera", "room"))
+FRAMES_NOT_INFERRED = REGISTRY.counter("iris_detector_frames_not_inferred_total", "Frames overwritten or skipped before inference.")
+FRAMES_INFERRED = REGISTRY.counter("iris_detector_frames_inferred_total", "Frames that went through the model.")
+INFERENCE_SECONDS = REGISTRY.histogram("iris_detector_inference_seconds", "Duration of one batched YOLO forward pass.")
+END_TO_END_SECONDS = REGISTRY.histogram("iris_detector_end_to_end_seconds", "Time from frame capture to detection result.")
+CAPTURE_FPS = REGISTRY.gauge("iris_detector_capture_fps", "Frames captured per second over the last stats window.")
+INFERENCE_FPS = REGISTRY.gauge("iris_detector_inference_fps", "Frames inferred per second over the last stats window.")
+PEOPLE_DETECTED = REGISTRY.gauge("iris_detector_people", "People in the latest detection result, by room.", ("room",))
+WINDOW_NAME = "Human Detection (Press 'q' to exit)"
+
+# --- PEOPLE COUNT STORAGE ---
+
+def store_people_counts(session, database, room_counts, current_time_iso):
+    try:
+        response = session.post(SERVER_PEOPLE_COUNT_URL, json={"counts": room_counts, "timestamp": current_time_iso}, timeout=PUSH_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        print("DETECTOR: People counts pushed to server successfully.")
+        return
+    except requests.exceptions.RequestException as e:
+        print(f"DETECTOR: Could not push people counts to server ({e}). Writing to database directly...", file=sys.stderr)
+
+    def write(conn):
+        # Every room is updated in the same transaction.
+        cursor = conn.cursor()
+        cursor.executemany("""
+            UPDATE people_detection SET peopleCount = ?, lastUpdateTimeStamp = ? WHERE ruangan = ?
+        """, [(count, current_time_iso, room_id) for room_id, count in room_counts.items()])
+        cursor.execute("""
+            UPDATE people_detection SET lastDetectedTimeStamp = ? WHERE peopleCount > 0 AND lastUpdateTimeStamp = ?
+        """, (current_time_iso, current_time_iso))
+
+    try:
+        database.transaction(write).result()
+        print("DETECTOR: Database updated successfully.")
+    except Exception as db_err:
+        print(f"DETECTOR DB ERROR: Failed to update database: {db_err}", file=sys.stderr)
+
+# --- SERVICE MODE ---
+
+class DetectorMode:
+    # Idle or active. Every idle wait returns as soon as the detector is activated.
+    def __init__(self, active):
+        self._cond = threading.Condition()
+        self.active = active
+        self.activated_at = None
+
+    def set_active(self, active):
+        with self._cond:
+            if active and not self.active:
+                self.activated_at = time.time()
+            self.active = active
+            self._cond.notify_all()
+
+    def wait_until_active(self, timeout):
+        with self._cond:
+            if not self.active:
+                self._cond.wait(timeout)
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+
+class StartupTimer:
+    # Wall-clock phases from the moment the process was launched to its first detection result.
+    def __init__(self, launched_at=None):
+        self.phases = []
+        self.ready = False
+        self._last = launched_at or PROCESS_STARTED
+        if launched_at:
+            self.mark("interpreter start", PROCESS_STARTED)
+        self.mark("imports", IMPORTS_DONE)
+
+    def mark(self, phase, at=None):
+        at = time.time() if at is None else at
+        self.phases.append((phase, at - self._last))
+        self._last = at
+
+    def report(self):
+        report = {phase: round(seconds * 1000) for phase, seconds in self.phases}
+        report["total"] = round(sum(seconds for _, seconds in self.phases) * 1000)
+        return report
+
+    def summary(self):
+        return ", ".join(f"{phase} {ms} ms" for phase, ms in self.report().items())
+
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    # One command per line (PING, ACTIVATE, IDLE, STATUS, METRICS), one reply line each.
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        for line in self.rfile:
+            reply = self.server.handle_command(line.decode(errors="replace").strip().upper())
+            self.wfile.write(f"{reply}\n".encode())
+
+
+class ControlServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = sys.platform != "win32" # On Windows this would allow two detectors on one port
+
+    def __init__(self, port, mode, timer):
+        super().__init__(("127.0.0.1", port), ControlHandler)
+        self.mode = mode
+        self.timer = timer
+
+    def handle_command(self, command):
+        if command == "PING":
+            return "PONG"
+        if command == "ACTIVATE":
+            self.mode.set_active(True)
+            print("DETECTOR: Activated. Switching to full-rate detection.")
+            return "OK active"
+        if command == "IDLE":
+            self.mode.set_active(False)
+            print("DETECTOR: Back to idle.")
+            return "OK idle"
+        if command == "STATUS":
+            return json.dumps({"pid": os.getpid(), "mode": "active" if self.mode.active else "idle",
+                               "ready": self.timer.ready, "startup": self.timer.report()})
+        if command == "METRICS":
+            return json.dumps(REGISTRY.render()) # JSON keeps the multi-line text on one reply line
+        return f"ERR unknown command '{command}'"
+
+
+def start_control_server(port, mode, timer):
+    server = ControlServer(port, mode, timer)
+    threading.Thread(target=server.serve_forever, name="control-server", daemon=True).start()
+    print(f"DETECTOR: Control channel listening on 127.0.0.1:{port}.")
+    return server
+
+def stop_when_parent_exits(stop_event, mode):
+    # The supervisor keeps our stdin open; EOF means the server is gone.
+    def watch():
+        try:
+            sys.stdin.buffer.read()
+        except (OSError, ValueError):
+            pass
+        print("DETECTOR: Server went away. Stopping...")
+        stop_event.set()
+        mode.wake()
+    threading.Thread(target=watch, name="parent-watch", daemon=True).start()
+
+# --- PIPELINE STAGES ---
+# one capture thread per camera -> one batched inference thread -> output stage (display +
+# database) on the main thread. Every hand-off keeps only the newest item, so a slow stage
+# never works through a backlog of stale frames.
+
+class LatestSlot:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = 0
+
+    def put(self, item):
+        with self._cond:
+            self._item = item
+            self._seq += 1
+            self._cond.notify_all()
 
+    def get_newer(self, last_seq, timeout):
+        # Returns (seq, item) for an item newer than last_seq, or (last_seq, None) on timeout.
+        with self._cond:
+            if self._seq == last_seq:
+                self._cond.wait(timeout)
+            if self._seq == last_seq:
+                return last_seq, None
+            return self._seq, self._item
+
+
+class FrameBoard:
+    # The newest frame of every camera, with one condition that wakes on any new frame.
+    def __init__(self, camera_count):
+        self._cond = threading.Condition()
+        self._frames = [None] * camera_count
+        self._seqs = [0] * camera_count
+
+    def put(self, camera_index, frame, captured_at):
+        with self._cond:
+            self._frames[camera_index] = (frame, captured_at)
+            self._seqs[camera_index] += 1
+            self._cond.notify_all()
+
+    def take_newer(self, last_seqs, timeout):
+        # Returns {camera_index: (frame, captured_at, frames_overwritten)} for every camera
+        # with a frame newer than last_seqs, which is updated in place. Empty on timeout.
+        with self._cond:
+            if self._seqs == last_seqs:
+                self._cond.wait(timeout)
+            fresh = {}
+            for index, seq in enumerate(self._seqs):
+                if seq != last_seqs[index]:
+                    frame, captured_at = self._frames[index]
+                    overwritten = seq - last_seqs[index] - 1 if last_seqs[index] else 0
+                    fresh[index] = (frame, captured_at, overwritten)
+                    last_seqs[index] = seq
+            return fresh
+
+    def wait_for_all(self, timeout):
+        # Returns the indexes of cameras that still have no frame after `timeout` seconds.
+        deadline = time.time() + timeout
+        with self._cond:
+            while 0 in self._seqs and time.time() < deadline:
+                self._cond.wait(deadline - time.time())
+            return [index for index, seq in enumerate(self._seqs) if seq == 0]
+
+
+class PipelineStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset(time.perf_counter())
+
+    def _reset(self, now):
+        self.window_started = now
+        self.captured = 0
+        self.skipped = 0
+        self.inferred = 0
+        self.inference_seconds = []
+        self.latencies = []
+
+    def record_capture(self, frames_captured):
+        # frames_captured is the camera's FRAMES_CAPTURED child.
+        frames_captured.inc()
+        with self._lock:
+            self.captured += 1
+
+    def record_skipped(self, count):
+        if count:
+            FRAMES_NOT_INFERRED.inc(count)
+        with self._lock:
+            self.skipped += count
+
+    def record_inference(self, inference_seconds, latencies):
+        # One batched forward pass; latencies holds one capture-to-result time per frame.
+        FRAMES_INFERRED.inc(len(latencies))
+        INFERENCE_SECONDS.observe(inference_seconds)
+        for latency in latencies:
+            END_TO_END_SECONDS.observe(latency)
+        with self._lock:
+            self.inferred += len(latencies)
+            self.inference_seconds.append(inference_seconds)
+            self.latencies.extend(latencies)
+
+    def report(self):
+        # Returns a one-line summary of the window since the last report and starts a new one.
+        with self._lock:
+            now = time.perf_counter()
+            elapsed = max(now - self.window_started, 1e-9)
+            batches = len(self.inference_seconds)
+            latencies = sorted(self.latencies)
+            CAPTURE_FPS.set(round(self.captured / elapsed, 2))
+            INFERENCE_FPS.set(round(self.inferred / elapsed, 2))
+            summary = (f"capture {self.captured / elapsed:.1f} FPS, inference {self.inferred / elapsed:.1f} FPS "
+                       f"in {batches / elapsed:.1f} batches/s, frames not inferred {self.skipped}")
+            if batches:
+                summary += (f", batch of {self.inferred / batches:.1f} frames in {1000 * sum(self.inference_seconds) / batches:.0f} ms avg, "
+                            f"end-to-end latency p50 {1000 * latencies[len(latencies) // 2]:.0f} ms / "
+                            f"max {1000 * latencies[-1]:.0f} ms")
+            self._reset(now)
+            return summary
+
+
+def open_capture(source):
+    if isinstance(source, int):
+        cap = cv2.VideoCapture(source, cv2.CAP_DSHOW)
+    else:
+        cap = cv2.VideoCapture(source)
+    # Ask the driver not to queue frames; the capture thread already keeps only the newest.
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+def is_video_file(source):
+    return isinstance(source, str) and "://" not in source
+
+def capture_loop(camera_index, camera, board, stats, stop_event, mode):
+    # Video files are replayed in a loop at their own frame rate, so they stand in for a
+    # live camera in offline tests. A camera or stream that fails is reopened; the other
+    # cameras keep running. While idle, one frame is read per IDLE_FRAME_INTERVAL_SECONDS.
+    source, room_id = camera["source"], camera["room"]
+    frames_captured = FRAMES_CAPTURED.labels(camera_index, room_id)
+    cap = open_capture(source)
+    frame_interval = 0
     try:
-        model = YOLO(YOLO_MODEL_PATH)
-        cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-        if not cap.isOpened():
-            print("DETECTOR ERROR: Cannot open camera.", file=sys.stderr)
-            return
-
-        while True: 
-            # 1. Capture and process frames as quickly as possible
+        while not stop_event.is_set():
+            if not cap.isOpened():
+                print(f"DETECTOR ERROR: Cannot open camera {source} ({room_id}). Retrying in {CAMERA_REOPEN_SECONDS}s...", file=sys.stderr)
+                if stop_event.wait(CAMERA_REOPEN_SECONDS):
+                    break
+                cap = open_capture(source)
+                continue
+            if is_video_file(source) and not frame_interval:
+                frame_interval = 1 / (cap.get(cv2.CAP_PROP_FPS) or 30)
+
             success, frame = cap.read()
             if not success:
-                print("DETECTOR: Failed to read frame from camera. Breaking loop...", file=sys.stderr)
-                break
+                if is_video_file(source):
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0) # Loop the file
+                    continue
+                print(f"DETECTOR: Failed to read frame from camera {source} ({room_id}). Reopening...", file=sys.stderr)
+                cap.release()
+                if stop_event.wait(CAMERA_REOPEN_SECONDS):
+                    break
+                cap = open_capture(source)
+                continue
+            board.put(camera_index, frame, time.time())
+            stats.record_capture(frames_captured)
+            if not mode.active:
+                mode.wait_until_active(IDLE_FRAME_INTERVAL_SECONDS)
+            elif frame_interval:
+                stop_event.wait(frame_interval)
+    finally:
+        cap.release()
 
-            results = model(frame, verbose=False)
-            
-            # 2. Display detection results live without delay
-            annotated_frame = results[0].plot()
-            cv2.imshow("Human Detection (Press 'q' to exit)", annotated_frame)
+def inference_loop(model, cameras, board, results, stats, stop_event, mode, frame_skip, image_size):
+    # The newest frame of every camera that has one goes through a single YOLO forward pass.
+    last_seqs = [0] * len(cameras)
+    camera_counts = {}
+    fresh_batches = 0
+    try:
+        while not stop_event.is_set():
+            fresh = board.take_newer(last_seqs, timeout=1)
+            if not fresh:
+                continue
+            stats.record_skipped(sum(overwritten for _, _, overwritten in fresh.values()))
+            fresh_batches += 1
+            if (fresh_batches - 1) % (frame_skip + 1):
+                stats.record_skipped(len(fresh))
+                continue
+
+            camera_indexes = list(fresh)
+            started = time.perf_counter()
+            batch_results = model([fresh[index][0] for index in camera_indexes], imgsz=image_size, verbose=False)
+            inference_seconds = time.perf_counter() - started
+            finished_at = time.time()
+
+            annotated = {}
+            for index, result in zip(camera_indexes, batch_results):
+                detected_classes = result.boxes.cls.cpu().numpy()
+                camera_counts[index] = int((detected_classes == HUMAN_CLASS_ID).sum())
+                annotated[index] = result
+            # Cameras left out of this batch keep their last count.
+            room_counts = {}
+            for index, count in camera_counts.items():
+                room_id = cameras[index]["room"]
+                room_counts[room_id] = room_counts.get(room_id, 0) + count
+
+            stats.record_inference(inference_seconds, [finished_at - fresh[index][1] for index in camera_indexes])
+            for room_id, count in room_counts.items():
+                PEOPLE_DETECTED.labels(room_id).set(count)
+            results.put((annotated, room_counts))
+            if not mode.active:
+                mode.wait_until_active(IDLE_INFERENCE_INTERVAL_SECONDS)
+    except Exception as e:
+        print(f"DETECTOR CRITICAL ERROR: Inference stage failed: {e}", file=sys.stderr)
+        stop_event.set()
+
+def run_detection_process(cameras=CAMERAS, headless=False, frame_skip=FRAME_SKIP, image_size=INFERENCE_IMAGE_SIZE,
+                          service=False, control_port=CONTROL_PORT, launched_at=None):
+    timer = StartupTimer(launched_at)
+    print(f"DETECTOR: Process started{' as a service' if service else ''}. Using database '{DATABASE_NAME}' and model '{YOLO_MODEL_PATH}'.")
+    for camera in cameras:
+        print(f"DETECTOR: Camera {camera['source']} -> room {camera['room']}")
+
+    last_db_update_time = 0 # Initialize the last database update time
+    last_stats_time = time.time()
+    session = requests.Session()
+    database = Database(DATABASE_NAME)
+    stop_event = threading.Event()
+    stats = PipelineStats()
+    board, results = FrameBoard(len(cameras)), LatestSlot()
+    capture_threads = []
+    control_server = None
+    # Without --service there is no one to activate the detector, so it starts active.
+    mode = DetectorMode(active=not service)
+    # With windows, poll often enough to keep them responsive; headless only waits for results.
+    result_wait_seconds = 1 if headless else 0.03
+
+    try:
+        if service:
+            # Opened first, so an ACTIVATE sent while the model is still loading is not lost.
+            try:
+                control_server = start_control_server(control_port, mode, timer)
+            except OSError as e:
+                print(f"DETECTOR ERROR: Cannot listen on control port {control_port}: {e}", file=sys.stderr)
+                return
+            stop_when_parent_exits(stop_event, mode)
+            timer.mark("control channel")
+
+        # Cameras open in their own threads while the model loads.
+        for index, camera in enumerate(cameras):
+            thread = threading.Thread(target=capture_loop, args=(index, camera, board, stats, stop_event, mode), name=f"capture-{index}", daemon=True)
+            thread.start()
+            capture_threads.append(thread)
+        model = YOLO(YOLO_MODEL_PATH) # One model shared by every camera
+        timer.mark("model load")
+        model(np.zeros((image_size, image_size, 3), dtype=np.uint8), imgsz=image_size, verbose=False)
+        timer.mark("warm-up inference")
+        missing = board.wait_for_all(CAMERA_READY_TIMEOUT_SECONDS)
+        if missing:
+            print(f"DETECTOR: No frame yet from camera(s) {', '.join(str(cameras[index]['source']) for index in missing)}. Continuing without them.", file=sys.stderr)
+        timer.mark("cameras ready")
+
+        threading.Thread(target=inference_loop, args=(model, cameras, board, results, stats, stop_event, mode, frame_skip, image_size), name="inference", daemon=True).start()
+        print(f"DETECTOR: Pipeline running ({len(cameras)} camera(s), {'active' if mode.active else 'idle'}, {'headless' if headless else 'with display'}, imgsz={image_size}, frame skip={frame_skip}).")
 
-            # Check for 'q' key to exit
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+        last_result_seq = 0
+        latest_counts = None
+        reported_activation = None
+        while not stop_event.is_set():
+            # 1. Wait for the newest detection results
+            last_result_seq, item = results.get_newer(last_result_seq, timeout=result_wait_seconds)
+            if item is not None:
+                latest_counts = item[1]
+                if not timer.ready:
+                    timer.mark("first result")
+                    timer.ready = True
+                    print(f"DETECTOR STARTUP: {timer.summary()}")
+                if mode.active and mode.activated_at is not None and reported_activation != mode.activated_at:
+                    reported_activation = mode.activated_at
+                    print(f"DETECTOR: First full-rate result {1000 * (time.time() - mode.activated_at):.0f} ms after activation.")
+
+            # 2. Display detection results live (optional), one window per camera
+            if not headless:
+                if item is not None:
+                    for index, result in item[0].items():
+                        cv2.imshow(f"{WINDOW_NAME} - {cameras[index]['room']} #{index}", result.plot())
+                # Check for 'q' key to exit
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
 
             # 3. Update the database at the specified interval
             current_time = time.time()
-            if current_time - last_db_update_time > DB_UPDATE_INTERVAL_SECONDS:
+            if mode.active and latest_counts is not None and current_time - last_db_update_time > DB_UPDATE_INTERVAL_SECONDS:
                 print(f"DETECTOR: {DB_UPDATE_INTERVAL_SECONDS}s have passed. Updating database...")
                 last_db_update_time = current_time # Reset the update time
 
-                detected_classes = results[0].boxes.cls.cpu().numpy()
-                human_count = int((detected_classes == HUMAN_CLASS_ID).sum())
                 current_time_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
-            
-                print(f"DETECTOR: {human_count} humans detected at {current_time_iso}")
+
+                print(f"DETECTOR: Humans detected at {current_time_iso}: {latest_counts}")
 
                 # --- DATABASE UPDATE ---
-                conn = None
-                try:
-                    conn = sqlite3.connect(DATABASE_NAME, timeout=10)
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        UPDATE people_detection SET peopleCount = ?, lastUpdateTimeStamp = ?
-                    """, (human_count, current_time_iso))
-                    
-                    if human_count > 0:
-                        cursor.execute("""
-                            UPDATE people_detection SET lastDetectedTimeStamp = ? WHERE peopleCount > 0
-                        """, (current_time_iso,))
-                    
-                    conn.commit()
-                    print("DETECTOR: Database updated successfully.")
-                except sqlite3.Error as db_err:
-                    print(f"DETECTOR DB ERROR: Failed to update database: {db_err}", file=sys.stderr)
-                finally:
-                    if conn:
-                        conn.close()
+                store_people_counts(session, database, latest_counts, current_time_iso)
 
+            if current_time - last_stats_time > STATS_INTERVAL_SECONDS:
+                last_stats_time = current_time
+                print(f"DETECTOR STATS: {stats.report()}")
+
+    except KeyboardInterrupt:
+        pass
     except Exception as e:
         print(f"DETECTOR CRITICAL ERROR: An exception occurred: {e}", file=sys.stderr)
     finally:
-        if 'cap' in locals() and cap.isOpened():
-            cap.release()
-        cv2.destroyAllWindows()
+        stop_event.set()
+        mode.wake()
+        if control_server is not None:
+            control_server.shutdown()
+            control_server.server_close()
+        for thread in capture_threads:
+            thread.join(timeout=2) # Don't exit while a camera is inside read()
+        if not headless:
+            cv2.destroyAllWindows()
         print("DETECTOR: Detection process terminated.")
 
+def parse_source(value):
+    return int(value) if isinstance(value, str) and value.isdigit() else value
+
+def load_cameras(path):
+    with open(path) as f:
+        cameras = json.load(f)
+    for camera in cameras:
+        if "source" not in camera or "room" not in camera:
+            raise ValueError(f"Camera entry {camera} needs both 'source' and 'room'")
+        camera["source"] = parse_source(camera["source"])
+    return cameras
+
 if __name__ == '__main__':
-    run_detection_process()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="IRIS human detector")
+    parser.add_argument("--cameras", help="JSON file with a list of {\"source\": ..., \"room\": ...} entries")
+    parser.add_argument("--source", type=parse_source, help="Single camera index, video file or RTSP URL (with --room)")
+    parser.add_argument("--room", default=CAMERAS[0]["room"], help="Room watched by --source")
+    parser.add_argument("--headless", action="store_true", help="Run without display windows")
+    parser.add_argument("--frame-skip", type=int, default=FRAME_SKIP, help="Infer on one of every N+1 batches of fresh frames")
+    parser.add_argument("--imgsz", type=int, default=INFERENCE_IMAGE_SIZE, help="YOLO input resolution")
+    parser.add_argument("--service", action="store_true", help="Start idle and wait for ACTIVATE on the control port (used by the server)")
+    parser.add_argument("--control-port", type=int, default=CONTROL_PORT, help="Localhost port of the --service control channel")
+    parser.add_argument("--launched-at", type=float, help="Epoch time the launcher started this process, for the startup report")
+    args = parser.parse_args()
+
+    if args.cameras:
+        cameras = load_cameras(args.cameras)
+    elif args.source is not None:
+        cameras = [{"source": args.source, "room": args.room}]
+    else:
+        cameras = CAMERAS
+        print(f"DETECTOR WARNING: No --cameras file or --source given. Only camera {CAMERAS[0]['source']} is watched, for room "
+              f"{CAMERAS[0]['room']}; the people count of every other room stays at its initial value. "
+              "Pass --cameras with a file like cameras.example.json.", file=sys.stderr)
+    run_detection_process(cameras=cameras, headless=args.headless, frame_skip=args.frame_skip, image_size=args.imgsz,
+                          service=args.service, control_port=args.control_port, launched_at=args.launched_at)
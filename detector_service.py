@@ -0,0 +1,222 @@
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+
+class DetectorSupervisor:
+    """
+    Keeps detector.py running as a warm-standby service and switches it between
+    idle and full-rate detection.
+
+    The detector is started at boot with `--service`, so the interpreter, the YOLO
+    model and the cameras are already loaded when a fire is detected. It listens on
+    a localhost control port for ACTIVATE / IDLE / STATUS / METRICS / PING. `activate()` never
+    blocks the caller: it records the wanted mode and wakes the supervisor thread,
+    which sends the command over a kept-open connection. The same thread restarts
+    the detector with exponential backoff when it exits or stops answering PING, and
+    re-sends the wanted mode to every new instance. A mode change or `stop()` cuts the
+    backoff short, so a fire never waits for it. Every health check also fetches the
+    detector's metrics, which the server's /metrics includes.
+    """
+
+    def __init__(self, script_path, args=(), control_port=5055, health_interval_seconds=2,
+                 startup_grace_seconds=120, unresponsive_seconds=20, backoff_seconds=1, max_backoff_seconds=60,
+                 control_timeout_seconds=1):
+        self.script_path = script_path
+        self.args = list(args)
+        self.control_port = control_port
+        self.health_interval_seconds = health_interval_seconds
+        self.startup_grace_seconds = startup_grace_seconds
+        self.unresponsive_seconds = unresponsive_seconds
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.control_timeout_seconds = control_timeout_seconds
+
+        self.restarts = 0
+        self.last_switch_ms = None
+        self.startup_report = None
+        self.detector_metrics = "" # Latest /metrics text of the detector process
+        self._process = None
+        self._started_at = None
+        self._last_answer = None
+        self._failures_in_a_row = 0
+        self._want_active = False
+        self._sent_active = None
+        self._requested_at = None
+        self._conn = None
+        self._conn_file = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    # --- Public API ---
+
+    def start(self):
+        threading.Thread(target=self._run, name="detector-supervisor", daemon=True).start()
+        return self
+
+    def stop(self, timeout=5):
+        # Stops supervising and terminates the detector.
+        with self._lock:
+            self._stop.set()
+            process = self._process
+        self._wake.set()
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    def activate(self):
+        # Returns True if this call switched the wanted mode to active.
+        return self._set_wanted(True)
+
+    def idle(self):
+        return self._set_wanted(False)
+
+    def status(self):
+        with self._lock:
+            process = self._process
+            return {
+                "pid": process.pid if process is not None else None,
+                "running": process is not None and process.poll() is None,
+                "mode": "active" if self._want_active else "idle",
+                "modeAcknowledged": self._sent_active == self._want_active,
+                "restarts": self.restarts,
+                "lastSwitchMs": self.last_switch_ms,
+                "secondsSinceLastAnswer": round(time.monotonic() - self._last_answer, 1) if self._last_answer else None,
+                "startup": self.startup_report,
+            }
+
+    def _set_wanted(self, active):
+        with self._lock:
+            if self._want_active == active:
+                return False
+            self._want_active = active
+            self._requested_at = time.perf_counter()
+        self._wake.set()
+        return True
+
+    # --- Supervisor thread ---
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._supervise_once()
+            except Exception as e:
+                print(f"DETECTOR SUPERVISOR ERROR: {e}", file=sys.stderr)
+            self._wake.wait(self.health_interval_seconds)
+            self._wake.clear()
+
+    def _supervise_once(self):
+        if self._process is None or self._process.poll() is not None:
+            self._restart()
+            return
+
+        with self._lock:
+            want_active = self._want_active
+        if want_active != self._sent_active:
+            reply = self._send("ACTIVATE" if want_active else "IDLE")
+            if reply is None:
+                self._check_unresponsive()
+                return
+            if reply.startswith("OK"):
+                with self._lock:
+                    self._sent_active = want_active
+                    requested_at, self._requested_at = self._requested_at, None
+                if requested_at is not None:
+                    self.last_switch_ms = round((time.perf_counter() - requested_at) * 1000, 2)
+                    print(f"DETECTOR SUPERVISOR: Detector switched to {'active' if want_active else 'idle'} in {self.last_switch_ms} ms.")
+                else:
+                    print(f"DETECTOR SUPERVISOR: Detector is up in {'active' if want_active else 'idle'} mode.")
+        elif self._send("PING") is None:
+            self._check_unresponsive()
+            return
+
+        reply = self._send("METRICS")
+        if reply is not None and not reply.startswith("ERR"):
+            self.detector_metrics = json.loads(reply)
+
+        if self.startup_report is None:
+            reply = self._send("STATUS")
+            if reply is not None:
+                status = json.loads(reply)
+                if status.get("ready"):
+                    self.startup_report = status.get("startup")
+
+    def _check_unresponsive(self):
+        now = time.monotonic()
+        if self._last_answer is None:
+            if now - self._started_at < self.startup_grace_seconds:
+                return # Still starting up; the control port only opens once the imports are done
+            silent_for = now - self._started_at
+        else:
+            silent_for = now - self._last_answer
+            if silent_for < self.unresponsive_seconds:
+                return
+        print(f"DETECTOR SUPERVISOR: Detector (pid {self._process.pid}) has not answered for {silent_for:.0f}s. Killing it...", file=sys.stderr)
+        self._process.kill()
+        self._process.wait()
+
+    def _restart(self):
+        if self._process is not None:
+            uptime = time.monotonic() - self._started_at
+            print(f"DETECTOR SUPERVISOR: Detector (pid {self._process.pid}) exited with code {self._process.returncode} after {uptime:.0f}s.", file=sys.stderr)
+            self._failures_in_a_row = 0 if uptime > self.max_backoff_seconds else self._failures_in_a_row + 1
+            self.restarts += 1
+            delay = min(self.backoff_seconds * 2 ** self._failures_in_a_row, self.max_backoff_seconds)
+            print(f"DETECTOR SUPERVISOR: Restarting detector in {delay:.0f}s...")
+            self._wake.clear()
+            if self._wake.wait(delay) and not self._stop.is_set():
+                print("DETECTOR SUPERVISOR: Mode change requested; restarting the detector now.")
+
+        self._close_connection()
+        with self._lock:
+            self._sent_active = None
+            self._requested_at = None # A new instance is not a mode switch
+            self._last_answer = None
+            self.startup_report = None
+            self.detector_metrics = ""
+        command = [sys.executable, self.script_path, *self.args, "--service",
+                   "--control-port", str(self.control_port), "--launched-at", repr(time.time())]
+        with self._lock:
+            if self._stop.is_set():
+                return
+            # The detector exits when this pipe closes, so it never outlives the server.
+            self._process = subprocess.Popen(command, stdin=subprocess.PIPE)
+            self._started_at = time.monotonic()
+        print(f"DETECTOR SUPERVISOR: Detector service started (pid {self._process.pid}, control port {self.control_port}).")
+        self._wake.set() # Send the wanted mode as soon as the control port answers
+
+    # --- Control channel ---
+
+    def _send(self, command):
+        # Returns the one-line reply, or None if the detector could not be reached.
+        try:
+            if self._conn is None:
+                self._conn = socket.create_connection(("127.0.0.1", self.control_port), timeout=self.control_timeout_seconds)
+                self._conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self._conn_file = self._conn.makefile("r", encoding="utf-8")
+            self._conn.sendall(f"{command}\n".encode())
+            reply = self._conn_file.readline()
+            if not reply:
+                raise ConnectionError("control connection closed")
+        except OSError:
+            self._close_connection()
+            return None
+        self._last_answer = time.monotonic()
+        return reply.strip()
+
+    def _close_connection(self):
+        for closable in (self._conn_file, self._conn):
+            if closable is not None:
+                try:
+                    closable.close()
+                except OSError:
+                    pass
+        self._conn = self._conn_file = None
@@ -0,0 +1,28 @@
+# Runs the server as several worker processes sharing one SQLite state backend:
+#
+#     gunicorn -c gunicorn.conf.py app:app
+#
+# The databases are recreated once, before the workers start. Every worker then mirrors
+# the shared room state, and one of them (the leader) runs the detector service.
+import os
+import subprocess
+import sys
+
+os.environ.setdefault("IRIS_STATE_BACKEND", "sqlite")
+
+bind = os.environ.get("IRIS_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("IRIS_WORKERS", "4"))
+# Threads per worker: /live_stream holds a thread for as long as a dashboard is open.
+worker_class = "gthread"
+threads = int(os.environ.get("IRIS_THREADS", "16"))
+timeout = 0 # Streams stay open indefinitely; liveness is handled by the leader lease instead
+
+
+def on_starting(server):
+    # In a separate process, so the master never opens the databases or starts threads before forking.
+    subprocess.run([sys.executable, "app.py", "--init-only"], check=True)
+
+
+def post_worker_init(worker):
+    from app import start_background_services
+    start_background_services()
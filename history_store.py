@@ -0,0 +1,268 @@
+import datetime
+import re
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import REGISTRY
+
+DROPPED = REGISTRY.counter("iris_history_readings_dropped_total", "Readings never written to the history database, by reason.", ("reason",))
+
+ROLLUP_RESOLUTIONS = {"1m": 60, "1h": 3600}
+PARTITION_PATTERN = re.compile(r"^readings_(\d{8})$")
+
+
+def partition_name(epoch):
+    return "readings_" + datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).strftime('%Y%m%d')
+
+
+class HistoryStore:
+    """
+    Durable, append-only sensor history kept in its own SQLite database.
+
+    Raw readings go to one table per UTC day (`readings_YYYYMMDD`), so a day that
+    ages out is dropped as a whole instead of deleted row by row. 1-minute and
+    1-hour rollups (count, min, max, sum per metric) are upserted from each batch as
+    it is written. Range queries over long windows therefore never scan raw rows.
+    `record()` only appends to an in-memory buffer. A flusher thread writes the buffer
+    through the Database writer thread every `flush_interval_seconds`, or sooner
+    once `max_batch` readings are waiting. A batch that fails to commit is retried on
+    its own by the next flushes and dropped after `max_attempts` failures, so one bad
+    batch cannot hold up the readings behind it. While the database is unavailable the
+    buffer keeps the newest `max_buffered_readings` readings and drops older ones.
+    """
+
+    def __init__(self, database, flush_interval_seconds=1.0, max_batch=500, raw_retention_days=7,
+                 max_attempts=5, max_buffered_readings=100000):
+        self.database = database
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_batch = max_batch
+        self.raw_retention_days = raw_retention_days
+        self.max_attempts = max_attempts
+        self.max_buffered_readings = max_buffered_readings
+        self.flushed_batches = 0
+        self.flushed_readings = 0
+        self.dropped_readings = 0
+        self._buffer = []
+        self._failed = None # (batch, failed attempts) waiting to be retried
+        self._overflowing = False
+        self._buffer_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._partitions = set() # Partitions known to exist; only changed after the batch that created them committed
+
+    # --- Schema ---
+
+    def init_schema(self):
+        self.database.transaction(self._create_schema).result()
+        self._partitions = set(self._list_partitions(self.database.query))
+
+    @staticmethod
+    def _list_partitions(query):
+        # From the schema rather than this process's cache, which misses partitions made by other workers.
+        rows = query("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'readings_%'")
+        return sorted(name for (name,) in rows if PARTITION_PATTERN.match(name))
+
+    def _create_schema(self, conn):
+        for resolution in ROLLUP_RESOLUTIONS:
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS rollup_{resolution} (
+                    room_id TEXT NOT NULL,
+                    bucket REAL NOT NULL,
+                    count INTEGER NOT NULL,
+                    temp_count INTEGER NOT NULL, temp_sum REAL, temp_min REAL, temp_max REAL,
+                    smoke_count INTEGER NOT NULL, smoke_sum REAL, smoke_min REAL, smoke_max REAL,
+                    PRIMARY KEY (room_id, bucket)
+                ) WITHOUT ROWID
+            ''')
+
+    def _ensure_partition(self, conn, name):
+        # Returns True if the partition may have been created by this batch.
+        if name in self._partitions:
+            return False
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {name} (room_id TEXT NOT NULL, ts REAL NOT NULL, temperature REAL, smoke INTEGER)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_room_ts ON {name} (room_id, ts)")
+        return True
+
+    # --- Ingest ---
+
+    def record(self, room_id, epoch, temperature, smoke_value):
+        self.record_many([(room_id, epoch, temperature, smoke_value)])
+
+    def record_many(self, readings):
+        with self._buffer_lock:
+            self._buffer.extend(readings)
+            overflow = len(self._buffer) - self.max_buffered_readings
+            if overflow > 0:
+                del self._buffer[:overflow]
+            if len(self._buffer) >= self.max_batch:
+                self._wake.set()
+        if overflow > 0:
+            self._drop(overflow, "buffer_full")
+
+    def start(self):
+        threading.Thread(target=self._run, name="history-flusher", daemon=True).start()
+        return self
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval_seconds)
+            self._wake.clear()
+            try:
+                self.flush().result()
+            except Exception as e:
+                print(f"HISTORY STORE ERROR: Failed to write history batch: {e}", file=sys.stderr)
+
+    def flush(self):
+        # Returns a Future for (readings written, partitions created, partitions dropped),
+        # resolved once the store's own bookkeeping for the batch is done. A failed batch
+        # is written before anything else, and alone.
+        with self._buffer_lock:
+            if self._failed is not None:
+                (batch, attempts), self._failed = self._failed, None
+            else:
+                (batch, attempts), self._buffer = (self._buffer, 0), []
+        flushed = Future()
+        future = self.database.transaction(lambda conn: self._write_batch(conn, batch))
+        future.add_done_callback(lambda f: self._on_flushed(f, batch, attempts + 1, flushed))
+        return flushed
+
+    def _on_flushed(self, future, batch, attempts, flushed):
+        # Runs on the writer thread once the batch committed or failed.
+        try:
+            self._record_outcome(future, batch, attempts)
+        finally:
+            if future.exception() is not None:
+                flushed.set_exception(future.exception())
+            else:
+                flushed.set_result(future.result())
+
+    def _record_outcome(self, future, batch, attempts):
+        if future.exception() is not None:
+            if attempts < self.max_attempts:
+                with self._buffer_lock:
+                    self._failed = (batch, attempts)
+            else:
+                print(f"HISTORY STORE ERROR: Dropping {len(batch)} readings after {attempts} failed writes: {future.exception()}", file=sys.stderr)
+                self._drop(len(batch), "write_failed")
+            return
+        if not batch:
+            return
+        self._overflowing = False
+        _, created, dropped = future.result()
+        self._partitions.update(created)
+        self._partitions.difference_update(dropped)
+        self.flushed_batches += 1
+        self.flushed_readings += len(batch)
+
+    def _drop(self, count, reason):
+        if reason == "buffer_full" and not self._overflowing: # Logged once until a batch commits again
+            self._overflowing = True
+            print(f"HISTORY STORE ERROR: Buffer full ({self.max_buffered_readings} readings); dropping the oldest.", file=sys.stderr)
+        self.dropped_readings += count
+        DROPPED.labels(reason).inc(count)
+
+    def _write_batch(self, conn, batch):
+        # Returns (readings written, partitions created, partitions dropped).
+        if not batch:
+            return 0, (), ()
+        by_partition = {}
+        rollups = {resolution: {} for resolution in ROLLUP_RESOLUTIONS}
+        for room_id, epoch, temperature, smoke_value in batch:
+            by_partition.setdefault(partition_name(epoch), []).append((room_id, epoch, temperature, smoke_value))
+            for resolution, seconds in ROLLUP_RESOLUTIONS.items():
+                key = (room_id, epoch - epoch % seconds)
+                aggregate = rollups[resolution].get(key)
+                if aggregate is None:
+                    aggregate = rollups[resolution][key] = [0, 0, 0.0, None, None, 0, 0.0, None, None]
+                aggregate[0] += 1
+                if temperature is not None:
+                    aggregate[1] += 1
+                    aggregate[2] += temperature
+                    aggregate[3] = temperature if aggregate[3] is None else min(aggregate[3], temperature)
+                    aggregate[4] = temperature if aggregate[4] is None else max(aggregate[4], temperature)
+                if smoke_value is not None:
+                    aggregate[5] += 1
+                    aggregate[6] += smoke_value
+                    aggregate[7] = smoke_value if aggregate[7] is None else min(aggregate[7], smoke_value)
+                    aggregate[8] = smoke_value if aggregate[8] is None else max(aggregate[8], smoke_value)
+
+        created = []
+        for name, rows in by_partition.items():
+            if self._ensure_partition(conn, name):
+                created.append(name)
+            conn.executemany(f"INSERT INTO {name} (room_id, ts, temperature, smoke) VALUES (?, ?, ?, ?)", rows)
+
+        for resolution, buckets in rollups.items():
+            # MIN/MAX of NULL is NULL in SQLite, hence the COALESCE on both sides.
+            conn.executemany(f'''
+                INSERT INTO rollup_{resolution} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (room_id, bucket) DO UPDATE SET
+                    count = count + excluded.count,
+                    temp_count = temp_count + excluded.temp_count,
+                    temp_sum = COALESCE(temp_sum, 0) + COALESCE(excluded.temp_sum, 0),
+                    temp_min = MIN(COALESCE(temp_min, excluded.temp_min), COALESCE(excluded.temp_min, temp_min)),
+                    temp_max = MAX(COALESCE(temp_max, excluded.temp_max), COALESCE(excluded.temp_max, temp_max)),
+                    smoke_count = smoke_count + excluded.smoke_count,
+                    smoke_sum = COALESCE(smoke_sum, 0) + COALESCE(excluded.smoke_sum, 0),
+                    smoke_min = MIN(COALESCE(smoke_min, excluded.smoke_min), COALESCE(excluded.smoke_min, smoke_min)),
+                    smoke_max = MAX(COALESCE(smoke_max, excluded.smoke_max), COALESCE(excluded.smoke_max, smoke_max))
+            ''', [(room_id, bucket, *aggregate) for (room_id, bucket), aggregate in buckets.items()])
+
+        dropped = self._drop_expired_partitions(conn, time.time())
+        return len(batch), created, dropped
+
+    def _drop_expired_partitions(self, conn, now):
+        oldest_kept = partition_name(now - self.raw_retention_days * 86400)
+        expired = [name for name in self._list_partitions(lambda sql: conn.execute(sql).fetchall()) if name < oldest_kept]
+        for name in expired:
+            conn.execute(f"DROP TABLE IF EXISTS {name}")
+        return expired
+
+    # --- Queries ---
+
+    def choose_resolution(self, start, end):
+        span = end - start
+        raw_available_from = time.time() - self.raw_retention_days * 86400
+        if span <= 3600 and start >= raw_available_from:
+            return "raw"
+        if span <= 2 * 86400:
+            return "1m"
+        return "1h"
+
+    def query_range(self, room_id, start, end, resolution="auto"):
+        # Returns (resolution, columns). Readings still waiting in the buffer are not included.
+        if resolution == "auto":
+            resolution = self.choose_resolution(start, end)
+        if resolution == "raw":
+            return resolution, self._query_raw(room_id, start, end)
+        if resolution not in ROLLUP_RESOLUTIONS:
+            raise ValueError(f"Unknown resolution '{resolution}'")
+        return resolution, self._query_rollup(room_id, start, end, resolution)
+
+    def _query_raw(self, room_id, start, end):
+        first, last = partition_name(start), partition_name(end)
+        timestamps, temperatures, smoke_values = [], [], []
+        for name in (name for name in self._list_partitions(self.database.query) if first <= name <= last):
+            rows = self.database.query(f"SELECT ts, temperature, smoke FROM {name} WHERE room_id = ? AND ts BETWEEN ? AND ? ORDER BY ts", (room_id, start, end))
+            for ts, temperature, smoke_value in rows:
+                timestamps.append(ts)
+                temperatures.append(temperature)
+                smoke_values.append(smoke_value)
+        return {"timestamps": timestamps, "temperatures": temperatures, "smokeValues": smoke_values}
+
+    def _query_rollup(self, room_id, start, end, resolution):
+        bucket_start = start - start % ROLLUP_RESOLUTIONS[resolution]
+        rows = self.database.query(f'''
+            SELECT bucket, count,
+                   temp_sum / NULLIF(temp_count, 0), temp_min, temp_max,
+                   smoke_sum / NULLIF(smoke_count, 0), smoke_min, smoke_max
+            FROM rollup_{resolution} WHERE room_id = ? AND bucket BETWEEN ? AND ? ORDER BY bucket
+        ''', (room_id, bucket_start, end))
+        columns = list(zip(*rows)) or [()] * 8
+        return {
+            "timestamps": list(columns[0]),
+            "counts": list(columns[1]),
+            "temperature": {"avg": list(columns[2]), "min": list(columns[3]), "max": list(columns[4])},
+            "smokeValue": {"avg": list(columns[5]), "min": list(columns[6]), "max": list(columns[7])}
+        }
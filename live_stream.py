@@ -0,0 +1,98 @@
+import json
+import queue
+import threading
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    def __init__(self, max_queue_size, since_version=0):
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.since_version = since_version # Events up to this version are already in the client's snapshot
+        self.overflowed = False
+
+    def messages(self, keepalive_seconds):
+        # Yields ready-to-send SSE chunks; a comment line keeps idle proxies from closing the stream.
+        while True:
+            try:
+                message = self.queue.get(timeout=keepalive_seconds)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if message is None:
+                return
+            yield message
+
+
+class LiveStreamBroker:
+    """
+    Fan-out of live dashboard events to Server-Sent Events clients.
+
+    `publish()` only appends to an outbox, so it can be called under the caller's own
+    lock: the publisher thread serializes each event once and fans it out in publish
+    order. Every subscriber has its own bounded queue: a client that falls
+    `max_queue_size` events behind is told to resync and disconnected, so a slow
+    browser can never stall the ingest path that publishes.
+    """
+
+    def __init__(self, max_queue_size=500):
+        self.max_queue_size = max_queue_size
+        self.dropped_subscribers = 0
+        self._subscribers = set()
+        self._outbox = queue.SimpleQueue()
+        self._lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self._run, name="live-stream-publisher", daemon=True).start()
+        return self
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self, since_version=0):
+        # Call under the same lock as publish() and pass the version of the snapshot sent first.
+        subscription = Subscription(self.max_queue_size, since_version)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event, data, version=0):
+        # `data` must not be changed by the caller afterwards; it is serialized later.
+        if not self._subscribers:
+            return
+        self._outbox.put((event, data, version))
+
+    def _run(self):
+        while True:
+            self._fan_out(*self._outbox.get())
+
+    def _fan_out(self, event, data, version):
+        message = format_sse(event, data) # Serialized once, shared by every client
+        with self._lock:
+            subscribers = [subscription for subscription in self._subscribers if subscription.since_version < version]
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                self._drop(subscription)
+
+    def _drop(self, subscription):
+        self.unsubscribe(subscription)
+        if subscription.overflowed:
+            return
+        subscription.overflowed = True
+        self.dropped_subscribers += 1
+        # Replace the backlog with a resync notice followed by end-of-stream.
+        try:
+            while True:
+                subscription.queue.get_nowait()
+        except queue.Empty:
+            pass
+        subscription.queue.put_nowait(format_sse('resync', {"reason": "client too slow"}))
+        subscription.queue.put_nowait(None)
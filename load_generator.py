@@ -0,0 +1,389 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from urllib.parse import urlsplit
+
+from sensor_simulator import generate_reading
+
+# Load generator for app.py. Simulates thousands of rooms on one asyncio event loop,
+# optionally stepping through several rates to find where ingest falls over, and
+# measures how long the dashboard takes to see fire and stale/missing statuses.
+#
+#   python load_generator.py --rooms 2000 --rate 0.5,1,2 --duration 20 --fire-rooms 5 --dropout-rooms 20 --output results.json
+
+DEFAULT_SERVER = "http://127.0.0.1:5000"
+ROOM_PREFIX = "LT"
+FIRE_TEMPERATURE = 60.0 # Above app.TEMPERATURE_THRESHOLD
+FIRE_SMOKE_VALUE = 800 # Above app.SMOKE_THRESHOLD
+# Must match app.STALE_DATA_TIMEOUT_SECONDS / app.MISSING_DATA_TIMEOUT_SECONDS.
+STALE_SECONDS = 8
+MISSING_SECONDS = 15
+STREAM_RECONNECT_SECONDS = 0.5
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def summarize_latencies(seconds):
+    # {count, p50_ms, p95_ms, p99_ms, max_ms, mean_ms} for a list of durations in seconds.
+    if not seconds:
+        return {"count": 0}
+    ordered = sorted(seconds)
+    summary = {"count": len(ordered)}
+    for pct in (50, 95, 99):
+        summary[f"p{pct}_ms"] = round(percentile(ordered, pct) * 1000, 3)
+    summary["max_ms"] = round(ordered[-1] * 1000, 3)
+    summary["mean_ms"] = round(sum(ordered) / len(ordered) * 1000, 3)
+    return summary
+
+
+# --- HTTP CLIENT ---
+
+class HttpClient:
+    # Minimal keep-alive HTTP/1.1 client on asyncio streams; enough for app.py's JSON
+    # endpoints and its event stream, without pulling in an async HTTP library.
+
+    def __init__(self, base_url, max_connections=100):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.connections_opened = 0
+        self._idle = []
+        self._slots = asyncio.Semaphore(max_connections)
+
+    async def request(self, method, path, payload=None):
+        # Returns (status, body bytes).
+        body = json.dumps(payload).encode() if payload is not None else b""
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nContent-Length: {len(body)}\r\n"
+        if payload is not None:
+            head += "Content-Type: application/json\r\n"
+        message = head.encode() + b"\r\n" + body
+
+        async with self._slots:
+            while True:
+                reused = bool(self._idle)
+                reader, writer = self._idle.pop() if reused else await self._connect()
+                try:
+                    writer.write(message)
+                    await writer.drain()
+                    status, headers, data, keep_alive = await self._read_response(reader)
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if not reused:
+                        raise
+                    # The server closed an idle keep-alive connection; retry on a new one.
+            if keep_alive:
+                self._idle.append((reader, writer))
+            else:
+                writer.close()
+            return status, data
+
+    async def stream_events(self, path):
+        # Yields (event, data) from a Server-Sent Events endpoint until the server ends it.
+        # HTTP/1.0, so the server streams the body as-is instead of chunking it.
+        reader, writer = await self._connect()
+        try:
+            writer.write(f"GET {path} HTTP/1.0\r\nHost: {self.host}:{self.port}\r\nAccept: text/event-stream\r\n\r\n".encode())
+            await writer.drain()
+            status, headers = await self._read_head(reader)
+            if status != 200:
+                raise ConnectionError(f"event stream returned HTTP {status}")
+            event, data = "message", []
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                line = line.decode().rstrip("\r\n")
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    data.append(line[5:].lstrip())
+                elif not line and data:
+                    yield event, "\n".join(data)
+                    event, data = "message", []
+        finally:
+            writer.close()
+
+    async def close(self):
+        while self._idle:
+            self._idle.pop()[1].close()
+
+    async def _connect(self):
+        self.connections_opened += 1
+        return await asyncio.open_connection(self.host, self.port)
+
+    async def _read_head(self, reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed before the response")
+        version, status = status_line.decode("latin-1").split(" ", 2)[:2]
+        headers = {"_version": version}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return int(status), headers
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    async def _read_response(self, reader):
+        status, headers = await self._read_head(reader)
+        keep_alive = headers["_version"] == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        if "content-length" in headers:
+            data = await reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                chunk = await reader.readexactly(size + 2)
+                if not size:
+                    break
+                chunks.append(chunk[:-2])
+            data = b"".join(chunks)
+        elif status in (204, 304):
+            data = b""
+        else:
+            data = await reader.read()
+            keep_alive = False
+        return status, headers, data, keep_alive
+
+
+# --- LOAD TEST ---
+
+class LoadTest:
+    """
+    One asyncio task per sender: a room in individual mode, or a gateway of
+    `batch_size` rooms posting to /sensordata/batch. Sends are scheduled open-loop
+    at the current stage's rate, so a slow server shows up as ingest latency
+    (measured from the scheduled send time) instead of silently lowering the load.
+
+    Scenarios, relative to the start of the run: `fire_rooms` rooms start sending
+    fire readings at `fire_at`, and `dropout_rooms` rooms go silent at `dropout_at`.
+    A /live_stream subscriber records when the dashboard sees ALERT_FIRE, STALE and
+    ALERT_MISSING for those rooms.
+    """
+
+    def __init__(self, server, rooms, rates, stage_seconds, batch_size=0, max_connections=100,
+                 fire_rooms=0, fire_at=5.0, dropout_rooms=0, dropout_at=5.0, room_prefix=ROOM_PREFIX,
+                 stale_seconds=STALE_SECONDS, missing_seconds=MISSING_SECONDS, seed=None):
+        self.server = server
+        self.room_ids = [f"{room_prefix}{index:05d}" for index in range(rooms)]
+        self.room_set = set(self.room_ids)
+        self.rates = rates
+        self.stage_seconds = stage_seconds
+        self.batch_size = batch_size
+        self.max_connections = max_connections
+        self.fire_at = fire_at
+        self.dropout_at = dropout_at
+        self.stale_seconds = stale_seconds
+        self.missing_seconds = missing_seconds
+        rng = random.Random(seed)
+        picked = rng.sample(self.room_ids, min(rooms, fire_rooms + dropout_rooms))
+        self.fire_rooms = set(picked[:fire_rooms])
+        self.dropout_rooms = set(picked[fire_rooms:])
+
+        self.client = None
+        self.interval = 1 / rates[0]
+        self.stage = None
+        self.stopping = False
+        self.fire_active = False
+        self.dropout_active = False
+        self.fire_sent = {} # room -> epoch of its first fire reading
+        self.last_sent = {} # room -> epoch of its last reading before it dropped out
+        self.seen = set() # (room, status) pairs already recorded
+        self.fire_latencies = []
+        self.stale_lateness = []
+        self.missing_lateness = []
+        self.false_stale_rooms = set()
+        self.stream_resyncs = 0
+
+    def _new_stage(self, rate):
+        return {"rate_per_room": rate, "target_readings_per_second": round(rate * len(self.room_ids), 1),
+                "requests": 0, "readings": 0, "errors": 0, "status_codes": {}, "error_types": {},
+                "behind_schedule": 0, "ingest_latencies": [], "request_latencies": []}
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.client = HttpClient(self.server, self.max_connections)
+        started = time.time()
+        watcher = asyncio.create_task(self._watch_statuses()) if self.fire_rooms or self.dropout_rooms else None
+        senders = [self.room_ids[offset:offset + (self.batch_size or 1)] for offset in range(0, len(self.room_ids), self.batch_size or 1)]
+        tasks = [asyncio.create_task(self._sender(rooms)) for rooms in senders]
+        scenario = asyncio.create_task(self._run_scenarios(started))
+
+        stages = []
+        for rate in self.rates:
+            self.interval = 1 / rate
+            self.stage = self._new_stage(rate)
+            stage_started = loop.time()
+            await asyncio.sleep(self.stage_seconds)
+            stages.append(self._finish_stage(self.stage, loop.time() - stage_started))
+
+        self.stopping = True
+        scenario.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if watcher is not None:
+            await asyncio.sleep(0.5) # Let statuses for the last readings arrive
+            watcher.cancel()
+        await self.client.close()
+        return {
+            "config": {"server": self.server, "rooms": len(self.room_ids), "senders": len(senders),
+                       "batch_size": self.batch_size, "rates_per_room": self.rates, "stage_seconds": self.stage_seconds,
+                       "max_connections": self.max_connections, "fire_rooms": len(self.fire_rooms), "fire_at": self.fire_at,
+                       "dropout_rooms": len(self.dropout_rooms), "dropout_at": self.dropout_at},
+            "stages": stages,
+            "fire_alert_to_status": summarize_latencies(self.fire_latencies),
+            "stale_detection_lateness": summarize_latencies(self.stale_lateness),
+            "missing_detection_lateness": summarize_latencies(self.missing_lateness),
+            "fire_rooms_never_seen": len(set(self.fire_sent) - {room for room, status in self.seen if status == "ALERT_FIRE"}),
+            "false_stale_rooms": len(self.false_stale_rooms),
+            "stream_resyncs": self.stream_resyncs,
+            "connections_opened": self.client.connections_opened,
+            "duration_seconds": round(time.time() - started, 2),
+        }
+
+    def _finish_stage(self, stage, elapsed):
+        ingest, request = stage.pop("ingest_latencies"), stage.pop("request_latencies")
+        stage["achieved_readings_per_second"] = round(stage["readings"] / elapsed, 1)
+        stage["ingest_latency"] = summarize_latencies(ingest)
+        stage["request_latency"] = summarize_latencies(request)
+        return stage
+
+    async def _run_scenarios(self, started):
+        events = sorted([(self.fire_at, "fire"), (self.dropout_at, "dropout")])
+        for at, name in events:
+            await asyncio.sleep(max(0, started + at - time.time()))
+            if name == "fire" and self.fire_rooms:
+                self.fire_active = True
+                print(f"LOAD: {len(self.fire_rooms)} room(s) on fire.")
+            elif name == "dropout" and self.dropout_rooms:
+                self.dropout_active = True
+                print(f"LOAD: {len(self.dropout_rooms)} room(s) dropped out.")
+
+    def _reading(self, room_id):
+        if self.fire_active and room_id in self.fire_rooms:
+            self.fire_sent.setdefault(room_id, time.time())
+            return {"roomId": room_id, "temperature": FIRE_TEMPERATURE, "smokeValue": FIRE_SMOKE_VALUE}
+        return generate_reading(room_id)
+
+    async def _sender(self, room_ids):
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(random.uniform(0, self.interval)) # Sensors are not synchronized
+        next_at = loop.time()
+        while not self.stopping:
+            live = [room_id for room_id in room_ids if not (self.dropout_active and room_id in self.dropout_rooms)]
+            if not live:
+                return
+            sent_at = time.time()
+            for room_id in live:
+                if room_id in self.dropout_rooms:
+                    self.last_sent[room_id] = sent_at
+            readings = [self._reading(room_id) for room_id in live]
+            await self._send(readings, next_at)
+
+            next_at += self.interval
+            now = loop.time()
+            if next_at < now:
+                self.stage["behind_schedule"] += 1
+                next_at = now # Don't burst to catch up
+            await asyncio.sleep(next_at - now)
+
+    async def _send(self, readings, scheduled_at):
+        loop = asyncio.get_running_loop()
+        stage = self.stage
+        started = loop.time()
+        try:
+            if self.batch_size:
+                status, _ = await self.client.request("POST", "/sensordata/batch", {"readings": readings})
+            else:
+                status, _ = await self.client.request("POST", "/sensordata", readings[0])
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            stage["errors"] += 1
+            stage["error_types"][type(e).__name__] = stage["error_types"].get(type(e).__name__, 0) + 1
+            return
+        finished = loop.time()
+        stage["requests"] += 1
+        stage["status_codes"][str(status)] = stage["status_codes"].get(str(status), 0) + 1
+        if status >= 400:
+            stage["errors"] += 1
+            return
+        stage["readings"] += len(readings)
+        stage["ingest_latencies"].append(finished - scheduled_at)
+        stage["request_latencies"].append(finished - started)
+
+    async def _watch_statuses(self):
+        while True:
+            try:
+                async for event, data in self.client.stream_events("/live_stream"):
+                    if event == "resync":
+                        self.stream_resyncs += 1 # We fell behind; the server drops us and we reconnect
+                        break
+                    if event in ("snapshot", "point", "status"):
+                        now = time.time()
+                        for room_id, entry in json.loads(data)["rooms"].items():
+                            self._on_status(room_id, entry.get("status"), now)
+            except (OSError, asyncio.IncompleteReadError) as e:
+                print(f"LOAD: Event stream failed ({e}). Reconnecting...", file=sys.stderr)
+            await asyncio.sleep(STREAM_RECONNECT_SECONDS)
+
+    def _on_status(self, room_id, status, now):
+        if (room_id, status) in self.seen:
+            return
+        if status == "ALERT_FIRE" and room_id in self.fire_sent:
+            self.seen.add((room_id, status))
+            self.fire_latencies.append(now - self.fire_sent[room_id])
+        elif status in ("STALE", "ALERT_MISSING"):
+            if not (self.dropout_active and room_id in self.dropout_rooms):
+                if room_id in self.room_set:
+                    self.false_stale_rooms.add(room_id) # Still sending, but the server saw a gap
+                return
+            self.seen.add((room_id, status))
+            timeout = self.stale_seconds if status == "STALE" else self.missing_seconds
+            lateness = now - (self.last_sent[room_id] + timeout)
+            (self.stale_lateness if status == "STALE" else self.missing_lateness).append(lateness)
+
+
+def parse_rates(value):
+    rates = [float(rate) for rate in value.split(",") if rate.strip()]
+    if not rates or min(rates) <= 0:
+        raise argparse.ArgumentTypeError("rates must be positive numbers, e.g. 0.5 or 0.5,1,2")
+    return rates
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IRIS ingest load generator")
+    parser.add_argument("--server", default=DEFAULT_SERVER)
+    parser.add_argument("--rooms", type=int, default=1000)
+    parser.add_argument("--rate", type=parse_rates, default=[0.5], help="Readings per second per room; a comma-separated list runs one stage per rate")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per stage")
+    parser.add_argument("--batch-size", type=int, default=0, help="Rooms per /sensordata/batch request (0 posts each reading to /sensordata)")
+    parser.add_argument("--connections", type=int, default=100, help="Maximum concurrent HTTP connections")
+    parser.add_argument("--fire-rooms", type=int, default=0)
+    parser.add_argument("--fire-at", type=float, default=5, help="Seconds into the run when the fire starts")
+    parser.add_argument("--dropout-rooms", type=int, default=0)
+    parser.add_argument("--dropout-at", type=float, default=5, help="Seconds into the run when rooms go silent")
+    parser.add_argument("--room-prefix", default=ROOM_PREFIX)
+    parser.add_argument("--seed", type=int, help="Seed for picking fire/dropout rooms")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    total_seconds = args.duration * len(args.rate)
+    if args.dropout_rooms and args.dropout_at + MISSING_SECONDS > total_seconds:
+        print(f"LOAD: Warning: the run ends before dropped rooms can reach ALERT_MISSING ({args.dropout_at + MISSING_SECONDS:.0f}s needed).", file=sys.stderr)
+    if args.fire_rooms:
+        print("LOAD: Note: fire readings latch ALERT_FIRE on the server and trigger real alerts.", file=sys.stderr)
+
+    load_test = LoadTest(args.server, args.rooms, args.rate, args.duration, batch_size=args.batch_size,
+                         max_connections=args.connections, fire_rooms=args.fire_rooms, fire_at=args.fire_at,
+                         dropout_rooms=args.dropout_rooms, dropout_at=args.dropout_at,
+                         room_prefix=args.room_prefix, seed=args.seed)
+    results = asyncio.run(load_test.run())
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,354 @@
+import bisect
+import collections
+import os
+import sys
+import threading
+import time
+
+# Seconds. Request and query latencies; lock waits use the finer LOCK_BUCKETS.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LOCK_BUCKETS = (0.000001, 0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+# Innermost frames in these files are threads parked on a lock, queue or socket.
+IDLE_FRAME_FILES = ("threading.py", "queue.py", "selectors.py", "socket.py", "socketserver.py", "ssl.py")
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value):
+        self.value = value
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("_child", "_started")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._child.observe(time.perf_counter() - self._started)
+
+
+class Metric:
+    # A named family of children, one per combination of label values.
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {} # Label values as strings -> child
+        self._lookup = {} # Label values as passed to labels() -> child, so repeat calls skip the str() conversion
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self._lookup.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(tuple(str(value) for value in values), self._new_child())
+                self._lookup[values] = child
+        return child
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.documentation}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        for key, child in self._items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}")
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+
+class Gauge(Metric):
+    """
+    A value that can go up and down. With `callback`, the value is read at scrape
+    time instead: the callback returns a number, or for a labelled gauge a dict of
+    label-value tuples to numbers.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._children[()].set(value)
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+    def dec(self, amount=1):
+        self._children[()].dec(amount)
+
+    def render(self, lines):
+        if self.callback is None:
+            return super().render(lines)
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"METRICS ERROR: Callback for {self.name} failed: {e}", file=sys.stderr)
+            return
+        if values is None:
+            return
+        lines.append(f"# HELP {self.name} {self.documentation}")
+        lines.append(f"# TYPE {self.name} gauge")
+        if not self.labelnames:
+            values = {(): values}
+        for key, value in values.items():
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._children[()].observe(value)
+
+    def time(self):
+        return self._children[()].time()
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.documentation}")
+        lines.append(f"# TYPE {self.name} histogram")
+        names = self.labelnames + ("le",)
+        for key, child in self._items():
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + (_format_value(bound),))} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+
+
+class MetricsRegistry:
+    """
+    The metrics of one process, rendered in the Prometheus text exposition format.
+
+    `counter()`, `gauge()` and `histogram()` return the existing metric when the name
+    is already registered, so modules can declare their metrics at import time.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self._register(Gauge, name, documentation, labelnames, callback=callback)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.render(lines)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def _parse_families(text):
+    # Exposition text -> {family name: [HELP line, TYPE line, sample lines...]}, in order.
+    # Samples belong to the family of the TYPE line above them (histogram _bucket/_sum/_count too).
+    families = {}
+    current = None
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            current = families.setdefault(line.split(" ", 3)[2], [])
+            if not current:
+                current.append(line)
+        elif line.startswith("# TYPE "):
+            current = families.setdefault(line.split(" ", 3)[2], [])
+            if not any(existing.startswith("# TYPE ") for existing in current):
+                current.append(line)
+        elif line and not line.startswith("#") and current is not None:
+            current.append(line)
+    return families
+
+def _add_labels(sample, labels):
+    name_end = min(index for index in (sample.find("{"), sample.find(" ")) if index != -1)
+    extra = _format_labels(tuple(labels), tuple(labels.values()))[1:-1]
+    if sample[name_end] == "{":
+        return f"{sample[:name_end]}{{{extra},{sample[name_end + 1:]}"
+    return f"{sample[:name_end]}{{{extra}}}{sample[name_end:]}"
+
+def merge_exposition(text, other_text, labels):
+    """
+    Adds the metrics another process rendered (`other_text`) to this process's `text`.
+    Every sample of the other process gets `labels` (e.g. {"process": "detector"}), and a
+    family both processes export is written once, with one HELP and TYPE line:
+    Prometheus rejects an exposition that declares the same family twice.
+    """
+    if not other_text.strip():
+        return text
+    families = _parse_families(text)
+    for name, lines in _parse_families(other_text).items():
+        samples = [_add_labels(line, labels) for line in lines if not line.startswith("#")]
+        if name in families:
+            families[name].extend(samples)
+        else:
+            families[name] = [line for line in lines if line.startswith("#")] + samples
+    return "\n".join(line for lines in families.values() for line in lines) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class TimedLock:
+    # Drop-in for a threading.Lock used in `with` blocks; records how long callers waited
+    # for it and how long they held it.
+    def __init__(self, name, registry=REGISTRY):
+        self._lock = threading.Lock()
+        self._wait = registry.histogram("iris_lock_wait_seconds", "Time spent waiting to acquire a lock.", ("lock",), buckets=LOCK_BUCKETS).labels(name)
+        self._hold = registry.histogram("iris_lock_hold_seconds", "Time a lock was held.", ("lock",), buckets=LOCK_BUCKETS).labels(name)
+        self._acquired_at = 0.0
+
+    def __enter__(self):
+        started = time.perf_counter()
+        self._lock.acquire()
+        self._acquired_at = acquired_at = time.perf_counter()
+        self._wait.observe(acquired_at - started)
+        return self
+
+    def __exit__(self, *exc_info):
+        held = time.perf_counter() - self._acquired_at
+        self._lock.release()
+        self._hold.observe(held)
+
+
+# --- SAMPLING PROFILER ---
+
+_profile_lock = threading.Lock()
+
+def sample_stacks(seconds, interval_seconds=0.005, include_idle=False, max_depth=60):
+    """
+    Samples the stack of every other thread every `interval_seconds` for `seconds`.
+    Returns (Counter of collapsed stacks "thread;outer;...;inner", number of samples),
+    or None if another profile is already running. Threads parked in threading/queue/
+    socket code are left out unless `include_idle` is set.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        me = threading.get_ident()
+        stacks = collections.Counter()
+        samples = 0
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if not include_idle and os.path.basename(frame.f_code.co_filename) in IDLE_FRAME_FILES:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stacks[";".join([names.get(ident, str(ident))] + stack[::-1])] += 1
+            samples += 1
+            time.sleep(interval_seconds)
+        return stacks, samples
+    finally:
+        _profile_lock.release()
+
+def format_collapsed(stacks, limit=None):
+    # One "stack count" line per stack, hottest first; the input format of flamegraph.pl and speedscope.
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common(limit))
@@ -0,0 +1,116 @@
+import json
+import re
+import threading
+
+ROOM_ID = re.compile(r"([A-Za-z]*)(\d*)")
+
+
+def _dumps(data):
+    return json.dumps(data, separators=(',', ':')).encode()
+
+
+def default_floor_of(room_id):
+    # A room id is a letter prefix and a number whose last two digits are the room on its
+    # floor. "R" marks an ordinary floor, any other prefix a separate level such as the
+    # basement: "R101" -> "1", "R207" -> "2", "R1203" -> "12", "B001" -> "B", "B101" -> "B1".
+    prefix, number = ROOM_ID.match(room_id).groups()
+    floor = str(int(number) // 100) if number else ""
+    if prefix.upper() == "R":
+        return floor
+    return prefix if floor in ("", "0") else prefix + floor
+
+
+class OccupancyIndex:
+    """
+    People counts per room, floor and building, answered without touching the database.
+
+    `set()` records a room's count and marks its floor and the building dirty;
+    `render_dirty()` then re-renders only those JSON bodies. Queries are a dict lookup
+    that returns the ready-made body, so the Retell tool endpoint does no SQL, sorting
+    or serialization. A negative count means "not detected yet" and counts as 0.
+    """
+
+    def __init__(self, floor_of=default_floor_of):
+        self.floor_of = floor_of
+        self.renders = 0
+        self._counts = {} # room_id -> people count as stored
+        self._floors = {} # floor -> set of room ids
+        self._room_bodies = {}
+        self._floor_bodies = {}
+        self._building_body = self._render_building()
+        self._dirty_floors = set()
+        self._building_dirty = False
+        self._lock = threading.Lock()
+
+    # --- Updates ---
+
+    def set(self, room_id, people_count):
+        with self._lock:
+            if self._counts.get(room_id, object()) == people_count:
+                return
+            if room_id not in self._counts:
+                self._floors.setdefault(self.floor_of(room_id), set()).add(room_id)
+            self._counts[room_id] = people_count
+            self._room_bodies[room_id] = _dumps({"status": "success", "ruangan": room_id, "jumlah_orang": max(people_count, 0)})
+            self._dirty_floors.add(self.floor_of(room_id))
+            self._building_dirty = True
+
+    def clear(self):
+        # Forgets every room, e.g. before the index is rebuilt from a fresh snapshot.
+        with self._lock:
+            self._counts.clear()
+            self._floors.clear()
+            self._room_bodies.clear()
+            self._floor_bodies.clear()
+            self._building_body = self._render_building()
+            self._dirty_floors.clear()
+            self._building_dirty = False
+
+    def render_dirty(self):
+        # Call after a batch of set() calls.
+        with self._lock:
+            if not self._building_dirty:
+                return
+            for floor in self._dirty_floors:
+                total, details = self._summarize(self._floors[floor])
+                self._floor_bodies[floor] = _dumps({"status": "success", "lantai": floor, "jumlah_orang": total, "details": details})
+            self._building_body = self._render_building()
+            self._dirty_floors.clear()
+            self._building_dirty = False
+            self.renders += 1
+
+    def _summarize(self, room_ids):
+        # Caller must hold self._lock. Only rooms with people, sorted, like the old SQL query.
+        details = [{"ruangan": room_id, "peopleCount": self._counts[room_id]} for room_id in sorted(room_ids) if self._counts[room_id] > 0]
+        return sum(detail["peopleCount"] for detail in details), details
+
+    def _render_building(self):
+        total, details = self._summarize(self._counts)
+        return _dumps({"status": "success", "total_people": total, "details": details})
+
+    # --- Queries ---
+
+    def room(self, room_id):
+        # JSON body for one room, or None if the room is unknown.
+        return self._room_bodies.get(room_id)
+
+    def floor(self, floor):
+        return self._floor_bodies.get(floor)
+
+    def building(self):
+        return self._building_body
+
+    def rooms(self, room_ids):
+        # (JSON body, number of rooms found) for several rooms at once.
+        with self._lock:
+            counts = {room_id: self._counts[room_id] for room_id in room_ids if room_id in self._counts}
+        found = [{"ruangan": room_id, "jumlah_orang": max(counts[room_id], 0)} for room_id in room_ids if room_id in counts]
+        body = {
+            "status": "success" if found else "error",
+            "rooms": found,
+            "total_people": sum(room["jumlah_orang"] for room in found),
+            "not_found": [room_id for room_id in room_ids if room_id not in counts],
+        }
+        if not found:
+            body["message"] = "None of the requested rooms were found."
+        return _dumps(body), len(found)
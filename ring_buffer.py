@@ -0,0 +1,122 @@
+import array
+import threading
+import time
+from functools import lru_cache
+
+# Missing readings are stored as NaN so every column stays a flat C array of doubles.
+MISSING = float('nan')
+
+
+@lru_cache(maxsize=4096)
+def _label_for_second(epoch_second):
+    return time.strftime('%H:%M:%S', time.gmtime(epoch_second))
+
+
+def format_label(epoch):
+    # Chart labels only have second resolution, so the formatting is cached per second.
+    return _label_for_second(int(epoch))
+
+
+class SensorRingBuffer:
+    """
+    Fixed-size columnar history for a single room.
+
+    Each column (epoch time, temperature, smoke) is a preallocated `array.array`,
+    so appending is O(1) and never allocates. Readers get memoryview slices of the
+    columns through `tail()` instead of copies. Every point also carries a
+    caller-supplied, monotonically increasing sequence number so readers can ask
+    for only the points newer than a cursor.
+    """
+
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise ValueError("capacity must be a positive integer")
+        self.capacity = capacity
+        self.epochs = array.array('d', [0.0]) * capacity
+        self.temperatures = array.array('d', [MISSING]) * capacity
+        self.smoke_values = array.array('d', [MISSING]) * capacity
+        self.sequences = array.array('q', [0]) * capacity
+        self.total_appended = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.total_appended, self.capacity)
+
+    def append(self, epoch, temperature, smoke_value, seq=None):
+        with self._lock:
+            index = self.total_appended % self.capacity
+            self.epochs[index] = epoch
+            self.temperatures[index] = MISSING if temperature is None else temperature
+            self.smoke_values[index] = MISSING if smoke_value is None else smoke_value
+            self.total_appended += 1
+            self.sequences[index] = self.total_appended if seq is None else seq
+
+    def _first_after(self, since_seq):
+        # Binary search over the logical (oldest -> newest) order; sequences are ascending.
+        lo, hi = self.total_appended - len(self), self.total_appended
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.sequences[mid % self.capacity] > since_seq:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def tail(self, count=None, since_seq=None):
+        """
+        Return a RingView over the newest `count` points (all retained points if None),
+        restricted to points whose sequence number is greater than `since_seq`.
+        """
+        with self._lock:
+            end = self.total_appended
+            start = end - len(self)
+            if since_seq is not None:
+                start = self._first_after(since_seq)
+            if count is not None:
+                start = max(start, end - max(0, count))
+            return RingView(self, start, end)
+
+
+class RingView:
+    """
+    Zero-copy view over a logical range of a SensorRingBuffer.
+
+    The range is split into at most two physical segments because of wrap-around.
+    A view stays valid until the writer has appended `capacity - len(view)` more
+    points, which is why the buffer capacity should be well above the number of
+    points read at once.
+    """
+
+    def __init__(self, buffer, start, end):
+        self.start = start
+        self.end = end
+        self.segments = []
+        if end <= start:
+            return
+        capacity = buffer.capacity
+        epochs = memoryview(buffer.epochs)
+        temperatures = memoryview(buffer.temperatures)
+        smoke_values = memoryview(buffer.smoke_values)
+        lo, hi = start % capacity, end % capacity or capacity
+        ranges = [(lo, hi)] if lo < hi else [(lo, capacity), (0, hi)]
+        for a, b in ranges:
+            self.segments.append((epochs[a:b], temperatures[a:b], smoke_values[a:b]))
+
+    def __len__(self):
+        return self.end - self.start
+
+    def _column(self, column):
+        for segment in self.segments:
+            yield from segment[column]
+
+    def epochs(self):
+        return list(self._column(0))
+
+    def labels(self):
+        return [format_label(epoch) for epoch in self._column(0)]
+
+    def temperatures(self):
+        return [None if value != value else value for value in self._column(1)]
+
+    def smoke_values(self):
+        return [None if value != value else int(value) for value in self._column(2)]
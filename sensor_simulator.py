@@ -1,55 +1,119 @@
+import argparse
 import requests
+import socket
 import time
 import random
 import json
 
+from udp_ingest import encode_frame
+
 SERVER_URL = "http://127.0.0.1:5000/sensordata"
+BATCH_SERVER_URL = "http://127.0.0.1:5000/sensordata/batch"
+UDP_SERVER_ADDRESS = ("127.0.0.1", 5056)
 ROOM_IDS = ["B001", "R101", "R103", "R202", "R203", "R207"]
 
 SEND_INTERVAL = 2
 
-def run_simulator():
+def generate_reading(room_id):
+    return {
+        "roomId": room_id,
+        "temperature": round(random.uniform(25.0, 30.0), 2),
+        "smokeValue": random.randint(50, 150)
+    }
+
+def send_burst_individually(session):
+    for room_id in ROOM_IDS:
+        # JSON payload
+        payload = generate_reading(room_id)
+
+        # HTTP POST
+        response = session.post(SERVER_URL, json=payload, timeout=5)
+        response.raise_for_status()
+
+        print(f"  -> Ruangan: {room_id}, Data: {json.dumps(payload)}, Status: {response.status_code}")
+        time.sleep(0.1)
+
+def send_burst_as_batch(session):
+    # Satu request untuk semua ruangan, seperti gateway yang mengumpulkan banyak sensor ESP32
+    readings = [generate_reading(room_id) for room_id in ROOM_IDS]
+    response = session.post(BATCH_SERVER_URL, json={"readings": readings}, timeout=5)
+    response.raise_for_status()
+    body = response.json()
+
+    print(f"  -> Batch {len(readings)} ruangan, Status: {response.status_code}, Diterima: {body.get('accepted')}, Ditolak: {body.get('rejected')}")
+    for result in body.get("results", []):
+        if result.get("status") != "success":
+            print(f"     GAGAL -> Ruangan: {result.get('roomId')}, Pesan: {result.get('message')}")
+
+def next_frame(room_id, sequence_numbers):
+    # Nomor urut per ruangan, seperti counter di ESP32, agar server bisa mendeteksi frame yang hilang
+    reading = generate_reading(room_id)
+    sequence_numbers[room_id] = sequence_numbers.get(room_id, -1) + 1
+    return reading, encode_frame(room_id, sequence_numbers[room_id], reading["temperature"], reading["smokeValue"])
+
+def send_burst_over_udp(sock, sequence_numbers, batch=False):
+    # Frame biner 17 byte per pembacaan; pada mode batch semua frame dikirim dalam satu datagram
+    frames = []
+    for room_id in ROOM_IDS:
+        reading, frame = next_frame(room_id, sequence_numbers)
+        if batch:
+            frames.append(frame)
+            continue
+        sock.sendto(frame, UDP_SERVER_ADDRESS)
+        print(f"  -> Ruangan: {room_id}, Seq: {sequence_numbers[room_id]}, Data: {json.dumps(reading)}, {len(frame)} byte")
+        time.sleep(0.1)
+    if batch:
+        datagram = b"".join(frames)
+        sock.sendto(datagram, UDP_SERVER_ADDRESS)
+        print(f"  -> Datagram {len(frames)} ruangan, {len(datagram)} byte")
+
+def run_simulator(batch=False, udp=False):
     """
     Menjalankan simulator untuk mengirim data sensor dummy ke server.
     Data untuk semua ruangan dikirim dalam satu burst, lalu ada jeda.
+    Pada mode batch, satu burst dikirim sebagai satu request ke endpoint batch.
+    Pada mode UDP, pembacaan dikirim sebagai frame biner ke listener UDP server.
     """
+    if udp:
+        target_url = f"udp://{UDP_SERVER_ADDRESS[0]}:{UDP_SERVER_ADDRESS[1]}"
+    else:
+        target_url = BATCH_SERVER_URL if batch else SERVER_URL
     print("-----------------------------------------")
-    print("--- Sensor Simulator untuk IRIS (Mode Burst) ---")
-    print(f"Target Server: {SERVER_URL}")
+    print(f"--- Sensor Simulator untuk IRIS (Mode {'Batch' if batch else 'Burst'}{' UDP' if udp else ''}) ---")
+    print(f"Target Server: {target_url}")
     print(f"Mengirim data untuk ruangan: {', '.join(ROOM_IDS)}")
     print(f"Interval Jeda: {SEND_INTERVAL} detik setelah semua data terkirim")
     print("Tekan CTRL+C untuk menghentikan simulator.")
     print("-----------------------------------------")
 
+    # Session menjaga koneksi keep-alive antar request
+    session = requests.Session()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sequence_numbers = {}
     while True:
         try:
             print(f"\n[{time.strftime('%H:%M:%S')}] --- MENGIRIM BURST DATA UNTUK SEMUA RUANGAN ---")
-            for room_id in ROOM_IDS:
-                dummy_temperature = round(random.uniform(25.0, 30.0), 2)
-                dummy_smoke_value = random.randint(50, 150)
-
-                # JSON payload
-                payload = {
-                    "roomId": room_id,
-                    "temperature": dummy_temperature,
-                    "smokeValue": dummy_smoke_value
-                }
-
-                # HTTP POST
-                response = requests.post(SERVER_URL, json=payload, timeout=5)
-                response.raise_for_status()  
-
-                print(f"  -> Ruangan: {room_id}, Data: {json.dumps(payload)}, Status: {response.status_code}")
-                time.sleep(0.1)
+            if udp:
+                send_burst_over_udp(sock, sequence_numbers, batch=batch)
+            elif batch:
+                send_burst_as_batch(session)
+            else:
+                send_burst_individually(session)
 
             print(f"--- BURST SELESAI. Menunggu {SEND_INTERVAL} detik... ---")
 
         except requests.exceptions.ConnectionError:
-            print(f"[{time.strftime('%H:%M:%S')}] GAGAL -> Koneksi ke server {SERVER_URL} ditolak. Pastikan server app.py sedang berjalan.")
+            print(f"[{time.strftime('%H:%M:%S')}] GAGAL -> Koneksi ke server {target_url} ditolak. Pastikan server app.py sedang berjalan.")
         except requests.exceptions.RequestException as e:
             print(f"[{time.strftime('%H:%M:%S')}] GAGAL -> Terjadi error saat mengirim data: {e}")
-        
+        except OSError as e:
+            print(f"[{time.strftime('%H:%M:%S')}] GAGAL -> Datagram UDP tidak terkirim: {e}")
+
         time.sleep(SEND_INTERVAL)
 
 if __name__ == "__main__":
-    run_simulator()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Simulator sensor IRIS")
+    parser.add_argument("--batch", action="store_true", help="Kirim semua ruangan dalam satu request ke /sensordata/batch")
+    parser.add_argument("--udp", action="store_true", help="Kirim frame biner lewat UDP ke port 5056 (dengan --batch: satu datagram per burst)")
+    args = parser.parse_args()
+    run_simulator(batch=args.batch, udp=args.udp)
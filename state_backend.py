@@ -0,0 +1,265 @@
+import collections
+import json
+import threading
+import time
+
+from db_access import Database
+
+
+def new_boot_id(previous=None):
+    # Never the same as `previous`, so a reset within the same millisecond still invalidates cursors.
+    boot_id = int(time.time() * 1000)
+    if previous is not None and boot_id <= int(previous, 16):
+        boot_id = int(previous, 16) + 1
+    return format(boot_id, 'x')
+
+
+class _MemoryTransaction:
+    # Changes are staged here and only applied when the transaction function returns.
+    def __init__(self, backend):
+        self._backend = backend
+        self._records = {}
+        self._changes = []
+
+    def get(self, room_id):
+        record = self._records.get(room_id)
+        return record if record is not None else self._backend._rooms.get(room_id)
+
+    def put(self, room_id, event, changes):
+        record = self._records.get(room_id)
+        if record is None:
+            record = self._records[room_id] = dict(self._backend._rooms.get(room_id, ()))
+        record.update(changes)
+        self._changes.append((room_id, event, changes))
+
+
+class MemoryStateBackend:
+    """
+    Room state for a single server process (`python app.py`).
+
+    Same API as SQLiteStateBackend, kept in dicts behind one lock. The change log is a
+    bounded deque; a reader that falls further behind than `max_log_entries` gets None
+    from `changes_since()` and reloads a `snapshot()` instead.
+    """
+
+    shared = False # Only this process writes, so there is nothing to poll for
+
+    def __init__(self, max_log_entries=100000):
+        self.boot_id = new_boot_id()
+        self._rooms = {}
+        self._log = collections.deque(maxlen=max_log_entries)
+        self._seq = 0
+        self._latches = set()
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.boot_id = new_boot_id(self.boot_id)
+            self._rooms.clear()
+            self._log.clear()
+            self._seq = 0
+            self._latches.clear()
+            self._leases.clear()
+
+    # --- Room records and change log ---
+
+    def transaction(self, fn):
+        # Runs fn(tx) atomically and returns its result. tx.get(room_id) returns the room's
+        # record (or None), which the caller must not modify; tx.put(room_id, event, changes)
+        # merges `changes` into it and appends them to the change log, which takes
+        # ownership of the `changes` dict.
+        with self._lock:
+            tx = _MemoryTransaction(self)
+            result = fn(tx)
+            self._rooms.update(tx._records)
+            for room_id, event, changes in tx._changes:
+                self._seq += 1
+                self._log.append((self._seq, room_id, event, changes))
+            return result
+
+    def changes_since(self, seq, limit=5000):
+        # Returns [(seq, room_id, event, changes), ...] in order, or None if entries after
+        # `seq` have already been dropped from the log.
+        with self._lock:
+            if seq >= self._seq:
+                return []
+            if not self._log or self._log[0][0] > seq + 1:
+                return None
+            start = seq + 1 - self._log[0][0]
+            return [self._log[index] for index in range(start, min(start + limit, len(self._log)))]
+
+    def snapshot(self):
+        # (latest seq, {room_id: record}) for readers that have to start over.
+        with self._lock:
+            return self._seq, {room_id: dict(record) for room_id, record in self._rooms.items()}
+
+    def trim_log(self, keep):
+        pass # The deque already holds at most max_log_entries
+
+    # --- Latches and leases ---
+
+    def try_latch(self, name):
+        # Sets the latch; returns True only for the caller that set it.
+        with self._lock:
+            if name in self._latches:
+                return False
+            self._latches.add(name)
+            return True
+
+    def release_latch(self, name):
+        with self._lock:
+            self._latches.discard(name)
+
+    def is_latched(self, name):
+        return name in self._latches
+
+    def acquire_lease(self, name, owner, ttl_seconds):
+        # Takes or renews the lease; returns True while `owner` holds it.
+        now = time.time()
+        with self._lock:
+            holder, expires = self._leases.get(name, (None, 0))
+            if holder not in (None, owner) and expires > now:
+                return False
+            self._leases[name] = (owner, now + ttl_seconds)
+            return True
+
+
+class SQLiteStateBackend:
+    """
+    Room state shared by every server worker on this host, in one SQLite file in WAL mode.
+
+    Writes go through db_access.Database, so concurrent transactions from one worker
+    are committed together and transactions from different workers are serialized by
+    SQLite's write lock. Change log sequence numbers are therefore global and assigned
+    in commit order, so every worker sees the same history in the same order. Latches
+    (INSERT OR IGNORE) and leases (conditional upsert) are single statements, which
+    makes them atomic across processes.
+    """
+
+    shared = True
+
+    def __init__(self, path):
+        self.path = path
+        self.database = Database(path)
+        self._boot_id = None
+
+    @property
+    def boot_id(self):
+        # Read once per worker; reset() writes a new one for every server start.
+        if self._boot_id is None:
+            self.database.transaction(self._create_schema).result()
+            self._boot_id = self.database.query_one("SELECT value FROM meta WHERE key = 'boot_id'")[0]
+        return self._boot_id
+
+    def _create_schema(self, conn, previous_boot_id=None):
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS rooms (room_id TEXT PRIMARY KEY, record TEXT NOT NULL)")
+        # AUTOINCREMENT so a sequence number is never reused after the log is trimmed.
+        conn.execute("CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, room_id TEXT NOT NULL, event TEXT NOT NULL, changes TEXT NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS latches (name TEXT PRIMARY KEY)")
+        conn.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('boot_id', ?)", (new_boot_id(previous_boot_id),))
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('trimmed_through', '0')")
+
+    def reset(self):
+        def reset_all(conn):
+            # Dropping `changes` also drops its AUTOINCREMENT counter, so seqs start over at 1.
+            # The new boot id tells the other workers that their mirrors and cursors are void.
+            self._create_schema(conn)
+            previous_boot_id = conn.execute("SELECT value FROM meta WHERE key = 'boot_id'").fetchone()[0]
+            for table in ("meta", "rooms", "changes", "latches", "leases"):
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self._create_schema(conn, previous_boot_id)
+            return conn.execute("SELECT value FROM meta WHERE key = 'boot_id'").fetchone()[0]
+        self._boot_id = self.database.transaction(reset_all).result()
+
+    # --- Room records and change log ---
+
+    def transaction(self, fn):
+        # Same contract as MemoryStateBackend.transaction; fn runs on the writer thread.
+        return self.database.transaction(lambda conn: fn(_SQLiteTransaction(conn))).result()
+
+    def changes_since(self, seq, limit=5000):
+        # Also None after another process reset the state: `seq` belongs to the old boot id.
+        with self.database.reader() as conn:
+            conn.execute("BEGIN")
+            try:
+                meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+                if self._adopt_boot_id(meta["boot_id"]) or seq < int(meta["trimmed_through"]):
+                    return None
+                rows = conn.execute("SELECT seq, room_id, event, changes FROM changes WHERE seq > ? ORDER BY seq LIMIT ?", (seq, limit)).fetchall()
+            finally:
+                conn.execute("COMMIT")
+        return [(row_seq, room_id, event, json.loads(changes)) for row_seq, room_id, event, changes in rows]
+
+    def snapshot(self):
+        with self.database.reader() as conn:
+            conn.execute("BEGIN") # One read transaction, so the seq matches the records
+            try:
+                self._adopt_boot_id(conn.execute("SELECT value FROM meta WHERE key = 'boot_id'").fetchone()[0])
+                seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+                rows = conn.execute("SELECT room_id, record FROM rooms").fetchall()
+            finally:
+                conn.execute("COMMIT")
+        return seq, {room_id: json.loads(record) for room_id, record in rows}
+
+    def _adopt_boot_id(self, boot_id):
+        # Returns True if the state was reset since this worker last read the boot id.
+        changed = self._boot_id is not None and boot_id != self._boot_id
+        self._boot_id = boot_id
+        return changed
+
+    def trim_log(self, keep):
+        # Drops all but the newest `keep` change log entries.
+        def trim(conn):
+            newest = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+            if newest <= keep:
+                return 0
+            conn.execute("UPDATE meta SET value = ? WHERE key = 'trimmed_through'", (str(newest - keep),))
+            return conn.execute("DELETE FROM changes WHERE seq <= ?", (newest - keep,)).rowcount
+        return self.database.transaction(trim).result()
+
+    # --- Latches and leases ---
+
+    def try_latch(self, name):
+        return self.database.execute("INSERT OR IGNORE INTO latches (name) VALUES (?)", (name,)).result() == 1
+
+    def release_latch(self, name):
+        self.database.execute("DELETE FROM latches WHERE name = ?", (name,)).result()
+
+    def is_latched(self, name):
+        return self.database.query_one("SELECT 1 FROM latches WHERE name = ?", (name,)) is not None
+
+    def acquire_lease(self, name, owner, ttl_seconds):
+        now = time.time()
+        return self.database.execute(
+            "INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+            "WHERE leases.owner = excluded.owner OR leases.expires < ?",
+            (name, owner, now + ttl_seconds, now)).result() == 1
+
+
+class _SQLiteTransaction:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def get(self, room_id):
+        row = self._conn.execute("SELECT record FROM rooms WHERE room_id = ?", (room_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, room_id, event, changes):
+        record = self.get(room_id) or {}
+        record.update(changes)
+        self._conn.execute("INSERT INTO rooms (room_id, record) VALUES (?, ?) ON CONFLICT(room_id) DO UPDATE SET record = excluded.record",
+                           (room_id, json.dumps(record)))
+        self._conn.execute("INSERT INTO changes (room_id, event, changes) VALUES (?, ?, ?)", (room_id, event, json.dumps(changes)))
+
+
+def create_state_backend(kind, path, max_log_entries=100000):
+    # "memory" for a single server process, "sqlite" when several workers share the state.
+    if kind == "memory":
+        return MemoryStateBackend(max_log_entries)
+    if kind == "sqlite":
+        return SQLiteStateBackend(path)
+    raise ValueError(f"Unknown state backend '{kind}' (expected 'memory' or 'sqlite')")
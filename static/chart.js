@@ -13,6 +13,9 @@ document.addEventListener('DOMContentLoaded', function () {
 
     let roomCharts = {}; 
     let fireAlertEverTriggered = false; // <-- VARIABEL GLOBAL UNTUK MELACAK STATUS KEBAKARAN
+    let roomsState = {}; // Status terakhir setiap ruangan, digabung dari respons delta
+    let liveCursor = null; // Cursor dari server untuk mode delta (?since=)
+    let maxPointsPerRoom = 50;
 
     const chartDefaultOptions = {
         responsive: true,
@@ -162,6 +165,16 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     }
 
+    function removeRoomCard(roomId) {
+        const charts = roomCharts[roomId];
+        if (charts) {
+            charts.tempChart.destroy();
+            charts.smokeChart.destroy();
+            delete roomCharts[roomId];
+        }
+        document.getElementById(`card-${roomId}`)?.remove();
+    }
+
     function updateRoomCard(roomId, data) {
         if (!document.getElementById(`card-${roomId}`)) {
             createRoomCard(roomId);
@@ -176,17 +189,7 @@ document.addEventListener('DOMContentLoaded', function () {
         document.getElementById(`temp-${roomId}`).textContent = data.temperature_current !== null ? `${data.temperature_current.toFixed(1)} °C` : 'N/A';
         document.getElementById(`smoke-${roomId}`).textContent = data.smoke_current !== null ? data.smoke_current : 'N/A';
         
-        const updateTimeEl = document.getElementById(`update-${roomId}`);
-        if (updateTimeEl) {
-            let lastUpdateText = 'N/A';
-            if (data.last_update_iso) {
-                try {
-                    lastUpdateText = luxon.DateTime.fromISO(data.last_update_iso).toRelative({ base: luxon.DateTime.now(), style: 'short' }) || 
-                                     luxon.DateTime.fromISO(data.last_update_iso).toLocaleString(luxon.DateTime.TIME_SIMPLE);
-                } catch (e) { lastUpdateText = data.last_update_iso; }
-            }
-            updateTimeEl.textContent = lastUpdateText;
-        }
+        renderUpdateTime(roomId, data.last_update_iso);
 
         const peopleReadingContainer = document.getElementById(`people-reading-${roomId}`);
         const peopleCountValue = document.getElementById(`people-${roomId}`);
@@ -200,18 +203,45 @@ document.addEventListener('DOMContentLoaded', function () {
         }
 
         if (roomCharts[roomId] && roomCharts[roomId].tempChart) {
-            roomCharts[roomId].tempChart.data.labels = data.labels || [];
-            roomCharts[roomId].tempChart.data.datasets[0].data = data.temperatures || [];
-            roomCharts[roomId].tempChart.update('none');
+            applyChartDelta(roomCharts[roomId].tempChart, data.labels || [], data.temperatures || [], data.replace);
         }
 
         if (roomCharts[roomId] && roomCharts[roomId].smokeChart) {
-            roomCharts[roomId].smokeChart.data.labels = data.labels || [];
-            roomCharts[roomId].smokeChart.data.datasets[0].data = data.smokeValues || [];
-            roomCharts[roomId].smokeChart.update('none');
+            applyChartDelta(roomCharts[roomId].smokeChart, data.labels || [], data.smokeValues || [], data.replace);
         }
     }
 
+    function renderUpdateTime(roomId, lastUpdateIso) {
+        const updateTimeEl = document.getElementById(`update-${roomId}`);
+        if (!updateTimeEl) return;
+        let lastUpdateText = 'N/A';
+        if (lastUpdateIso) {
+            try {
+                lastUpdateText = luxon.DateTime.fromISO(lastUpdateIso).toRelative({ base: luxon.DateTime.now(), style: 'short' }) || 
+                                 luxon.DateTime.fromISO(lastUpdateIso).toLocaleString(luxon.DateTime.TIME_SIMPLE);
+            } catch (e) { lastUpdateText = lastUpdateIso; }
+        }
+        updateTimeEl.textContent = lastUpdateText;
+    }
+
+    // Terapkan titik baru pada grafik: ganti seluruh data, atau tambahkan lalu pangkas ke maxPointsPerRoom
+    function applyChartDelta(chart, labels, values, replace) {
+        if (replace) {
+            chart.data.labels = labels.slice();
+            chart.data.datasets[0].data = values.slice();
+        } else {
+            if (labels.length === 0) return;
+            chart.data.labels.push(...labels);
+            chart.data.datasets[0].data.push(...values);
+            const excess = chart.data.labels.length - maxPointsPerRoom;
+            if (excess > 0) {
+                chart.data.labels.splice(0, excess);
+                chart.data.datasets[0].data.splice(0, excess);
+            }
+        }
+        chart.update('none');
+    }
+
     function updateOverallStatus(roomsData) {
         let systemInAlertFire = false;
         let systemHasMissingOrStale = false;
@@ -248,57 +278,117 @@ document.addEventListener('DOMContentLoaded', function () {
     }
 
 
-    async function fetchDataAndUpdate() {
-        try {
-            const response = await fetch('/get_live_data');
-            if (!response.ok) {
-                throw new Error(`Gagal mengambil data: ${response.status} ${response.statusText}`);
-            }
-            const data = await response.json();
-
-            // Perbarui status alarm global dari data yang diterima
-            fireAlertEverTriggered = data.fire_alert_triggered;
-            
-            // Ambil data ruangan untuk diproses
-            const dataByRoom = data.rooms;
-
-            if (loadingPlaceholder) {
-                if (Object.keys(dataByRoom).length > 0) {
-                    if (document.body.contains(loadingPlaceholder)) loadingPlaceholder.style.display = 'none';
-                } else {
-                    if (document.body.contains(loadingPlaceholder)) {
-                        loadingPlaceholder.innerHTML = `<div class="spinner"></div><p>Menunggu data sensor pertama...</p>`;
-                        loadingPlaceholder.style.display = 'flex';
-                    }
+    function refreshUpdateTimes() {
+        for (const roomId in roomsState) renderUpdateTime(roomId, roomsState[roomId].last_update_iso);
+    }
+
+    // Terapkan payload /get_live_data atau event /live_stream (bentuknya sama)
+    function applyLiveData(data) {
+        liveCursor = data.cursor;
+        maxPointsPerRoom = data.max_points || maxPointsPerRoom;
+        if (!data.delta) roomsState = {};
+
+        // Perbarui status alarm global dari data yang diterima
+        fireAlertEverTriggered = data.fire_alert_triggered;
+        
+        // Ambil data ruangan yang berubah untuk diproses
+        const dataByRoom = data.rooms;
+
+        for (const roomId in dataByRoom) {
+            const { labels, temperatures, smokeValues, replace, ...roomStatus } = dataByRoom[roomId];
+            roomsState[roomId] = roomStatus;
+        }
+
+        if (loadingPlaceholder) {
+            if (Object.keys(roomsState).length > 0) {
+                if (document.body.contains(loadingPlaceholder)) loadingPlaceholder.style.display = 'none';
+            } else {
+                if (document.body.contains(loadingPlaceholder)) {
+                    loadingPlaceholder.innerHTML = `<div class="spinner"></div><p>Menunggu data sensor pertama...</p>`;
+                    loadingPlaceholder.style.display = 'flex';
                 }
             }
-            
-            const currentDisplayedRoomIds = new Set(Object.keys(roomCharts));
-            const incomingRoomIds = new Set(Object.keys(dataByRoom));
+        }
+        
+        const currentDisplayedRoomIds = new Set(Object.keys(roomCharts));
+        const incomingRoomIds = new Set(Object.keys(dataByRoom));
 
-            incomingRoomIds.forEach(roomId => {
-                if (!currentDisplayedRoomIds.has(roomId)) {
-                    createRoomCard(roomId);
-                }
-                updateRoomCard(roomId, dataByRoom[roomId]);
+        // Snapshot penuh: ruangan yang tidak ada lagi (mis. setelah server di-reset) dihapus dari tampilan
+        if (!data.delta) {
+            roomsGrid.querySelectorAll('.room-card').forEach(card => {
+                const roomId = card.id.slice('card-'.length);
+                if (!incomingRoomIds.has(roomId)) removeRoomCard(roomId);
             });
-            
-            updateOverallStatus(dataByRoom);
+        }
+
+        incomingRoomIds.forEach(roomId => {
+            if (!currentDisplayedRoomIds.has(roomId)) {
+                createRoomCard(roomId);
+            }
+            updateRoomCard(roomId, dataByRoom[roomId]);
+        });
+        
+        updateOverallStatus(roomsState);
+    }
 
+    function showConnectionError() {
+        if (loadingPlaceholder && document.body.contains(loadingPlaceholder)) {
+            loadingPlaceholder.innerHTML = `<i class="fas fa-exclamation-triangle"></i><p>Gagal memuat data. Periksa koneksi atau server.</p>`;
+            loadingPlaceholder.style.display = 'flex';
+        }
+        if (systemStatusText) systemStatusText.textContent = "Error Sistem";
+        if (overallStatusDiv) overallStatusDiv.className = "overall-status-chip overall-status-ALERT_MISSING";
+    }
+
+    // Mode polling, hanya dipakai jika browser tidak mendukung EventSource
+    async function fetchDataAndUpdate() {
+        try {
+            // Kirim cursor terakhir agar server hanya mengirim perubahan (atau 304 jika tidak ada)
+            const url = liveCursor ? `/get_live_data?since=${encodeURIComponent(liveCursor)}` : '/get_live_data';
+            const headers = liveCursor ? { 'If-None-Match': `"${liveCursor}"` } : {};
+            const response = await fetch(url, { headers: headers, cache: 'no-store' });
+            if (response.status === 304) {
+                refreshUpdateTimes();
+                return;
+            }
+            if (!response.ok) {
+                throw new Error(`Gagal mengambil data: ${response.status} ${response.statusText}`);
+            }
+            applyLiveData(await response.json());
         } catch (error) {
             console.error("Error dalam fetchDataAndUpdate:", error);
-            if (loadingPlaceholder && document.body.contains(loadingPlaceholder)) {
-                loadingPlaceholder.innerHTML = `<i class="fas fa-exclamation-triangle"></i><p>Gagal memuat data. Periksa koneksi atau server.</p>`;
-                loadingPlaceholder.style.display = 'flex';
-            }
-            if (systemStatusText) systemStatusText.textContent = "Error Sistem";
-            if (overallStatusDiv) overallStatusDiv.className = "overall-status-chip overall-status-ALERT_MISSING";
+            showConnectionError();
         }
     }
 
+    // Server-push: snapshot penuh saat terhubung, lalu event per perubahan
+    function startLiveStream() {
+        const source = new EventSource('/live_stream');
+        ['snapshot', 'point', 'status', 'people'].forEach(eventType => {
+            source.addEventListener(eventType, event => {
+                try {
+                    applyLiveData(JSON.parse(event.data));
+                } catch (error) {
+                    console.error(`Error saat memproses event ${eventType}:`, error);
+                }
+            });
+        });
+        // Server memutus klien yang terlalu lambat; EventSource akan tersambung ulang dan menerima snapshot baru
+        source.addEventListener('resync', () => console.warn("Stream tertinggal, menyambung ulang..."));
+        source.onerror = () => {
+            console.error("Koneksi live stream terputus, mencoba menyambung ulang...");
+            showConnectionError();
+        };
+        setInterval(refreshUpdateTimes, 2000);
+    }
+
     if (roomsGrid && loadingPlaceholder && overallStatusDiv && systemStatusText) {
-        fetchDataAndUpdate();
-        setInterval(fetchDataAndUpdate, 2000); 
+        if (window.EventSource) {
+            startLiveStream();
+        } else {
+            fetchDataAndUpdate();
+            setInterval(fetchDataAndUpdate, 2000); 
+        }
     } else {
         console.error("Elemen penting halaman tidak ditemukan. Skrip tidak akan berjalan dengan benar.");
     }
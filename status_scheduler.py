@@ -0,0 +1,100 @@
+import heapq
+import sys
+import threading
+import time
+
+
+class DeadlineScheduler:
+    """
+    Fires `callback(key, stage)` exactly when `delays[stage]` seconds have passed
+    since `key` was last touched, for each stage in turn (e.g. STALE, then MISSING).
+
+    Instead of scanning every key periodically, each key has at most one live entry
+    in a min-heap. Touching a key that already has an earlier entry only records the
+    new last-seen time (O(1)). When that entry comes due, it is re-armed at the
+    key's real deadline. So ingest stays cheap and the heap stays about the size of
+    the number of keys. The callback runs on the scheduler thread, outside its lock.
+    """
+
+    def __init__(self, delays, callback, clock=time.time):
+        self.delays = tuple(delays)
+        self.callback = callback
+        self.clock = clock
+        self.fired = 0
+        self._heap = []
+        self._scheduled = {} # key -> deadline of its live heap entry
+        self._last_seen = {}
+        self._stage = {}
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._last_seen)
+
+    def heap_size(self):
+        return len(self._heap)
+
+    def touch(self, key, last_seen=None):
+        with self._cond:
+            last_seen = self.clock() if last_seen is None else last_seen
+            self._last_seen[key] = last_seen
+            self._stage[key] = 0
+            due = last_seen + self.delays[0]
+            scheduled = self._scheduled.get(key)
+            if scheduled is None or due < scheduled:
+                self._scheduled[key] = due
+                heapq.heappush(self._heap, (due, key))
+                if self._heap[0][1] == key:
+                    self._cond.notify()
+
+    def discard(self, key):
+        with self._cond:
+            self._last_seen.pop(key, None)
+            self._stage.pop(key, None)
+            self._scheduled.pop(key, None) # Its heap entry is skipped when it comes due
+
+    def start(self):
+        threading.Thread(target=self.run, name="deadline-scheduler", daemon=True).start()
+        return self
+
+    def run(self):
+        while True:
+            for key, stage in self._wait_for_due():
+                try:
+                    self.callback(key, stage)
+                except Exception as e:
+                    print(f"SCHEDULER ERROR: Callback for {key} (stage {stage}) failed: {e}", file=sys.stderr)
+
+    def _wait_for_due(self):
+        with self._cond:
+            while True:
+                due_now = self._pop_due(self.clock())
+                if due_now:
+                    return due_now
+                timeout = self._heap[0][0] - self.clock() if self._heap else None
+                if timeout is None or timeout > 0:
+                    self._cond.wait(timeout)
+
+    def _pop_due(self, now):
+        # Caller must hold self._cond.
+        due_now = []
+        while self._heap and self._heap[0][0] <= now:
+            due, key = heapq.heappop(self._heap)
+            if self._scheduled.get(key) != due:
+                continue # Superseded by an earlier entry, or the key was discarded
+            stage = self._stage[key]
+            actual_due = self._last_seen[key] + self.delays[stage]
+            if actual_due > now:
+                # Touched since this entry was armed: move it to the real deadline.
+                self._scheduled[key] = actual_due
+                heapq.heappush(self._heap, (actual_due, key))
+                continue
+            due_now.append((key, stage))
+            self.fired += 1
+            if stage + 1 < len(self.delays):
+                self._stage[key] = stage + 1
+                next_due = self._last_seen[key] + self.delays[stage + 1]
+                self._scheduled[key] = next_due
+                heapq.heappush(self._heap, (next_due, key))
+            else:
+                del self._scheduled[key]
+        return due_now
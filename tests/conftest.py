@@ -0,0 +1,28 @@
+import os
+import sys
+
+# The server modules live at the repository root, next to app.py.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    # app.py opens its databases relative to the working directory, so the whole session
+    # runs in a temporary one. Only the services the routes need are started: no leader
+    # election, detector or UDP listener. Tests share one app, so each uses its own room ids.
+    previous_dir = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("server"))
+    import app
+    app.init_storage()
+    app.live_broker.start()
+    app.history_store.init_schema()
+    app.history_store.start()
+    yield app
+    os.chdir(previous_dir)
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
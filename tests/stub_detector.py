@@ -0,0 +1,68 @@
+# Stands in for detector.py in the supervisor tests: the same command line and control
+# channel (PING, ACTIVATE, IDLE, STATUS, METRICS), without cameras or YOLO.
+#
+#   --exit-after S    exit with code 3 after S seconds, like a crashing detector
+#   --hang-after S    stop answering on the control channel after S seconds
+#   --log FILE        append one line per process start, and per command received
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--service", action="store_true")
+parser.add_argument("--control-port", type=int, required=True)
+parser.add_argument("--launched-at", type=float)
+parser.add_argument("--exit-after", type=float)
+parser.add_argument("--hang-after", type=float)
+parser.add_argument("--log")
+args = parser.parse_args()
+started = time.time()
+mode = {"active": False}
+
+
+def log(line):
+    if args.log:
+        with open(args.log, "a") as f:
+            f.write(f"{os.getpid()} {line}\n")
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if args.hang_after is not None and time.time() - started > args.hang_after:
+                time.sleep(3600)
+            command = line.decode().strip().upper()
+            log(command)
+            if command == "PING":
+                reply = "PONG"
+            elif command in ("ACTIVATE", "IDLE"):
+                mode["active"] = command == "ACTIVATE"
+                reply = f"OK {'active' if mode['active'] else 'idle'}"
+            elif command == "STATUS":
+                reply = json.dumps({"pid": os.getpid(), "mode": "active" if mode["active"] else "idle",
+                                    "ready": True, "startup": {"total": 1}})
+            elif command == "METRICS":
+                reply = json.dumps("# HELP iris_detector_up_test Stub.\n# TYPE iris_detector_up_test gauge\niris_detector_up_test 1\n")
+            else:
+                reply = f"ERR unknown command '{command}'"
+            self.wfile.write(f"{reply}\n".encode())
+
+
+class Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+server = Server(("127.0.0.1", args.control_port), Handler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+log("START")
+# Like detector.py: exit when the supervisor closes stdin.
+threading.Thread(target=lambda: (sys.stdin.buffer.read(), os._exit(0)), daemon=True).start()
+if args.exit_after is not None:
+    time.sleep(args.exit_after)
+    os._exit(3)
+threading.Event().wait()
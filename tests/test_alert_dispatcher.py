@@ -0,0 +1,139 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from alert_dispatcher import AlertDispatcher
+from state_backend import MemoryStateBackend
+
+
+def run_stub_webhook(fail_first=0):
+    # A local stand-in for the n8n webhook. `received` collects every JSON payload; the
+    # first `fail_first` requests get HTTP 503.
+    received = []
+    failures_left = [fail_first]
+
+    class StubWebhookHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if failures_left[0] > 0:
+                failures_left[0] -= 1
+                status = 503
+            else:
+                received.append(json.loads(body))
+                status = 200
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubWebhookHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, received
+
+
+@pytest.fixture
+def webhook():
+    servers = []
+
+    def start(fail_first=0):
+        server, received = run_stub_webhook(fail_first=fail_first)
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/webhook", received
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def fire(room_id, temperature):
+    return {"roomId": room_id, "alertType": "FIRE", "temperature": temperature}
+
+
+def test_queued_alerts_for_the_same_room_are_coalesced(webhook):
+    url, received = webhook()
+    dispatcher = AlertDispatcher(url) # Not started yet, so everything stays queued
+    for temperature in (40, 41, 42):
+        assert dispatcher.submit(fire("AD01", temperature))
+    assert dispatcher.submit(fire("AD02", 50))
+    dispatcher.start()
+    assert dispatcher.wait_until_idle(timeout=10)
+    assert sorted((payload["roomId"], payload["temperature"]) for payload in received) == [("AD01", 42), ("AD02", 50)]
+    assert dispatcher.stats["coalesced"] == 2
+
+
+def test_repeat_alerts_are_rate_limited(webhook):
+    url, received = webhook()
+    dispatcher = AlertDispatcher(url, min_interval_seconds=60).start()
+    assert dispatcher.submit(fire("AD03", 40))
+    assert dispatcher.wait_until_idle(timeout=10)
+    assert not dispatcher.submit(fire("AD03", 45))
+    assert dispatcher.submit({"roomId": "AD03", "alertType": "MISSING"}) # Another alert type has its own limit
+    assert dispatcher.wait_until_idle(timeout=10)
+    assert [payload["alertType"] for payload in received] == ["FIRE", "MISSING"]
+    assert dispatcher.stats["rate_limited"] == 1
+
+
+def test_server_errors_are_retried(webhook):
+    url, received = webhook(fail_first=2)
+    dispatcher = AlertDispatcher(url, max_retries=3, backoff_seconds=0.01).start()
+    dispatcher.submit(fire("AD04", 40))
+    assert dispatcher.wait_until_idle(timeout=10)
+    assert len(received) == 1
+    assert (dispatcher.stats["retries"], dispatcher.stats["delivered"], dispatcher.stats["failed"]) == (2, 1, 0)
+
+
+def test_gives_up_after_max_retries(webhook):
+    url, received = webhook(fail_first=10)
+    dispatcher = AlertDispatcher(url, max_retries=1, backoff_seconds=0.01).start()
+    dispatcher.submit(fire("AD05", 40))
+    assert dispatcher.wait_until_idle(timeout=10)
+    assert received == []
+    assert dispatcher.stats["failed"] == 1
+
+
+def test_full_queue_drops_without_blocking(webhook):
+    url, _ = webhook()
+    dispatcher = AlertDispatcher(url, max_queue_size=1) # Not started: the queue never drains
+    assert dispatcher.submit(fire("AD06", 40))
+    assert not dispatcher.submit(fire("AD07", 40))
+    assert dispatcher.stats["dropped"] == 1
+
+
+def test_processes_sharing_a_claim_send_an_alert_once(webhook):
+    # Two dispatchers stand in for two server workers sharing one state backend.
+    url, received = webhook()
+    backend = MemoryStateBackend()
+    claim = lambda key, seconds: backend.acquire_lease(f"alert:{key[0]}:{key[1]}", object(), seconds)
+    workers = [AlertDispatcher(url, min_interval_seconds=60, claim=claim).start() for _ in range(2)]
+    assert workers[0].submit(fire("AD08", 40))
+    assert not workers[1].submit(fire("AD08", 41))
+    assert workers[1].submit(fire("AD09", 40))
+    for dispatcher in workers:
+        assert dispatcher.wait_until_idle(timeout=10)
+    assert sorted(payload["roomId"] for payload in received) == ["AD08", "AD09"]
+    assert workers[1].stats["rate_limited"] == 1
+
+
+def test_alert_is_sent_when_the_claim_fails(webhook):
+    url, received = webhook()
+
+    def claim(key, seconds):
+        raise OSError("state backend unavailable")
+
+    dispatcher = AlertDispatcher(url, claim=claim).start()
+    assert dispatcher.submit(fire("AD10", 40))
+    assert dispatcher.wait_until_idle(timeout=10)
+    assert len(received) == 1
+
+
+def test_server_alerts_share_the_rate_limit(server):
+    assert server.claim_alert(("AD11", "FIRE"), 30)
+    assert not server.claim_alert(("AD11", "FIRE"), 30) # Refused to this worker as well as the others
+    assert server.claim_alert(("AD11", "MISSING"), 30)
@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+from anomaly_engine import DEFAULT_RULE, AnomalyEngine
+
+
+def run(engine, rooms, seconds, start=1000.0):
+    # One reading per room per second, each followed by a tick; `rooms` maps room id to
+    # reading(second) -> (temperature, smoke). Returns {room_id: (second, reasons)} for raised rooms.
+    raised = {}
+    for second in range(seconds):
+        now = start + second
+        for room_id, reading in rooms.items():
+            engine.record(room_id, now, *reading(second))
+        for room_id, reasons in engine.tick(now):
+            raised[room_id] = (second, reasons)
+    return raised
+
+
+def quiet(seed):
+    rng = random.Random(seed)
+    return lambda second: (24 + rng.gauss(0, 0.3), 120 + rng.gauss(0, 15))
+
+
+def test_temperature_ramp_is_raised_and_noise_is_not():
+    engine = AnomalyEngine()
+    rooms = {f"Q{number}": quiet(number) for number in range(20)}
+    # Quiet for a minute, then 0.3 °C/s (18 °C/min) on top of the same noise.
+    base = quiet(99)
+    rooms["FIRE"] = lambda second: (base(second)[0] + 0.3 * max(0, second - 60), base(second)[1])
+    raised = run(engine, rooms, 120)
+    assert list(raised) == ["FIRE"]
+    second, reasons = raised["FIRE"]
+    assert 60 < second < 100
+    assert any(reason.startswith("Rapid Temperature Rise") for reason in reasons)
+
+
+def test_a_room_is_raised_once():
+    engine = AnomalyEngine()
+    raised = []
+    for second in range(120):
+        engine.record("FIRE", 1000.0 + second, 24 + 0.5 * second, 100)
+        raised.extend(engine.tick(1000.0 + second))
+    assert [room_id for room_id, _ in raised] == ["FIRE"]
+
+
+def test_debounce_needs_consecutive_matches():
+    ramp = lambda second: (24 + 0.5 * second, 100)
+    first = run(AnomalyEngine(debounce=1), {"FIRE": ramp}, 60)["FIRE"][0]
+    later = run(AnomalyEngine(debounce=5), {"FIRE": ramp}, 60)["FIRE"][0]
+    assert later == first + 4
+
+
+def test_room_rule_overrides_the_default():
+    engine = AnomalyEngine()
+    engine.set_rule("KITCHEN", rate_of_rise_per_minute=60)
+    ramp = lambda second: (24 + 0.5 * second, 100) # 30 °C/min
+    raised = run(engine, {"KITCHEN": ramp, "OFFICE": ramp}, 60)
+    assert list(raised) == ["OFFICE"]
+
+
+def test_stale_room_is_not_evaluated():
+    # The same ramp as above, but every reading is already older than stale_seconds when evaluated.
+    engine = AnomalyEngine()
+    for second in range(60):
+        engine.record("OLD", 1000.0 + second, 24 + 0.5 * second, 100)
+        assert engine.tick(1000.0 + second + engine.stale_seconds + 1) == []
+
+
+def test_unknown_rule_fields_are_rejected():
+    with pytest.raises(ValueError):
+        AnomalyEngine(rate_of_rise=5)
+    with pytest.raises(ValueError):
+        AnomalyEngine().set_rule("R101", threshold=5)
+
+
+def test_burst_longer_than_the_window_keeps_the_newest_readings():
+    engine = AnomalyEngine(window_size=4)
+    burst = [("OTHER", 999.0, 20.0, 100)] + [("BURST", 1000.0 + second, 20.0 + second, 100 + second) for second in range(10)]
+    rows = engine._write_pending(burst, {})
+    assert len(rows) == 5 # Every ring slot is written once
+    index = engine._index["BURST"]
+    newest = (engine._next_slot[index] - 1) % engine.window_size
+    assert sorted(engine._temperatures[index]) == [26.0, 27.0, 28.0, 29.0]
+    assert (engine._times[index, newest], engine._smoke_values[index, newest]) == (1009.0, 109)
+    assert engine._temperatures[engine._index["OTHER"]][0] == 20.0
+
+
+def test_app_uses_the_engine_defaults(server):
+    assert server.anomaly_engine.default_rule == {**DEFAULT_RULE, **server.ANOMALY_RULE_OVERRIDES}
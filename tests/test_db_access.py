@@ -0,0 +1,71 @@
+import sqlite3
+import threading
+
+import pytest
+
+from db_access import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "test.db"))
+    database.executescript("CREATE TABLE items (name TEXT PRIMARY KEY, value INTEGER)").result(timeout=5)
+    return database
+
+
+def hold_writer(db):
+    # Blocks the writer thread until the returned event is set, so the next requests queue up as one batch.
+    release, running = threading.Event(), threading.Event()
+
+    def wait(conn):
+        running.set()
+        release.wait(5)
+
+    db.transaction(wait)
+    running.wait(5)
+    return release
+
+
+def test_writes_resolve_futures_and_reads_see_them(db):
+    assert db.execute("INSERT INTO items VALUES (?, ?)", ("a", 1)).result(timeout=5) == 1
+    assert db.executemany("INSERT INTO items VALUES (?, ?)", [("b", 2), ("c", 3)]).result(timeout=5) == 2
+    assert db.query("SELECT name, value FROM items ORDER BY name") == [("a", 1), ("b", 2), ("c", 3)]
+    assert db.query_one("SELECT value FROM items WHERE name = ?", ("b",)) == (2,)
+    assert db.query_one("PRAGMA journal_mode") == ("wal",)
+
+
+def test_failing_request_does_not_roll_back_the_rest_of_its_batch(db):
+    release = hold_writer(db)
+    first = db.execute("INSERT INTO items VALUES ('x', 1)")
+    duplicate = db.execute("INSERT INTO items VALUES ('x', 2)")
+    last = db.execute("INSERT INTO items VALUES ('y', 3)")
+    release.set()
+    assert first.result(timeout=5) == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        duplicate.result(timeout=5)
+    assert last.result(timeout=5) == 1
+    assert db.query("SELECT name, value FROM items ORDER BY name") == [("x", 1), ("y", 3)]
+
+
+def test_batched_requests_run_in_submission_order(db):
+    release = hold_writer(db)
+    db.execute("INSERT INTO items VALUES ('before', 1)")
+    script = db.executescript("UPDATE items SET value = value * 10; INSERT INTO items VALUES ('script', 5);")
+    after = db.execute("UPDATE items SET value = value + 1")
+    release.set()
+    script.result(timeout=5)
+    after.result(timeout=5)
+    # The script saw the earlier insert, and the later update saw the script's rows.
+    assert db.query("SELECT name, value FROM items ORDER BY name") == [("before", 11), ("script", 6)]
+
+
+def test_commit_listeners_only_fire_when_rows_changed(db):
+    notified = []
+    db.add_commit_listener(lambda: notified.append(True))
+    db.checkpoint().result(timeout=5)
+    db.execute("UPDATE items SET value = 1 WHERE name = 'missing'").result(timeout=5)
+    db.query("SELECT 1")
+    assert notified == []
+    db.execute("INSERT INTO items VALUES ('z', 1)").result(timeout=5)
+    db.checkpoint().result(timeout=5) # Listeners run after the futures resolve; this waits for them
+    assert notified == [True]
@@ -0,0 +1,61 @@
+import os
+import sqlite3
+
+import pytest
+
+from db_access import Database
+from db_replication import DatabaseReplicator
+
+
+@pytest.fixture
+def source(tmp_path):
+    db = Database(str(tmp_path / "source.db")) # WAL mode, like the server's databases
+    db.executescript("CREATE TABLE items (value INTEGER)").result(timeout=5)
+    return db
+
+
+def read_copy(path):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute("PRAGMA journal_mode").fetchone()[0], conn.execute("SELECT value FROM items ORDER BY value").fetchall()
+    finally:
+        conn.close()
+
+
+def test_copy_is_a_single_self_contained_file(source, tmp_path):
+    source.execute("INSERT INTO items VALUES (1)").result(timeout=5)
+    dest_path = str(tmp_path / "llm" / "copy.db")
+    replicator = DatabaseReplicator(source.path, dest_path)
+    assert replicator.replicate_if_changed()
+    with open(dest_path, "rb") as f:
+        assert f.read(20)[18:20] == b"\x01\x01" # Rollback-journal file format, not WAL
+    assert sorted(os.listdir(tmp_path / "llm")) == ["copy.db"]
+    assert read_copy(dest_path) == ("delete", [(1,)])
+
+
+def test_copies_only_when_the_source_changed(source, tmp_path):
+    dest_path = str(tmp_path / "copy.db")
+    replicator = DatabaseReplicator(source.path, dest_path)
+    assert replicator.replicate_if_changed()
+    assert not replicator.replicate_if_changed()
+    source.execute("INSERT INTO items VALUES (2)").result(timeout=5)
+    assert replicator.replicate_if_changed()
+    assert read_copy(dest_path)[1] == [(2,)]
+    assert (replicator.copies, replicator.skipped) == (2, 1)
+
+
+def test_stale_wal_next_to_the_copy_is_removed(source, tmp_path):
+    dest_path = str(tmp_path / "copy.db")
+    for suffix in ("-wal", "-shm"):
+        with open(dest_path + suffix, "wb") as f:
+            f.write(b"left over")
+    DatabaseReplicator(source.path, dest_path).replicate_if_changed()
+    assert not os.path.exists(dest_path + "-wal")
+    assert not os.path.exists(dest_path + "-shm")
+    assert read_copy(dest_path) == ("delete", [])
+
+
+def test_missing_source_is_not_created(tmp_path):
+    replicator = DatabaseReplicator(str(tmp_path / "missing.db"), str(tmp_path / "copy.db"))
+    assert not replicator.replicate_if_changed()
+    assert os.listdir(tmp_path) == []
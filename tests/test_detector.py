@@ -0,0 +1,175 @@
+import json
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("ultralytics")
+
+from detector import (HUMAN_CLASS_ID, DetectorMode, FrameBoard, LatestSlot, PipelineStats, StartupTimer, inference_loop, load_cameras,
+                      parse_source, start_control_server)
+
+
+class FakeBoxes:
+    def __init__(self, classes):
+        self.cls = self
+        self._classes = np.array(classes)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._classes
+
+
+class FakeResult:
+    def __init__(self, classes):
+        self.boxes = FakeBoxes(classes)
+
+
+class FakeModel:
+    # Each "frame" is the list of classes detected in it.
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, frames, imgsz, verbose):
+        self.batches.append(len(frames))
+        return [FakeResult(frame) for frame in frames]
+
+
+def people(count):
+    return [HUMAN_CLASS_ID] * count + [HUMAN_CLASS_ID + 1] # Plus one object that is not a person
+
+
+def run_inference(cameras, board, frame_skip=0):
+    model, results, stop_event = FakeModel(), LatestSlot(), threading.Event()
+    thread = threading.Thread(target=inference_loop, daemon=True, args=(
+        model, cameras, board, results, PipelineStats(), stop_event, DetectorMode(True), frame_skip, 320))
+    thread.start()
+    return model, results, lambda: (stop_event.set(), thread.join(timeout=5))
+
+
+def test_latest_slot_hands_over_only_the_newest_item():
+    slot = LatestSlot()
+    assert slot.get_newer(0, timeout=0.01) == (0, None)
+    slot.put("old")
+    slot.put("new")
+    assert slot.get_newer(0, timeout=1) == (2, "new")
+    assert slot.get_newer(2, timeout=0.01) == (2, None)
+
+
+def test_stats_report_covers_one_window():
+    stats = PipelineStats()
+    stats.record_skipped(2)
+    stats.record_inference(0.05, [0.1, 0.2])
+    summary = stats.report()
+    assert "frames not inferred 2" in summary
+    assert "batch of 2.0 frames in 50 ms avg" in summary
+    assert "frames not inferred 0" in stats.report() # A new window
+
+
+def test_inference_counts_people_and_publishes_the_result():
+    board = FrameBoard(1)
+    model, results, stop = run_inference([{"source": 0, "room": "R1"}], board)
+    board.put(0, people(3), time.time())
+    seq, (annotated, room_counts) = results.get_newer(0, timeout=5)
+    stop()
+    assert room_counts == {"R1": 3}
+    assert list(annotated) == [0]
+
+
+def test_frame_skip_infers_one_of_every_n_batches():
+    board = FrameBoard(1)
+    model, results, stop = run_inference([{"source": 0, "room": "R1"}], board, frame_skip=2)
+    seq = 0
+    for count in range(4):
+        board.put(0, people(count), time.time())
+        time.sleep(0.05) # Lets the inference stage take each frame on its own
+    seq, (_, room_counts) = results.get_newer(seq, timeout=5)
+    stop()
+    assert model.batches == [1, 1] # Frames 0 and 3
+    assert room_counts == {"R1": 3}
+
+
+def test_board_reports_overwritten_frames_per_camera():
+    board = FrameBoard(2)
+    last_seqs = [0, 0]
+    board.put(0, "a1", 1.0)
+    assert board.take_newer(last_seqs, timeout=0.01) == {0: ("a1", 1.0, 0)}
+    for frame in ("a2", "a3", "a4"):
+        board.put(0, frame, 2.0)
+    board.put(1, "b1", 3.0)
+    assert board.take_newer(last_seqs, timeout=0.01) == {0: ("a4", 2.0, 2), 1: ("b1", 3.0, 0)}
+    assert board.take_newer(last_seqs, timeout=0.01) == {}
+
+
+def test_board_names_the_cameras_that_never_delivered():
+    board = FrameBoard(3)
+    board.put(1, "frame", 1.0)
+    assert board.wait_for_all(timeout=0.05) == [0, 2]
+
+
+def test_cameras_share_one_batch_and_rooms_sum_their_cameras():
+    cameras = [{"source": 0, "room": "R1"}, {"source": 1, "room": "R1"}, {"source": 2, "room": "R2"}]
+    board = FrameBoard(3)
+    for index, count in enumerate((2, 1, 4)):
+        board.put(index, people(count), time.time())
+    model, results, stop = run_inference(cameras, board)
+    seq, (_, room_counts) = results.get_newer(0, timeout=5)
+    assert model.batches == [3]
+    assert room_counts == {"R1": 3, "R2": 4}
+
+    board.put(2, people(0), time.time()) # Cameras left out of a batch keep their last count
+    seq, (_, room_counts) = results.get_newer(seq, timeout=5)
+    stop()
+    assert model.batches == [3, 1]
+    assert room_counts == {"R1": 3, "R2": 0}
+
+
+def test_load_cameras(tmp_path):
+    path = tmp_path / "cameras.json"
+    path.write_text('[{"source": "0", "room": "R101"}, {"source": "rtsp://cam/1", "room": "R202"}]')
+    assert load_cameras(str(path)) == [{"source": 0, "room": "R101"}, {"source": "rtsp://cam/1", "room": "R202"}]
+    assert parse_source("clip.mp4") == "clip.mp4"
+    path.write_text('[{"source": 0}]')
+    with pytest.raises(ValueError, match="needs both"):
+        load_cameras(str(path))
+
+
+def test_activation_wakes_an_idle_wait():
+    mode = DetectorMode(False)
+    threading.Timer(0.05, mode.set_active, (True,)).start()
+    started = time.monotonic()
+    mode.wait_until_active(timeout=5)
+    assert mode.active and time.monotonic() - started < 5
+    assert mode.activated_at is not None
+
+
+def test_startup_report_adds_up_its_phases():
+    timer = StartupTimer(launched_at=time.time() - 1)
+    timer.mark("model load")
+    report = timer.report()
+    assert list(report) == ["interpreter start", "imports", "model load", "total"]
+    assert report["total"] == pytest.approx(sum(report[phase] for phase in list(report)[:-1]), abs=2)
+
+
+def test_control_channel_protocol():
+    mode = DetectorMode(False)
+    server = start_control_server(0, mode, StartupTimer())
+    try:
+        with socket.create_connection(server.server_address, timeout=5) as sock:
+            replies = sock.makefile("r")
+            for command, expected in (("ping", "PONG"), ("ACTIVATE", "OK active"), ("IDLE", "OK idle"), ("FOO", "ERR unknown command 'FOO'")):
+                sock.sendall(f"{command}\n".encode())
+                assert replies.readline().strip() == expected
+            sock.sendall(b"ACTIVATE\nSTATUS\nMETRICS\n")
+            assert replies.readline().strip() == "OK active"
+            status = json.loads(replies.readline())
+            assert (status["mode"], status["ready"]) == ("active", False)
+            assert "iris_detector_frames_inferred_total" in json.loads(replies.readline())
+    finally:
+        server.shutdown()
+        server.server_close()
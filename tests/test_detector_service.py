@@ -0,0 +1,111 @@
+import os
+import socket
+import time
+
+import pytest
+
+from detector_service import DetectorSupervisor
+
+STUB_DETECTOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_detector.py")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+@pytest.fixture
+def supervise(tmp_path):
+    supervisors = []
+
+    def start(*stub_args, **options):
+        log = tmp_path / f"detector-{len(supervisors)}.log"
+        options = dict(dict(health_interval_seconds=0.1, startup_grace_seconds=5, backoff_seconds=0.05), **options)
+        supervisor = DetectorSupervisor(STUB_DETECTOR, ["--log", str(log), *stub_args], control_port=free_port(), **options)
+        supervisors.append(supervisor)
+        supervisor.log = lambda: log.read_text().split("\n")[:-1] if log.exists() else []
+        return supervisor.start()
+
+    yield start
+    for supervisor in supervisors:
+        supervisor.stop()
+
+
+def starts(supervisor):
+    return [line for line in supervisor.log() if line.endswith(" START")]
+
+
+def test_wanted_mode_reaches_the_detector(supervise):
+    supervisor = supervise()
+    assert wait_for(lambda: supervisor.status()["modeAcknowledged"])
+    assert supervisor.activate()
+    assert not supervisor.activate() # Already wanted
+    assert wait_for(lambda: supervisor.status()["modeAcknowledged"])
+    status = supervisor.status()
+    assert (status["mode"], status["running"]) == ("active", True)
+    assert status["lastSwitchMs"] is not None
+    assert supervisor.idle()
+    assert wait_for(lambda: any(line.endswith(" IDLE") for line in supervisor.log()))
+
+
+def test_health_checks_fetch_metrics_and_the_startup_report(supervise):
+    supervisor = supervise()
+    assert wait_for(lambda: supervisor.startup_report is not None)
+    assert supervisor.startup_report == {"total": 1}
+    assert "iris_detector_up_test 1" in supervisor.detector_metrics
+
+
+def test_crashed_detector_is_restarted_in_the_wanted_mode(supervise):
+    supervisor = supervise("--exit-after", "0.5")
+    supervisor.activate()
+    assert wait_for(lambda: len(starts(supervisor)) >= 3)
+    assert supervisor.restarts >= 2
+    # Every new instance is told the wanted mode again.
+    activated = lambda: {line.split()[0] for line in supervisor.log() if line.endswith(" ACTIVATE")}
+    assert wait_for(lambda: len(activated()) >= 2)
+
+
+def test_mode_change_cuts_the_restart_backoff_short(supervise):
+    supervisor = supervise("--exit-after", "0.3", backoff_seconds=30, max_backoff_seconds=30)
+    assert wait_for(lambda: supervisor.restarts == 1) # Now waiting up to 30 s
+    time.sleep(0.2)
+    assert len(starts(supervisor)) == 1
+    started = time.monotonic()
+    supervisor.activate()
+    assert wait_for(lambda: len(starts(supervisor)) == 2, timeout=5)
+    assert time.monotonic() - started < 5
+
+
+def test_stop_cuts_the_restart_backoff_short(supervise):
+    supervisor = supervise("--exit-after", "0.3", backoff_seconds=30, max_backoff_seconds=30)
+    assert wait_for(lambda: supervisor.restarts == 1)
+    supervisor.stop()
+    time.sleep(0.5)
+    assert len(starts(supervisor)) == 1
+    assert not supervisor.status()["running"]
+
+
+def test_unresponsive_detector_is_killed_and_restarted(supervise):
+    supervisor = supervise("--hang-after", "0.5", unresponsive_seconds=0.5, control_timeout_seconds=0.2)
+    assert wait_for(lambda: len(starts(supervisor)) >= 2)
+    assert supervisor.restarts >= 1
+
+
+def test_stop_terminates_the_detector(supervise):
+    supervisor = supervise()
+    assert wait_for(lambda: supervisor.status()["running"])
+    pid = supervisor.status()["pid"]
+    supervisor.stop()
+    assert not supervisor.status()["running"]
+    with pytest.raises(OSError):
+        os.kill(pid, 0)
@@ -0,0 +1,103 @@
+import sqlite3
+import time
+
+import pytest
+
+from db_access import Database
+from history_store import HistoryStore, partition_name
+
+DAY = 86400
+
+
+@pytest.fixture
+def database(tmp_path):
+    return Database(str(tmp_path / "history.db"))
+
+
+@pytest.fixture
+def store(database):
+    history = HistoryStore(database, raw_retention_days=7)
+    history.init_schema()
+    return history
+
+
+def test_raw_and_rollup_queries(store):
+    now = time.time()
+    start = now - now % 60 # Keeps all three readings in one minute bucket
+    store.record_many([("R1", start + 1, 20.0, 100), ("R1", start + 2, 30.0, None), ("R2", start + 3, 99.0, 1)])
+    assert store.flush().result(timeout=5) == (3, [partition_name(start)], [])
+    _, raw = store.query_range("R1", start, start + 59, resolution="raw")
+    assert raw == {"timestamps": [start + 1, start + 2], "temperatures": [20.0, 30.0], "smokeValues": [100, None]}
+    _, rollup = store.query_range("R1", start, start + 59, resolution="1m")
+    assert rollup["counts"] == [2]
+    assert rollup["temperature"] == {"avg": [25.0], "min": [20.0], "max": [30.0]}
+    assert rollup["smokeValue"] == {"avg": [100.0], "min": [100], "max": [100]}
+
+
+def test_failed_batch_is_requeued_and_does_not_poison_the_cache(store, database):
+    now = time.time()
+    store.record("R1", now, 21.0, 50)
+    database.executescript("DROP TABLE rollup_1m").result(timeout=5) # The next batch fails after creating its partition
+    with pytest.raises(sqlite3.OperationalError):
+        store.flush().result(timeout=5)
+    assert store._partitions == set() # The partition's creation was rolled back with the batch
+    assert store._failed == ([("R1", now, 21.0, 50)], 1)
+
+    store.init_schema() # Brings the rollup table back
+    store.record("R1", now + 1, 22.0, 51)
+    assert store.flush().result(timeout=5)[0] == 1 # The failed batch first, on its own
+    assert store.flush().result(timeout=5)[0] == 1
+    _, raw = store.query_range("R1", now - 1, now + 2, resolution="raw")
+    assert raw["temperatures"] == [21.0, 22.0]
+    assert store.flushed_readings == 2
+
+
+def test_batch_that_keeps_failing_is_dropped(store, database):
+    now = time.time()
+    store.max_attempts = 2
+    store.record("R1", now, 21.0, 50)
+    database.executescript("DROP TABLE rollup_1m").result(timeout=5)
+    for _ in range(2):
+        with pytest.raises(sqlite3.OperationalError):
+            store.flush().result(timeout=5)
+    assert store._failed is None
+    assert store.dropped_readings == 1
+
+    store.init_schema()
+    store.record("R1", now + 1, 22.0, 51) # Readings behind the dropped batch are written
+    assert store.flush().result(timeout=5)[0] == 1
+
+
+def test_buffer_keeps_the_newest_readings(store):
+    store.max_buffered_readings = 3
+    dropped = store.dropped_readings
+    store.record_many([("R1", time.time(), float(value), value) for value in range(5)])
+    assert [reading[2] for reading in store._buffer] == [2.0, 3.0, 4.0]
+    assert store.dropped_readings == dropped + 2
+
+
+def test_raw_query_sees_partitions_created_by_another_worker(database, store):
+    other_worker = HistoryStore(database)
+    other_worker.init_schema()
+    yesterday = time.time() - DAY
+    other_worker.record("R1", yesterday, 23.0, 60)
+    other_worker.flush().result(timeout=5)
+    assert partition_name(yesterday) not in store._partitions
+    _, raw = store.query_range("R1", yesterday - 1, yesterday + 1, resolution="raw")
+    assert raw["temperatures"] == [23.0]
+
+
+def test_expired_partitions_are_dropped_after_commit(store, database):
+    old = time.time() - 10 * DAY
+    store.record("R1", old, 20.0, 1)
+    store.flush().result(timeout=5) # Creates the old partition, then drops it as expired in the same batch
+    assert partition_name(old) not in store._partitions
+    assert partition_name(old) not in store._list_partitions(database.query)
+
+
+def test_history_endpoint_rejects_bad_bounds(client):
+    for query in ("start=nan", "end=inf", "start=-inf", "start=2&end=1", "start=yesterday"):
+        response = client.get(f"/history?room=R1&{query}")
+        assert response.status_code == 400, query
+    assert client.get("/history").status_code == 400
+    assert client.get("/history?room=R1&start=0&end=60&resolution=1m").status_code == 200
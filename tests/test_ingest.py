@@ -0,0 +1,93 @@
+import pytest
+
+
+def readings_counter(server, room_id):
+    return server.READINGS.labels(room_id).value
+
+
+@pytest.mark.parametrize("item, message", [
+    ({"temperature": 26}, "roomId missing"),
+    ({"roomId": ["R1"], "temperature": 26}, "roomId must be a non-empty string"),
+    ({"roomId": {"a": 1}, "temperature": 26}, "roomId must be a non-empty string"),
+    ({"roomId": "", "temperature": 26}, "roomId must be a non-empty string"),
+    ({"roomId": "IN01", "temperature": "hot"}, "temperature must be a finite number"),
+    ({"roomId": "IN01", "temperature": float("nan")}, "temperature must be a finite number"),
+    ({"roomId": "IN01", "temperature": True}, "temperature must be a finite number"),
+    ({"roomId": "IN01", "temperature": "inf"}, "temperature must be a finite number"),
+    ({"roomId": "IN01", "smokeValue": [1]}, "smokeValue must be a finite number"),
+])
+def test_parse_reading_rejects_bad_items(server, item, message):
+    with pytest.raises(ValueError, match=message):
+        server.parse_reading(item)
+
+
+def test_parse_reading_accepts_numbers_and_missing_values(server):
+    assert server.parse_reading({"roomId": "IN01", "temperature": 26, "smokeValue": 90.0}) == ("IN01", 26.0, 90)
+    assert server.parse_reading({"roomId": "IN01"}) == ("IN01", None, None)
+
+
+def test_numeric_strings_are_still_accepted(server, client):
+    assert server.parse_reading({"roomId": "IN07", "temperature": "25.3", "smokeValue": "250"}) == ("IN07", 25.3, 250)
+    assert client.post("/sensordata", json={"roomId": "IN07", "temperature": "25.3", "smokeValue": "250"}).status_code == 200
+    response = client.post("/sensordata/batch", json={"readings": [{"roomId": "IN08", "temperature": "26", "smokeValue": "90"}]})
+    assert response.get_json()["accepted"] == 1
+
+
+def test_single_reading_with_bad_room_id_is_a_client_error(client):
+    response = client.post("/sensordata", json={"roomId": ["IN02"], "temperature": 26})
+    assert response.status_code == 400
+    assert client.post("/sensordata", data="not json", content_type="application/json").status_code == 400
+
+
+def test_batch_reports_invalid_items_and_applies_the_rest(server, client):
+    response = client.post("/sensordata/batch", json={"readings": [
+        {"roomId": "IN03", "temperature": 26, "smokeValue": 90},
+        {"roomId": ["IN04"], "temperature": 26},
+        {"roomId": {"x": 1}},
+        "not an object",
+        {"roomId": "IN05", "temperature": float("inf")},
+    ]})
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body["status"] == "partial"
+    assert (body["accepted"], body["rejected"]) == (1, 4)
+    assert [result["status"] for result in body["results"]] == ["success", "error", "error", "error", "error"]
+    assert body["results"][0]["roomStatus"] == "NORMAL"
+    assert "IN03" in server.room_statuses
+
+
+def test_readings_are_counted_only_once_committed(server, monkeypatch):
+    def fail(fn):
+        raise RuntimeError("backend down")
+
+    before = readings_counter(server, "IN06")
+    monkeypatch.setattr(server.state_backend, "transaction", fail)
+    with pytest.raises(RuntimeError):
+        server.ingest_readings([("IN06", 26.0, 90)])
+    assert readings_counter(server, "IN06") == before
+    monkeypatch.undo()
+    server.ingest_readings([("IN06", 26.0, 90)])
+    assert readings_counter(server, "IN06") == before + 1
+
+
+def test_status_transitions_are_counted_only_once_committed(server, monkeypatch):
+    def transitions():
+        return server.STATUS_TRANSITIONS.labels("NEW", "NORMAL").value
+
+    def rolled_back(fn):
+        return transaction(lambda tx: (fn(tx), 1 / 0))
+
+    def retried(fn):
+        with pytest.raises(ZeroDivisionError):
+            rolled_back(fn)
+        return transaction(fn)
+
+    transaction = server.state_backend.transaction
+    before = transitions()
+    monkeypatch.setattr(server.state_backend, "transaction", rolled_back)
+    with pytest.raises(ZeroDivisionError):
+        server.ingest_readings([("IN09", 26.0, 90)])
+    assert transitions() == before
+    monkeypatch.setattr(server.state_backend, "transaction", retried)
+    server.ingest_readings([("IN09", 26.0, 90)])
+    assert transitions() == before + 1
@@ -0,0 +1,39 @@
+def ingest(server, *room_ids, temperature=26.0, smoke_value=90):
+    server.ingest_readings([(room_id, temperature, smoke_value) for room_id in room_ids])
+
+
+def test_full_response_has_a_cursor_and_etag(server, client):
+    ingest(server, "LD01")
+    response = client.get("/get_live_data")
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body["delta"] is False
+    assert body["rooms"]["LD01"]["replace"] is True
+    assert response.headers["ETag"].strip('"') == body["cursor"]
+
+
+def test_delta_contains_only_rooms_changed_after_the_cursor(server, client):
+    ingest(server, "LD02", "LD03")
+    cursor = client.get("/get_live_data").get_json()["cursor"]
+    ingest(server, "LD03", temperature=27.5)
+    body = client.get(f"/get_live_data?since={cursor}").get_json()
+    assert body["delta"] is True
+    assert list(body["rooms"]) == ["LD03"]
+    assert body["rooms"]["LD03"]["temperatures"] == [27.5]
+    assert body["rooms"]["LD03"]["replace"] is False
+
+
+def test_current_etag_is_not_modified(server, client):
+    ingest(server, "LD04")
+    etag = client.get("/get_live_data").headers["ETag"]
+    assert client.get("/get_live_data", headers={"If-None-Match": etag}).status_code == 304
+    ingest(server, "LD04")
+    assert client.get("/get_live_data", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_foreign_or_malformed_cursor_gets_a_full_response(server, client):
+    ingest(server, "LD05")
+    for cursor in ("otherboot-1", "garbage", f"{server.state_backend.boot_id}-999999999"):
+        body = client.get(f"/get_live_data?since={cursor}").get_json()
+        assert body["delta"] is False
+        assert "LD05" in body["rooms"]
@@ -0,0 +1,82 @@
+import json
+import queue
+
+from live_stream import LiveStreamBroker, format_sse
+
+
+def parse(message):
+    event_line, data_line = message.strip().split("\n")
+    return event_line[len("event: "):], json.loads(data_line[len("data: "):])
+
+
+def drain(broker):
+    # Runs the publisher's work on the calling thread, for brokers that were not started.
+    while True:
+        try:
+            broker._fan_out(*broker._outbox.get_nowait())
+        except queue.Empty:
+            return
+
+
+def test_format_sse():
+    assert format_sse("point", {"a": 1}) == 'event: point\ndata: {"a":1}\n\n'
+
+
+def test_publish_without_subscribers_is_dropped():
+    broker = LiveStreamBroker()
+    broker.publish("point", {"n": 1}, version=1)
+    assert broker._outbox.empty()
+
+
+def test_events_are_delivered_in_publish_order():
+    broker = LiveStreamBroker()
+    subscription = broker.subscribe()
+    for version in range(1, 4):
+        broker.publish("point", {"n": version}, version=version)
+    drain(broker)
+    assert [parse(subscription.queue.get_nowait())[1]["n"] for _ in range(3)] == [1, 2, 3]
+
+
+def test_serialization_happens_after_publish_returns():
+    broker = LiveStreamBroker()
+    subscription = broker.subscribe()
+    data = {"n": 1}
+    broker.publish("point", data, version=1)
+    assert subscription.queue.empty() # Nothing serialized on the caller's thread
+    drain(broker)
+    assert parse(subscription.queue.get_nowait()) == ("point", {"n": 1})
+
+
+def test_subscriber_skips_events_already_in_its_snapshot():
+    broker = LiveStreamBroker()
+    early = broker.subscribe(since_version=0)
+    broker.publish("point", {"n": 5}, version=5)
+    late = broker.subscribe(since_version=5) # Its snapshot already includes version 5
+    broker.publish("point", {"n": 6}, version=6)
+    drain(broker)
+    assert early.queue.qsize() == 2
+    assert parse(late.queue.get_nowait())[1] == {"n": 6}
+    assert late.queue.empty()
+
+
+def test_slow_subscriber_gets_resync_and_end_of_stream():
+    broker = LiveStreamBroker(max_queue_size=2)
+    slow = broker.subscribe()
+    for version in range(1, 5):
+        broker.publish("point", {"n": version}, version=version)
+    drain(broker)
+    assert broker.subscriber_count() == 0
+    assert broker.dropped_subscribers == 1
+    assert list(slow.messages(keepalive_seconds=0.01)) == [format_sse("resync", {"reason": "client too slow"})]
+
+
+def test_started_broker_delivers_room_events_from_the_app(server):
+    subscription = server.live_broker.subscribe(since_version=server.change_version)
+    try:
+        server.ingest_readings([("LS01", 26.5, 80)])
+        event, data = parse(subscription.queue.get(timeout=5))
+        assert event == "point"
+        assert data["rooms"]["LS01"]["temperatures"] == [26.5]
+        assert data["delta"] is True
+    finally:
+        server.live_broker.unsubscribe(subscription)
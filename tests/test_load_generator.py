@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import json
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+from load_generator import HttpClient, LoadTest, parse_rates, percentile, summarize_latencies
+
+
+@pytest.fixture(scope="module")
+def base_url(server):
+    # The load generator speaks raw HTTP, so it needs a real socket rather than the test client.
+    http_server = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{http_server.server_port}"
+    http_server.shutdown()
+
+
+def test_percentiles_and_latency_summary():
+    assert percentile([], 50) is None
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile([1, 2, 3, 4], 100) == 4
+    assert summarize_latencies([]) == {"count": 0}
+    assert summarize_latencies([0.002, 0.001, 0.003]) == {"count": 3, "p50_ms": 2.0, "p95_ms": 3.0, "p99_ms": 3.0, "max_ms": 3.0, "mean_ms": 2.0}
+
+
+def test_parse_rates():
+    assert parse_rates("0.5, 1,2") == [0.5, 1.0, 2.0]
+    for value in ("", "1,0", "-1"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_rates(value)
+
+
+@pytest.mark.parametrize("batch_size, room_prefix", [(0, "LG"), (2, "LGB")])
+def test_stages_against_the_server(server, base_url, batch_size, room_prefix):
+    load_test = LoadTest(base_url, rooms=4, rates=[4, 8], stage_seconds=0.5, batch_size=batch_size,
+                         max_connections=4, room_prefix=room_prefix)
+    results = asyncio.run(load_test.run())
+    assert results["config"]["senders"] == (2 if batch_size else 4)
+    assert [stage["rate_per_room"] for stage in results["stages"]] == [4, 8]
+    for stage in results["stages"]:
+        assert stage["errors"] == 0
+        assert stage["readings"] > 0
+        assert list(stage["status_codes"]) == ["200"]
+        assert stage["ingest_latency"]["count"] > 0
+    assert {f"{room_prefix}{index:05d}" for index in range(4)} <= set(server.room_statuses)
+
+
+def test_event_stream_yields_the_snapshot(base_url):
+    async def first_event():
+        client = HttpClient(base_url)
+        async for event, data in client.stream_events("/live_stream"):
+            return event, json.loads(data)
+
+    event, data = asyncio.run(first_event())
+    assert event == "snapshot"
+    assert "rooms" in data
+
+
+def test_status_timings_for_fire_and_dropout_rooms():
+    load_test = LoadTest("http://unused", rooms=4, rates=[1], stage_seconds=1, fire_rooms=1, dropout_rooms=1, seed=1)
+    (fire_room,), (dropout_room,) = load_test.fire_rooms, load_test.dropout_rooms
+    other_room = next(iter(load_test.room_set - load_test.fire_rooms - load_test.dropout_rooms))
+    load_test.fire_sent[fire_room] = 100.0
+    load_test._on_status(fire_room, "ALERT_FIRE", 100.25)
+    load_test._on_status(fire_room, "ALERT_FIRE", 101.0) # Only the first one counts
+    assert load_test.fire_latencies == [0.25]
+
+    load_test._on_status(other_room, "STALE", 102.0)
+    assert load_test.false_stale_rooms == {other_room}
+    load_test.dropout_active = True
+    load_test.last_sent[dropout_room] = 100.0
+    load_test._on_status(dropout_room, "STALE", 100.0 + load_test.stale_seconds + 0.5)
+    load_test._on_status(dropout_room, "ALERT_MISSING", 100.0 + load_test.missing_seconds + 1)
+    assert (load_test.stale_lateness, load_test.missing_lateness) == ([0.5], [1.0])
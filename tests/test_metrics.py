@@ -0,0 +1,95 @@
+import re
+
+import pytest
+
+from metrics import MetricsRegistry, TimedLock, format_collapsed, merge_exposition, sample_stacks
+
+
+def type_lines(text):
+    return [line for line in text.splitlines() if line.startswith("# TYPE ")]
+
+
+def test_counter_gauge_and_histogram_render():
+    registry = MetricsRegistry()
+    registry.counter("c_total", "A counter.", ("room",)).labels("R1").inc(2)
+    registry.gauge("g", "A gauge.").set(1.5)
+    registry.gauge("cb", "A callback gauge.", ("room",), callback=lambda: {("R2",): 3})
+    histogram = registry.histogram("h_seconds", "A histogram.", buckets=(0.1, 1))
+    histogram.observe(0.05)
+    histogram.observe(5)
+    text = registry.render()
+    assert 'c_total{room="R1"} 2' in text
+    assert "g 1.5" in text
+    assert 'cb{room="R2"} 3' in text
+    assert 'h_seconds_bucket{le="0.1"} 1' in text
+    assert 'h_seconds_bucket{le="+Inf"} 2' in text
+    assert "h_seconds_count 2" in text
+
+
+def test_registering_twice_returns_the_same_metric_unless_the_kind_differs():
+    registry = MetricsRegistry()
+    assert registry.counter("x_total", "X.") is registry.counter("x_total", "X.")
+    with pytest.raises(ValueError):
+        registry.gauge("x_total", "X.")
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("e_total", "E.", ("room",)).labels('a"b\\c').inc()
+    assert 'e_total{room="a\\"b\\\\c"} 1' in registry.render()
+
+
+def test_merge_declares_shared_families_once():
+    server, detector = MetricsRegistry(), MetricsRegistry()
+    for registry, count in ((server, 3), (detector, 7)):
+        registry.counter("iris_sqlite_writes_total", "Writes.", ("db", "result")).labels("fire_incident.db", "ok").inc(count)
+        registry.histogram("iris_sqlite_query_seconds", "Queries.", ("db",), buckets=(1,)).labels("fire_incident.db").observe(0.5)
+    detector.counter("iris_detector_frames_inferred_total", "Frames.").inc(4)
+    server.gauge("iris_server_only", "Server.").set(1)
+
+    merged = merge_exposition(server.render(), detector.render(), {"process": "detector"})
+    types = type_lines(merged)
+    assert len(types) == len(set(types)) == 4
+    assert sum(line.startswith("# HELP iris_sqlite_writes_total") for line in merged.splitlines()) == 1
+    assert 'iris_sqlite_writes_total{db="fire_incident.db",result="ok"} 3' in merged
+    assert 'iris_sqlite_writes_total{process="detector",db="fire_incident.db",result="ok"} 7' in merged
+    assert 'iris_sqlite_query_seconds_bucket{process="detector",db="fire_incident.db",le="1"} 1' in merged
+    assert 'iris_detector_frames_inferred_total{process="detector"} 4' in merged
+    # Every sample still follows its own family's TYPE line.
+    family = None
+    for line in merged.splitlines():
+        if line.startswith("# TYPE "):
+            family = line.split()[2]
+        elif not line.startswith("#"):
+            assert re.match(re.escape(family) + r"(_bucket|_sum|_count)?[{ ]", line), line
+
+
+def test_merge_without_detector_metrics_is_unchanged():
+    registry = MetricsRegistry()
+    registry.counter("c_total", "C.").inc()
+    assert merge_exposition(registry.render(), "", {"process": "detector"}) == registry.render()
+
+
+def test_metrics_endpoint_merges_detector_metrics(server, client, monkeypatch):
+    detector = MetricsRegistry()
+    detector.counter("iris_sqlite_writes_total", "Writes.", ("db", "result")).labels("fire_incident.db", "ok").inc()
+    monkeypatch.setattr(server.detector_supervisor, "detector_metrics", detector.render())
+    server.people_db.execute("SELECT 1").result(timeout=5) # Makes sure the server exports the family too
+    text = client.get("/metrics").get_data(as_text=True)
+    types = type_lines(text)
+    assert len(types) == len(set(types))
+    assert 'iris_sqlite_writes_total{process="detector",db="fire_incident.db",result="ok"} 1' in text
+
+
+def test_timed_lock_records_wait_and_hold():
+    registry = MetricsRegistry()
+    lock = TimedLock("test", registry=registry)
+    with lock:
+        pass
+    assert 'iris_lock_hold_seconds_count{lock="test"} 1' in registry.render()
+
+
+def test_sample_stacks_collapses_other_threads():
+    stacks, samples = sample_stacks(0.02, interval_seconds=0.005, include_idle=True)
+    assert samples > 0
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in format_collapsed(stacks).splitlines())
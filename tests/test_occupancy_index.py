@@ -0,0 +1,93 @@
+import json
+import threading
+
+import pytest
+
+from occupancy_index import OccupancyIndex, default_floor_of
+
+
+@pytest.mark.parametrize("room_id, floor", [
+    ("R101", "1"), ("R207", "2"), ("R1203", "12"), ("B001", "B"), ("B101", "B1"), ("LOBBY", "LOBBY"),
+])
+def test_floor_of_room_ids(room_id, floor):
+    assert default_floor_of(room_id) == floor
+
+
+def test_room_floor_and_building_bodies():
+    index = OccupancyIndex()
+    index.set("R101", 3)
+    index.set("R103", -1) # Not detected yet
+    index.set("R202", 2)
+    index.set("B001", 1)
+    index.render_dirty()
+    assert json.loads(index.room("R101")) == {"status": "success", "ruangan": "R101", "jumlah_orang": 3}
+    assert json.loads(index.room("R103"))["jumlah_orang"] == 0
+    assert index.room("R999") is None
+    assert json.loads(index.floor("1")) == {"status": "success", "lantai": "1", "jumlah_orang": 3,
+                                            "details": [{"ruangan": "R101", "peopleCount": 3}]}
+    assert json.loads(index.floor("B"))["jumlah_orang"] == 1
+    assert index.floor("9") is None
+    assert json.loads(index.building())["total_people"] == 6
+
+
+def test_only_changed_counts_rerender():
+    index = OccupancyIndex()
+    index.set("R101", 3)
+    index.render_dirty()
+    renders = index.renders
+    index.set("R101", 3)
+    index.render_dirty()
+    assert index.renders == renders
+    index.set("R101", 0)
+    index.render_dirty()
+    assert index.renders == renders + 1
+    assert json.loads(index.floor("1")) == {"status": "success", "lantai": "1", "jumlah_orang": 0, "details": []}
+
+
+def test_batch_query():
+    index = OccupancyIndex()
+    index.set("R101", 3)
+    index.set("R202", -1)
+    body, found = index.rooms(["R101", "R202", "R999"])
+    assert found == 2
+    assert json.loads(body) == {"status": "success", "total_people": 3, "not_found": ["R999"],
+                                "rooms": [{"ruangan": "R101", "jumlah_orang": 3}, {"ruangan": "R202", "jumlah_orang": 0}]}
+    body, found = index.rooms(["R999"])
+    assert found == 0
+    assert json.loads(body)["status"] == "error"
+
+
+def test_batch_query_while_rooms_are_added():
+    index = OccupancyIndex()
+    stop = threading.Event()
+
+    def add_rooms():
+        for number in range(20000):
+            index.set(f"R{number}", 1)
+        stop.set()
+
+    writer = threading.Thread(target=add_rooms)
+    writer.start()
+    while not stop.is_set():
+        index.rooms(["R1", "R5000", "R19999"]) # Must never see the dict change size mid-iteration
+    writer.join()
+    assert index.rooms(["R1", "R19999"])[1] == 2
+
+
+def test_every_room_is_known_right_after_startup(client):
+    # No detector push or leader poll has happened for these rooms.
+    assert client.get("/get_people_count?ruangan=R301").get_json() == {"status": "success", "ruangan": "R301", "jumlah_orang": 0}
+    assert client.get("/get_people_count?lantai=B").get_json()["details"] == []
+    assert client.get("/get_people_count?ruangan=B001,R207").status_code == 200
+
+
+def test_clear_forgets_every_room():
+    index = OccupancyIndex()
+    index.set("R101", 3)
+    index.render_dirty()
+    index.clear()
+    assert index.room("R101") is None and index.floor("1") is None
+    assert json.loads(index.building()) == {"status": "success", "total_people": 0, "details": []}
+    index.set("R102", 1)
+    index.render_dirty()
+    assert json.loads(index.floor("1"))["details"] == [{"ruangan": "R102", "peopleCount": 1}]
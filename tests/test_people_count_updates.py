@@ -0,0 +1,27 @@
+import pytest
+
+
+@pytest.mark.parametrize("body", [
+    None,
+    [],
+    {},
+    {"peopleCount": "three"},
+    {"peopleCount": 2.5},
+    {"peopleCount": True},
+    {"counts": ["R101", 3]},
+    {"counts": {"R101": "3"}},
+    {"counts": {"R101": None}},
+    {"counts": {"R101": 3}, "timestamp": 12},
+])
+def test_malformed_bodies_are_client_errors(client, body):
+    response = client.post("/update_people_count", json=body)
+    assert response.status_code == 400
+    assert response.get_json()["status"] == "error"
+
+
+def test_counts_are_stored_and_served(server, client):
+    response = client.post("/update_people_count", json={"counts": {"R101": 4, "R202": 0}})
+    assert response.status_code == 200
+    assert response.get_json()["updated"] == 2
+    assert server.people_db.query_one("SELECT peopleCount FROM people_detection WHERE ruangan = 'R101'") == (4,)
+    assert client.get("/get_people_count?ruangan=R101").get_json()["jumlah_orang"] == 4
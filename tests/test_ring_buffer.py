@@ -0,0 +1,67 @@
+import pytest
+
+from ring_buffer import SensorRingBuffer, format_label
+
+
+def fill(buffer, count, start_seq=1):
+    for index in range(count):
+        buffer.append(1000.0 + index, 20.0 + index, 100 + index, seq=start_seq + index)
+
+
+def test_rejects_non_positive_capacity():
+    with pytest.raises(ValueError):
+        SensorRingBuffer(0)
+
+
+def test_tail_returns_points_oldest_first():
+    buffer = SensorRingBuffer(5)
+    fill(buffer, 3)
+    view = buffer.tail()
+    assert len(buffer) == 3
+    assert view.epochs() == [1000.0, 1001.0, 1002.0]
+    assert view.temperatures() == [20.0, 21.0, 22.0]
+    assert view.smoke_values() == [100, 101, 102]
+
+
+def test_wraps_around_and_keeps_the_newest_points():
+    buffer = SensorRingBuffer(4)
+    fill(buffer, 10)
+    view = buffer.tail()
+    assert len(buffer) == 4
+    assert view.epochs() == [1006.0, 1007.0, 1008.0, 1009.0]
+    assert len(view.segments) == 2 # 10 % 4 != 0, so the range crosses the end of the arrays
+
+
+def test_tail_count_limits_to_newest():
+    buffer = SensorRingBuffer(8)
+    fill(buffer, 6)
+    assert buffer.tail(2).smoke_values() == [104, 105]
+    assert buffer.tail(0).epochs() == []
+
+
+def test_tail_since_seq_skips_older_points():
+    buffer = SensorRingBuffer(4)
+    fill(buffer, 10, start_seq=100)
+    assert buffer.tail(since_seq=107).smoke_values() == [108, 109]
+    # A cursor older than the retained window gets everything still retained.
+    assert len(buffer.tail(since_seq=0)) == 4
+    assert len(buffer.tail(since_seq=109)) == 0
+
+
+def test_missing_readings_round_trip_as_none():
+    buffer = SensorRingBuffer(3)
+    buffer.append(1.0, None, None)
+    view = buffer.tail()
+    assert view.temperatures() == [None]
+    assert view.smoke_values() == [None]
+
+
+def test_sequence_defaults_to_append_count():
+    buffer = SensorRingBuffer(3)
+    buffer.append(1.0, 20.0, 1)
+    buffer.append(2.0, 20.0, 1)
+    assert buffer.tail(since_seq=1).epochs() == [2.0]
+
+
+def test_format_label_has_second_resolution():
+    assert format_label(3661.9) == "01:01:01"
@@ -0,0 +1,128 @@
+import pytest
+
+from occupancy_index import OccupancyIndex
+from state_backend import MemoryStateBackend, SQLiteStateBackend, create_state_backend, new_boot_id
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    backend = create_state_backend(request.param, str(tmp_path / "state.db"), max_log_entries=3)
+    backend.reset()
+    return backend
+
+
+def put(backend, room_id, event, changes):
+    backend.transaction(lambda tx: tx.put(room_id, event, changes))
+
+
+def test_transaction_merges_records_and_logs_changes(backend):
+    put(backend, "R101", "status", {"status": "NORMAL"})
+    put(backend, "R101", "point", {"temp_current": 25.0})
+    assert backend.transaction(lambda tx: tx.get("R101")) == {"status": "NORMAL", "temp_current": 25.0}
+    assert backend.changes_since(0) == [(1, "R101", "status", {"status": "NORMAL"}),
+                                        (2, "R101", "point", {"temp_current": 25.0})]
+    assert backend.changes_since(1, limit=1) == [(2, "R101", "point", {"temp_current": 25.0})]
+    assert backend.changes_since(2) == []
+    assert backend.snapshot() == (2, {"R101": {"status": "NORMAL", "temp_current": 25.0}})
+
+
+def test_failed_transaction_changes_nothing(backend):
+    def fail(tx):
+        tx.put("R101", "status", {"status": "NORMAL"})
+        raise RuntimeError("boom")
+    with pytest.raises(RuntimeError):
+        backend.transaction(fail)
+    assert backend.snapshot() == (0, {})
+
+
+def test_reader_behind_the_trimmed_log_gets_none(backend):
+    for temperature in range(5):
+        put(backend, "R101", "point", {"temp_current": temperature})
+    backend.trim_log(3)
+    assert backend.changes_since(0) is None
+    assert [seq for seq, *_ in backend.changes_since(2)] == [3, 4, 5]
+
+
+def test_reset_restarts_sequence_numbers_under_a_new_boot_id(backend):
+    put(backend, "R101", "status", {"status": "NORMAL"})
+    backend.try_latch("fire")
+    boot_id = backend.boot_id
+    backend.reset()
+    assert backend.boot_id != boot_id
+    assert backend.snapshot() == (0, {})
+    assert not backend.is_latched("fire")
+    put(backend, "R202", "status", {"status": "NORMAL"})
+    assert backend.changes_since(0) == [(1, "R202", "status", {"status": "NORMAL"})]
+
+
+def test_latches_and_leases(backend):
+    assert backend.try_latch("fire")
+    assert not backend.try_latch("fire")
+    assert backend.is_latched("fire")
+    backend.release_latch("fire")
+    assert not backend.is_latched("fire")
+
+    assert backend.acquire_lease("leader", "a", 60)
+    assert backend.acquire_lease("leader", "a", 60) # Renewal
+    assert not backend.acquire_lease("leader", "b", 60)
+    assert backend.acquire_lease("leader", "b", -1) is False
+    backend.acquire_lease("leader", "a", -1) # Lets the lease expire
+    assert backend.acquire_lease("leader", "b", 60)
+
+
+def test_sqlite_worker_notices_a_reset_by_another_worker(tmp_path):
+    path = str(tmp_path / "state.db")
+    first, second = SQLiteStateBackend(path), SQLiteStateBackend(path)
+    first.reset()
+    put(first, "R101", "status", {"status": "NORMAL"})
+    put(first, "R101", "point", {"temp_current": 25.0})
+    boot_id = second.boot_id
+    assert len(second.changes_since(0)) == 2
+
+    first.reset()
+    put(first, "R202", "status", {"status": "NORMAL"})
+    # Seq 2 of the old boot id must not be taken as a position in the new log.
+    assert second.changes_since(2) is None
+    assert second.boot_id == first.boot_id != boot_id
+    assert second.snapshot() == (1, {"R202": {"status": "NORMAL"}})
+
+
+def test_new_boot_id_differs_from_the_previous_one():
+    boot_id = new_boot_id()
+    assert new_boot_id(boot_id) != boot_id
+    assert new_boot_id(format(int(boot_id, 16) + 1000, 'x')) != format(int(boot_id, 16) + 1000, 'x')
+
+
+def test_mirror_follows_a_reset_of_the_shared_state(server, client, monkeypatch):
+    monkeypatch.setattr(server, "state_backend", MemoryStateBackend())
+    monkeypatch.setattr(server, "mirror_boot_id", server.state_backend.boot_id)
+    monkeypatch.setattr(server, "change_version", 0)
+    for name in ("room_statuses", "sensor_data_storage", "people_counts_cache"):
+        monkeypatch.setattr(server, name, {}) # The other tests' rooms stay in the real mirror
+    monkeypatch.setattr(server, "fire_alert_has_occurred", server.fire_alert_has_occurred)
+    for room_id in ("SB1", "SB2"):
+        assert client.post("/sensordata", json={"roomId": room_id, "temperature": 25, "smokeValue": 100}).status_code == 200
+    server.state_backend.reset()
+    assert client.post("/sensordata", json={"roomId": "SB3", "temperature": 25, "smokeValue": 100}).status_code == 200
+    assert server.change_version == server.state_backend.snapshot()[0]
+    assert {"SB1", "SB2"}.isdisjoint(server.room_statuses)
+    assert "SB3" in server.room_statuses
+
+
+def test_people_counts_follow_a_reset_of_the_shared_state(server, client, monkeypatch):
+    monkeypatch.setattr(server, "state_backend", MemoryStateBackend())
+    monkeypatch.setattr(server, "mirror_boot_id", server.state_backend.boot_id)
+    monkeypatch.setattr(server, "change_version", 0)
+    for name in ("room_statuses", "sensor_data_storage", "people_counts_cache"):
+        monkeypatch.setattr(server, name, {})
+    monkeypatch.setattr(server, "occupancy_index", OccupancyIndex())
+    put(server.state_backend, "SB4", "people", {"people_count": 3})
+    put(server.state_backend, "SB5", "people", {"people_count": 2})
+    server.sync_state()
+    assert client.get("/get_people_count").get_json()["total_people"] == 5
+    server.state_backend.reset()
+    put(server.state_backend, "SB6", "people", {"people_count": 1})
+    server.sync_state()
+    assert client.get("/get_people_count").get_json() == {"status": "success", "total_people": 1,
+                                                          "details": [{"ruangan": "SB6", "peopleCount": 1}]}
+    assert client.get("/get_people_count?ruangan=SB4").status_code == 404
@@ -0,0 +1,73 @@
+import threading
+
+from status_scheduler import DeadlineScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make(delays=(8, 15)):
+    clock = FakeClock()
+    return DeadlineScheduler(delays, callback=None, clock=clock), clock
+
+
+def test_stages_fire_in_order_at_their_deadlines():
+    scheduler, clock = make()
+    scheduler.touch("R1")
+    assert scheduler._pop_due(clock.now + 7.9) == []
+    assert scheduler._pop_due(clock.now + 8) == [("R1", 0)]
+    assert scheduler._pop_due(clock.now + 14.9) == []
+    assert scheduler._pop_due(clock.now + 15) == [("R1", 1)]
+    assert scheduler._pop_due(clock.now + 1000) == []
+    assert scheduler.fired == 2
+
+
+def test_touch_moves_the_deadline_without_growing_the_heap():
+    scheduler, clock = make()
+    scheduler.touch("R1")
+    for offset in range(1, 6):
+        scheduler.touch("R1", clock.now + offset)
+    assert scheduler.heap_size() == 1
+    assert scheduler._pop_due(clock.now + 8) == [] # Re-armed at the real deadline
+    assert scheduler._pop_due(clock.now + 13) == [("R1", 0)]
+
+
+def test_touch_after_a_stage_fired_starts_over():
+    scheduler, clock = make()
+    scheduler.touch("R1")
+    assert scheduler._pop_due(clock.now + 8) == [("R1", 0)]
+    scheduler.touch("R1", clock.now + 10)
+    assert scheduler._pop_due(clock.now + 15) == []
+    assert scheduler._pop_due(clock.now + 18) == [("R1", 0)]
+
+
+def test_discarded_keys_never_fire():
+    scheduler, clock = make()
+    scheduler.touch("R1")
+    scheduler.touch("R2")
+    scheduler.discard("R1")
+    assert scheduler._pop_due(clock.now + 100) == [("R2", 0), ("R2", 1)]
+    assert len(scheduler) == 1
+
+
+def test_thread_calls_back_and_survives_callback_errors():
+    fired = []
+    done = threading.Event()
+
+    def callback(key, stage):
+        fired.append((key, stage))
+        if len(fired) == 2:
+            done.set()
+        if key == "bad":
+            raise RuntimeError("boom")
+
+    scheduler = DeadlineScheduler((0.01,), callback).start()
+    scheduler.touch("bad")
+    scheduler.touch("good")
+    assert done.wait(5)
+    assert sorted(fired) == [("bad", 0), ("good", 0)]
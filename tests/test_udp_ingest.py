@@ -0,0 +1,87 @@
+import queue
+import socket
+
+import pytest
+
+from udp_ingest import FRAME, UdpIngestListener, decode_frames, encode_frame
+
+
+def test_frames_round_trip():
+    datagram = encode_frame("R101", 7, 25.37, 140) + encode_frame("B001", 2**32 + 3, None, None)
+    assert len(datagram) == 2 * FRAME.size
+    assert decode_frames(datagram) == [("R101", 7, 25.37, 140), ("B001", 3, None, None)]
+
+
+def test_out_of_range_values_are_clamped():
+    [(_, _, temperature, smoke_value)] = decode_frames(encode_frame("R101", 1, 1000, 10**6))
+    assert temperature == 327.67
+    assert smoke_value == 0xFFFE
+
+
+@pytest.mark.parametrize("room_id", ["", "ROOM12345", "Rü"])
+def test_invalid_room_ids_cannot_be_encoded(room_id):
+    with pytest.raises(ValueError):
+        encode_frame(room_id, 1, 25, 100)
+
+
+@pytest.mark.parametrize("datagram", [
+    b"",
+    encode_frame("R101", 1, 25, 100)[:-1],
+    b"\x02" + encode_frame("R101", 1, 25, 100)[1:], # Unknown version
+    FRAME.pack(1, b"", 1, 2500, 100), # No room id
+])
+def test_malformed_datagrams_are_counted_and_dropped(datagram):
+    listener = UdpIngestListener(ingest=None)
+    assert listener.accept(datagram) == []
+    assert listener.stats["malformed"] == 1
+
+
+def test_sequence_gaps_late_frames_and_restarts():
+    listener = UdpIngestListener(ingest=None, reorder_window=4)
+    accepted = []
+    for seq in (10, 11, 14, 12, 14, 0, 1, 500, 100, 101):
+        accepted += [seq for _ in listener.accept(encode_frame("R101", seq, 25, 100))]
+    # 12 and the second 14 are late; 0, and 100 (further back than the window), are restarts.
+    assert accepted == [10, 11, 14, 0, 1, 500, 100, 101]
+    assert listener.stats["late"] == 2
+    assert listener.stats["restarts"] == 2
+    assert listener.stats["lost"] == 2 + 498
+
+
+def test_sequence_numbers_wrap_around():
+    listener = UdpIngestListener(ingest=None)
+    for seq in (2**32 - 2, 2**32 - 1, 2, 2**32 - 1):
+        listener.accept(encode_frame("R101", seq, 25, 100))
+    assert listener.stats["accepted"] == 3
+    assert listener.stats["lost"] == 2 # Sequence numbers 0 and 1
+    assert listener.stats["late"] == 1
+    assert listener.stats["restarts"] == 0
+
+
+def test_rooms_are_tracked_separately():
+    listener = UdpIngestListener(ingest=None)
+    readings = listener.accept(encode_frame("R101", 5, 25, 100) + encode_frame("R202", 5, 30, 110))
+    assert readings == [("R101", 25.0, 100), ("R202", 30.0, 110)]
+    assert listener.stats["late"] == 0
+
+
+def test_listener_feeds_ingest_over_a_socket():
+    batches = queue.Queue()
+    listener = UdpIngestListener(batches.put, host="127.0.0.1", port=0)
+    # Port 0 lets the OS pick a free port; read it back from the bound socket.
+    listener.start()
+    assert listener._sock is not None
+    address = listener._sock.getsockname()
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sender:
+        sender.sendto(encode_frame("UD1", 1, 25, 100) + encode_frame("UD2", 1, 26, 101), address)
+        sender.sendto(b"garbage", address)
+        sender.sendto(encode_frame("UD1", 2, 27, 102), address)
+    received = []
+    while len(received) < 3:
+        received += batches.get(timeout=5)
+    assert received == [("UD1", 25.0, 100), ("UD2", 26.0, 101), ("UD1", 27.0, 102)]
+
+
+def test_udp_readings_reach_the_dashboard(server, client):
+    server.ingest_readings(server.udp_listener.accept(encode_frame("UD9", 1, 25.5, 150)))
+    assert client.get("/get_live_data").get_json()["rooms"]["UD9"]["temperature_current"] == 25.5